@@ -0,0 +1,59 @@
+"""Benchmark the VictoriaMetrics serializers on a 50-year daily series.
+
+Usage: poetry run python benchmarks/bench_serialize.py
+"""
+import io
+import json
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from pyfinance import serialize
+
+
+def legacy_format_csv(df: pd.DataFrame) -> str:
+    """The former TickerUploader.format_csv (strftime + DataFrame.to_csv)."""
+    output_df = pd.DataFrame({
+        'Date': df.index.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'Close': df['Close'].values
+    })
+    buffer = io.StringIO()
+    output_df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def legacy_json_line(metric, timestamps, values) -> str:
+    return json.dumps({"metric": metric, "values": values.tolist(),
+                       "timestamps": timestamps.tolist()})
+
+
+def best_of(function, number: int = 10, repeat: int = 5) -> float:
+    """Best time of one call, in milliseconds."""
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1000
+
+
+def main():
+    dates = pd.date_range('1975-01-01', '2024-12-31', freq='D')
+    rng = np.random.default_rng(42)
+    close = 100 * np.cumprod(1 + rng.normal(0.0003, 0.01, len(dates)))
+    df = pd.DataFrame({'Close': close}, index=dates)
+    timestamps = dates.values.astype("datetime64[ms]").astype(np.int64)
+    metric = {"__name__": "finance_close", "ticker": "bench"}
+
+    print(f"Series: {len(df)} daily points (50 years)")
+    cases = [
+        ("CSV", lambda: legacy_format_csv(df),
+         lambda: serialize.format_csv(timestamps, close)),
+        ("JSON line", lambda: legacy_json_line(metric, timestamps, close),
+         lambda: serialize.format_json_line(metric, timestamps, close)),
+    ]
+    for name, legacy, fast in cases:
+        legacy_ms = best_of(legacy)
+        fast_ms = best_of(fast)
+        print(f"{name:10s} legacy {legacy_ms:8.2f} ms   numpy {fast_ms:8.2f} ms   "
+              f"speedup {legacy_ms / fast_ms:5.1f}x   size {len(legacy()):,} -> {len(fast()):,} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""Time the hot paths on synthetic data and compare the results between runs.
+
+Every benchmark runs at several sizes (tickers x years of business days, or
+assets) on the reproducible histories of synthetic.py. yfinance is served
+from the same histories, so nothing is downloaded. For each size the best
+time of ``--repeat`` calls, the throughput and the peak memory allocated by
+one call (tracemalloc) are reported, and written as JSON with ``--output``.
+``--compare`` flags the sizes slower than a former result by more than
+``--tolerance`` and exits with status 1 if there is any.
+
+The benchmarks in OPT_IN, like the former quadratic planner of
+RebalanceAssets, only run when named with ``--only``.
+
+Usage:
+    poetry run python benchmarks/suite.py --preset quick
+    poetry run python benchmarks/suite.py --output after.json --compare before.json
+    poetry run python benchmarks/suite.py --only rebalance --only rebalance_legacy
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.config import get_portfolio_tickers
+from pyfinance.graphics import TickerUploader
+from pyfinance.rebalance import Asset, RebalanceAssets
+from pyfinance.simulation import InputLoader, PortfolioSimulator
+from pyfinance.ticker import History
+
+from synthetic import business_days, offline_yfinance, synthetic_histories, write_contributions
+
+# (function to time, units of work done by one call, name of the unit)
+Prepared = Tuple[Callable[[], object], int, str]
+
+PRESETS = {
+    "quick": {
+        "format_csv": [{"tickers": 1, "years": 10}, {"tickers": 10, "years": 10}],
+        "calculate_mymix": [{"years": 10}],
+        "simulate_asset": [{"tickers": 1, "years": 10}, {"tickers": 10, "years": 10}],
+        "simulate_inputs_cumulative": [{"years": 10}],
+        "rebalance": [{"assets": 10}, {"assets": 1000}],
+        "rebalance_legacy": [{"assets": 10}, {"assets": 1000}],
+        "close_mean_by_weekday": [{"years": 10}],
+    },
+    "full": {
+        "format_csv": [{"tickers": 1, "years": 10}, {"tickers": 10, "years": 30},
+                       {"tickers": 100, "years": 50}, {"tickers": 1000, "years": 50}],
+        "calculate_mymix": [{"years": 10}, {"years": 30}, {"years": 50}],
+        "simulate_asset": [{"tickers": 1, "years": 10}, {"tickers": 10, "years": 30},
+                           {"tickers": 100, "years": 50}, {"tickers": 1000, "years": 50}],
+        "simulate_inputs_cumulative": [{"years": 10}, {"years": 30}, {"years": 50}],
+        "rebalance": [{"assets": 10}, {"assets": 100}, {"assets": 1000}, {"assets": 10000}],
+        # Quadratic (or worse): 10000 assets would take minutes
+        "rebalance_legacy": [{"assets": 10}, {"assets": 100}, {"assets": 1000}],
+        "close_mean_by_weekday": [{"years": 10}, {"years": 30}, {"years": 50}],
+    },
+}
+# Run only when named with --only
+OPT_IN = {"rebalance_legacy"}
+
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.25  # 25% slower is a regression
+
+
+def prepare_format_csv(tickers: int, years: int) -> Prepared:
+    histories = synthetic_histories(tickers, years)
+    uploader = TickerUploader()
+    points = sum(len(history) for history in histories.values())
+    return lambda: [uploader.format_csv(history) for history in histories.values()], points, "points"
+
+
+def prepare_calculate_mymix(years: int) -> Prepared:
+    uploader = TickerUploader()
+    with offline_yfinance(years):
+        histories = {t.name: uploader.get_history(t.yahoo_ticker) for t in get_portfolio_tickers()}
+    rows = sum(len(history) for history in histories.values())
+    return lambda: uploader.calculate_mymix(histories), rows, "rows"
+
+
+def load_contributions(years: int) -> pd.Series:
+    """Monthly contributions, read back from an inputs file like simulate does."""
+    with tempfile.TemporaryDirectory() as directory:
+        return InputLoader.load_inputs(write_contributions(os.path.join(directory, "inputs.csv"), years))
+
+
+def prepare_simulate_asset(tickers: int, years: int) -> Prepared:
+    histories = synthetic_histories(tickers, years)
+    inputs = load_contributions(years)
+    simulator = PortfolioSimulator()
+    days = sum(len(history) for history in histories.values())
+    return (lambda: [simulator.simulate_asset(name, history, inputs)
+                     for name, history in histories.items()], days, "days")
+
+
+def prepare_simulate_inputs_cumulative(years: int) -> Prepared:
+    dates = business_days(years)
+    inputs = load_contributions(years)
+    simulator = PortfolioSimulator()
+    return lambda: simulator.simulate_inputs_cumulative(inputs, dates), len(dates), "days"
+
+
+def prepare_rebalance(assets: int) -> Prepared:
+    values = np.random.default_rng(assets).uniform(100, 10000, assets).round(2).tolist()
+
+    def rebalance():
+        # RebalanceAssets fills in the assets, so every call gets new ones
+        return RebalanceAssets([Asset(f"asset{i}", 100 / assets, value)
+                                for i, value in enumerate(values)], 0)
+    return rebalance, assets, "assets"
+
+
+def legacy_calculate_sends_and_recives(assets: List[Asset]) -> None:
+    """The former RebalanceAssets._calculate_sends_and_recives (nested loop over the assets)."""
+    def how_much_send(asset):
+        return asset.value - asset.rebalanced_value - sum(asset.sending_to.values())
+
+    def how_much_recive(asset):
+        return asset.rebalanced_value - asset.value - sum(asset.reciving_from.values())
+
+    for asset in assets:
+        if how_much_send(asset) > 0:
+            for asset_to_send in assets:
+                if how_much_recive(asset_to_send) > 0 and asset_to_send != asset:
+                    value = min(how_much_send(asset), how_much_recive(asset_to_send))
+                    asset.sending_to[asset_to_send] = value
+                    asset_to_send.reciving_from[asset] = value
+
+
+def prepare_rebalance_legacy(assets: int) -> Prepared:
+    values = np.random.default_rng(assets).uniform(100, 10000, assets).round(2).tolist()
+
+    def rebalance():
+        rebalance_assets = RebalanceAssets.__new__(RebalanceAssets)
+        rebalance_assets.assets = [Asset(f"asset{i}", 100 / assets, value) for i, value in enumerate(values)]
+        rebalance_assets._rebalance()
+        legacy_calculate_sends_and_recives(rebalance_assets.assets)
+        return rebalance_assets
+    return rebalance, assets, "assets"
+
+
+def prepare_close_mean_by_weekday(years: int) -> Prepared:
+    with offline_yfinance(years):
+        history = History("SYNTHETIC")
+        points = len(history.frame())
+    return history.close_mean_by_weekday, points, "points"
+
+
+BENCHMARKS: Dict[str, Callable[..., Prepared]] = {
+    "format_csv": prepare_format_csv,
+    "calculate_mymix": prepare_calculate_mymix,
+    "simulate_asset": prepare_simulate_asset,
+    "simulate_inputs_cumulative": prepare_simulate_inputs_cumulative,
+    "rebalance": prepare_rebalance,
+    "rebalance_legacy": prepare_rebalance_legacy,
+    "close_mean_by_weekday": prepare_close_mean_by_weekday,
+}
+
+
+def measure(function: Callable[[], object], repeat: int) -> Tuple[float, int]:
+    """Best time of ``repeat`` calls in seconds, and peak bytes allocated by one call."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def run(preset: str, only: List[str], repeat: int) -> List[Dict]:
+    results = []
+    for name, sizes in PRESETS[preset].items():
+        if (only or name in OPT_IN) and name not in only:
+            continue
+        for size in sizes:
+            function, work, unit = BENCHMARKS[name](**size)
+            seconds, peak = measure(function, repeat)
+            result = {
+                "benchmark": name,
+                "size": size,
+                "seconds": seconds,
+                "throughput": work / seconds,
+                "unit": f"{unit}/s",
+                "peak_memory_bytes": peak,
+            }
+            print(format_result(result), flush=True)
+            results.append(result)
+            del function
+            gc.collect()
+    return results
+
+
+def format_result(result: Dict) -> str:
+    size = " ".join(f"{key}={value}" for key, value in result["size"].items())
+    return (f"{result['benchmark']:>27} {size:<22} {result['seconds'] * 1000:10.2f} ms "
+            f"{result['throughput']:14,.0f} {result['unit']:<10} "
+            f"{result['peak_memory_bytes'] / 2**20:9.1f} MiB peak")
+
+
+def result_key(result: Dict) -> Tuple[str, str]:
+    return result["benchmark"], json.dumps(result["size"], sort_keys=True)
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[Dict]:
+    """Sizes slower than in the baseline by more than the tolerance."""
+    before = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = before.get(result_key(result))
+        if old is None:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append({"benchmark": result["benchmark"], "size": result["size"],
+                                "seconds": result["seconds"], "baseline_seconds": old["seconds"],
+                                "ratio": ratio})
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="full",
+                        help="Sizes to run (default: full)")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), default=[],
+                        help="Run only this benchmark (repeatable)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Calls timed per size, the best is kept (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="JSON results of a former run to flag regressions against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Slowdown over the baseline flagged as a regression "
+                             f"(default: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(argv)
+
+    report = {**environment(), "preset": args.preset, "repeat": args.repeat}
+    report["results"] = run(args.preset, args.only, args.repeat)
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(report["results"], json.load(f), args.tolerance)
+        for regression in report["regressions"]:
+            size = " ".join(f"{key}={value}" for key, value in regression["size"].items())
+            print(f"REGRESSION {regression['benchmark']} {size}: {regression['ratio']:.2f}x "
+                  f"slower than {args.compare}")
+        if not report["regressions"]:
+            print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Wrote {len(report['results'])} results to {args.output}")
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
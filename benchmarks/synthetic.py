@@ -0,0 +1,75 @@
+"""Reproducible synthetic market data for the benchmarks, and an offline yfinance.
+
+The close prices are the random walks of pyfinance.synthetic, the ones of
+the load test: the same ticker and length give the same history in every
+run and on every machine, without network access.
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.synthetic import END_DATE, business_days, synthetic_close
+
+
+def synthetic_history(ticker: str, years: int) -> pd.DataFrame:
+    """History with the columns of a Yahoo Finance download."""
+    dates = business_days(years)
+    close = synthetic_close(ticker, len(dates))
+    spread = 0.005 * close
+    return pd.DataFrame({
+        "Open": np.r_[close[0], close[:-1]],
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": np.full(len(dates), 1000, dtype=np.int64),
+    }, index=dates)
+
+
+def ticker_names(count: int) -> list:
+    return [f"T{i:04d}" for i in range(count)]
+
+
+def synthetic_histories(tickers: int, years: int) -> Dict[str, pd.DataFrame]:
+    """Close-only histories of ``tickers`` tickers named T0000, T0001..."""
+    dates = business_days(years)
+    return {name: pd.DataFrame({"Close": synthetic_close(name, len(dates))}, index=dates)
+            for name in ticker_names(tickers)}
+
+
+def contributions(years: int, amount: float = 500.0, freq: str = "MS") -> pd.Series:
+    """A contribution of ``amount`` every period (monthly by default)."""
+    dates = pd.date_range(business_days(years)[0], END_DATE, freq=freq)
+    return pd.Series(amount, index=dates, name="Quantity")
+
+
+def write_contributions(path: str, years: int, amount: float = 500.0, freq: str = "MS") -> str:
+    """Write a Date,Quantity inputs file, the format of simulate."""
+    contributions(years, amount, freq).rename_axis("Date").to_csv(path, date_format="%Y-%m-%d")
+    return path
+
+
+class FakeTicker:
+    """Stands in for yfinance.Ticker: serves the synthetic history of the symbol."""
+
+    def __init__(self, symbol: str, years: int):
+        self.symbol = symbol
+        self.years = years
+
+    def history(self, period: Optional[str] = None, start: Optional[str] = None,
+                **kwargs) -> pd.DataFrame:
+        history = synthetic_history(self.symbol, self.years)
+        # Yahoo returns the dates in the time zone of the exchange
+        history.index = history.index.tz_localize("Europe/Madrid")
+        if start is not None:
+            history = history[history.index >= pd.Timestamp(start, tz="Europe/Madrid")]
+        return history
+
+
+@contextmanager
+def offline_yfinance(years: int) -> Iterator[None]:
+    """Serve every yfinance download from synthetic histories of ``years`` years."""
+    with mock.patch("yfinance.Ticker", lambda symbol: FakeTicker(symbol, years)):
+        yield
@@ -0,0 +1,131 @@
+"""Backtest threshold rebalancing of the mymix assets over daily history.
+
+Every day the portfolio is checked with the rule of RebalanceAssets: when
+any asset is further than the threshold from its goal percentage, every
+asset goes back to its goal. All thresholds are simulated together: the
+state is a (thresholds x assets) matrix of shares, so one pass over the
+days backtests every threshold.
+"""
+from dataclasses import dataclass
+from typing import Mapping, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.panel import PricePanel
+from pyfinance.rebalance import exceeds_threshold
+from pyfinance.sweep import invested_per_day
+
+
+@dataclass
+class BacktestResult:
+    """Outcome of a threshold backtest.
+
+    Attributes:
+        values: Portfolio value (dates x thresholds)
+        summary: One row per threshold: final_value, rebalances and
+            turnover (money moved between assets)
+        events: One row per rebalance: date, threshold and traded value
+    """
+    values: pd.DataFrame
+    summary: pd.DataFrame
+    events: pd.DataFrame
+
+
+def backtest_thresholds(
+    prices: np.ndarray,
+    goal_percentages: np.ndarray,
+    invested: np.ndarray,
+    thresholds: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Run the threshold rule day by day for every threshold at once.
+
+    Inputs are invested on their day at the goal percentages, before the
+    rule is checked at that day's close.
+
+    Args:
+        prices: Prices without gaps (days x assets)
+        goal_percentages: Goal percentage of each asset (sum 100)
+        invested: Money invested on each day
+        thresholds: Thresholds in percentage points
+
+    Returns:
+        Tuple of (value per day and threshold, event days, event
+        thresholds indices, event traded values)
+    """
+    days = len(prices)
+    goals = np.asarray(goal_percentages, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    shares = np.zeros((len(thresholds), len(goals)))
+    values = np.zeros((days, len(thresholds)))
+    event_days, event_thresholds, event_traded = [], [], []
+
+    for day in np.flatnonzero(np.cumsum(invested) > 0):
+        price = prices[day]
+        if invested[day]:
+            shares += invested[day] * goals / 100 / price
+        holdings = shares * price
+        rebalance = exceeds_threshold(goals, holdings, thresholds)
+        if rebalance.any():
+            total = holdings[rebalance].sum(axis=1, keepdims=True)
+            # Rounded to cents like RebalanceAssets._rebalance
+            target = np.round(total * goals / 100, 2)
+            event_days.append(np.full(rebalance.sum(), day))
+            event_thresholds.append(np.flatnonzero(rebalance))
+            event_traded.append(np.abs(target - holdings[rebalance]).sum(axis=1) / 2)
+            shares[rebalance] = target / price
+            holdings[rebalance] = target
+        values[day] = holdings.sum(axis=1)
+
+    def _concat(parts, dtype):
+        return np.concatenate(parts) if parts else np.array([], dtype=dtype)
+
+    return (values, _concat(event_days, np.int64), _concat(event_thresholds, np.int64),
+            _concat(event_traded, np.float64))
+
+
+def backtest(
+    panel: PricePanel,
+    weights: Mapping[str, float],
+    inputs: pd.Series,
+    thresholds: Sequence[float],
+) -> BacktestResult:
+    """Backtest rebalancing the weighted tickers at several thresholds.
+
+    Args:
+        panel: Prices of the tickers
+        weights: Dict mapping ticker name to its goal weight (sum 1)
+        inputs: Series with DatetimeIndex and amount to invest
+        thresholds: Thresholds in percentage points (100 never rebalances)
+
+    Returns:
+        The values, summary and rebalance events
+    """
+    panel = panel.select(list(weights)).dropna()
+    if panel.empty:
+        raise ValueError("No common dates found across portfolio tickers")
+    goals = np.array([weights[ticker] * 100 for ticker in panel.tickers])
+    daily_inputs = inputs.groupby(inputs.index).sum()
+    invested = invested_per_day(panel.index, daily_inputs)
+
+    values, days, threshold_ids, traded = backtest_thresholds(
+        panel.values, goals, invested, np.asarray(thresholds, dtype=np.float64)
+    )
+
+    thresholds = list(thresholds)
+    events = pd.DataFrame({
+        "date": panel.index[days],
+        "threshold": np.asarray(thresholds, dtype=np.float64)[threshold_ids],
+        "traded": traded,
+    })
+    summary = pd.DataFrame({
+        "threshold": thresholds,
+        "final_value": values[-1],
+        "rebalances": np.bincount(threshold_ids, minlength=len(thresholds)),
+        "turnover": np.bincount(threshold_ids, weights=traded, minlength=len(thresholds)),
+    })
+    return BacktestResult(
+        values=pd.DataFrame(values, index=panel.index, columns=thresholds),
+        summary=summary,
+        events=events,
+    )
@@ -0,0 +1,231 @@
+"""Rebalance thousands of accounts from one CSV file.
+
+The file has ``account,name,percentage,value`` lines, the format of the
+rebalance command with the account first. The rows of an account must be
+contiguous: an account that appears again after others (within the last
+chunk of accounts read) is an error. Accounts with the same asset twice,
+or whose percentages do not add up to 100, are skipped with a warning,
+like RebalanceAssets rejects them.
+
+The file is read in chunks of rows; the rows of the last account of a
+chunk wait for the next chunk, so every account is evaluated whole. In
+each chunk the totals, the threshold rule of RebalanceAssets and the
+rebalanced values of every account are computed at once with NumPy group
+operations over the rows, and only the accounts that have to be
+rebalanced are planned, one by one, with plan_transfers.
+
+Plans are written as soon as their chunk is done, so memory depends on
+the chunk size and the largest account, never on the length of the file.
+"""
+import csv
+import json
+import sys
+from dataclasses import dataclass
+from typing import Iterator, Optional, TextIO
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.defaults import BATCH_CHUNK_SIZE as DEFAULT_CHUNK_SIZE, BATCH_FORMATS as FORMATS
+from pyfinance.rebalance import current_percentages, plan_transfers, round_cents
+
+COLUMNS = ["account", "name", "percentage", "value"]
+DTYPES = {"account": str, "name": str, "percentage": np.float64, "value": np.float64}
+
+
+@dataclass
+class AccountPlan:
+    """Rebalance of one account.
+
+    Attributes:
+        account: Account id
+        names: Asset names
+        values: Current value of each asset
+        targets: Rebalanced value of each asset
+        senders, recivers: Positions in ``names`` of each transfer
+        cents: Cents moved by each transfer
+    """
+    account: str
+    names: np.ndarray
+    values: np.ndarray
+    targets: np.ndarray
+    senders: np.ndarray
+    recivers: np.ndarray
+    cents: np.ndarray
+
+
+@dataclass
+class BatchStats:
+    """Counters of a batch run."""
+    rows: int = 0
+    accounts: int = 0
+    rebalanced: int = 0
+    transfers: int = 0
+    skipped: int = 0
+
+    def __str__(self):
+        return (f"Accounts: {self.accounts} ({self.rows} rows), rebalanced: {self.rebalanced}, "
+                f"transfers: {self.transfers}, skipped: {self.skipped}")
+
+
+def read_chunks(csv_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Read the file in chunks that only hold whole accounts.
+
+    Args:
+        csv_file: Path of the ``account,name,percentage,value`` file
+        chunk_size: Rows read at a time
+
+    Yields:
+        DataFrames with the COLUMNS columns
+
+    Raises:
+        ValueError: If an account appears again after others, within the
+            last ``chunk_size`` accounts read
+    """
+    pending = None
+    previous = pd.Index([])
+    for chunk in pd.read_csv(csv_file, header=None, names=COLUMNS, dtype=DTYPES,
+                             skipinitialspace=True, chunksize=chunk_size):
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        accounts = chunk["account"].to_numpy()
+        # The last account may go on in the next chunk
+        others = accounts[::-1] != accounts[-1]
+        if not others.any():
+            pending = chunk
+            continue
+        last = len(accounts) - np.argmax(others)
+        pending = chunk.iloc[last:]
+        previous = _check_after(chunk.iloc[:last], previous)[-chunk_size:]
+        yield chunk.iloc[:last]
+    if pending is not None and len(pending):
+        _check_after(pending, previous)
+        yield pending
+
+
+def _check_after(chunk: pd.DataFrame, previous: pd.Index) -> pd.Index:
+    """Raise if an account of the chunk was read before; return every account read."""
+    accounts = pd.Index(chunk["account"].unique())
+    again = accounts[accounts.isin(previous)]
+    if len(again):
+        raise _split_account(again[0])
+    return previous.append(accounts)
+
+
+def _split_account(account: str) -> ValueError:
+    return ValueError(f"Account {account} appears again after other accounts; "
+                      f"the rows of each account must be together")
+
+
+def plan_chunk(chunk: pd.DataFrame, threeshold: float, stats: Optional[BatchStats] = None
+               ) -> Iterator[AccountPlan]:
+    """Plan the rebalance of every account of a chunk that has to be rebalanced.
+
+    Args:
+        chunk: Whole accounts, the rows of each one contiguous
+        threeshold: Threshold in percentage points, the rule of RebalanceAssets
+        stats: Counters updated with the chunk
+
+    Yields:
+        The plan of each account to rebalance, in file order
+
+    Raises:
+        ValueError: If the rows of an account are not contiguous
+    """
+    stats = stats if stats is not None else BatchStats()
+    accounts = chunk["account"].to_numpy()
+    names = chunk["name"].to_numpy()
+    goals = chunk["percentage"].to_numpy(dtype=np.float64)
+    values = chunk["value"].to_numpy(dtype=np.float64)
+
+    starts = np.flatnonzero(np.r_[True, accounts[1:] != accounts[:-1]])
+    ends = np.r_[starts[1:], len(accounts)]
+    split = pd.Series(accounts[starts]).duplicated()
+    if split.any():
+        raise _split_account(accounts[starts[np.argmax(split.to_numpy())]])
+    group = np.repeat(np.arange(len(starts)), ends - starts)
+    # bincount adds in row order, like sum() in RebalanceAssets
+    totals = np.bincount(group, weights=values)
+    goal_sums = np.bincount(group, weights=goals)
+
+    drift = np.abs(goals - current_percentages(values, totals[group]))
+    exceeds = np.maximum.reduceat(drift, starts) > threeshold
+    valid = np.isclose(goal_sums, 100)
+    repeated = pd.DataFrame({"group": group, "name": names}).duplicated().to_numpy()
+    unique_names = np.bincount(group[repeated], minlength=len(starts)) == 0
+    # The rebalanced values of RebalanceAssets._rebalance
+    targets = round_cents(totals[group] * goals / 100)
+    surplus_cents = np.round(values * 100).astype(np.int64) - np.round(targets * 100).astype(np.int64)
+
+    stats.rows += len(accounts)
+    stats.accounts += len(starts)
+    for account in np.flatnonzero(~unique_names):
+        name = names[repeated & (group == account)][0]
+        print(f"Warning: Skipping account {accounts[starts[account]]}, the asset {name} "
+              f"appears more than once", file=sys.stderr)
+        stats.skipped += 1
+    for account in np.flatnonzero(~valid & unique_names):
+        print(f"Warning: Skipping account {accounts[starts[account]]}, the sum of its percentages "
+              f"is {goal_sums[account]:g}, not 100", file=sys.stderr)
+        stats.skipped += 1
+
+    for account in np.flatnonzero(exceeds & valid & unique_names):
+        rows = slice(starts[account], ends[account])
+        senders, recivers, cents = plan_transfers(surplus_cents[rows])
+        stats.rebalanced += 1
+        stats.transfers += len(cents)
+        yield AccountPlan(accounts[starts[account]], names[rows], values[rows], targets[rows],
+                          senders, recivers, cents)
+
+
+def write_csv(plans: Iterator[AccountPlan], output: TextIO) -> None:
+    """Write one ``account,from,to,value`` line per transfer."""
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(["account", "from", "to", "value"])
+    for plan in plans:
+        writer.writerows(
+            (plan.account, plan.names[sender], plan.names[reciver], f"{cents / 100:.2f}")
+            for sender, reciver, cents in zip(plan.senders, plan.recivers, plan.cents)
+        )
+
+
+def write_jsonl(plans: Iterator[AccountPlan], output: TextIO) -> None:
+    """Write one JSON line per account with its rebalanced values and transfers."""
+    for plan in plans:
+        output.write(json.dumps({
+            "account": plan.account,
+            "targets": dict(zip(plan.names.tolist(), plan.targets.tolist())),
+            "transfers": [
+                {"from": plan.names[sender], "to": plan.names[reciver], "value": int(cents) / 100}
+                for sender, reciver, cents in zip(plan.senders, plan.recivers, plan.cents)
+            ],
+        }))
+        output.write("\n")
+
+
+def rebalance_batch(csv_file: str, threeshold: float, output: TextIO, fmt: str = "csv",
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> BatchStats:
+    """Plan the rebalance of every account of a file and stream the plans.
+
+    Args:
+        csv_file: Path of the ``account,name,percentage,value`` file
+        threeshold: Threshold in percentage points (0-100)
+        output: Where the plans are written
+        fmt: "csv" (one line per transfer) or "jsonl" (one line per account)
+        chunk_size: Rows read at a time
+
+    Returns:
+        The counters of the run
+    """
+    if not 0 <= threeshold <= 100:
+        raise ValueError(f"The threeshold is {threeshold}, not between 0 and 100")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}. Use one of {', '.join(FORMATS)}")
+    stats = BatchStats()
+    plans = (plan for chunk in read_chunks(csv_file, chunk_size)
+             for plan in plan_chunk(chunk, threeshold, stats))
+    if fmt == "csv":
+        write_csv(plans, output)
+    else:
+        write_jsonl(plans, output)
+    return stats
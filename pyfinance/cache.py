@@ -0,0 +1,209 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from pyfinance.defaults import DEFAULT_CACHE_DIR, DEFAULT_MAX_AGE
+
+
+def download_history(
+    yahoo_ticker: str, start: Optional[pd.Timestamp] = None
+) -> pd.DataFrame:
+    """Download historical data from Yahoo Finance.
+
+    Args:
+        yahoo_ticker: Yahoo Finance ticker symbol
+        start: First date to download. Downloads the full history if None.
+
+    Returns:
+        DataFrame with historical data and a normalized, tz-naive index
+    """
+    stock = yf.Ticker(yahoo_ticker)
+    if start is None:
+        history = stock.history(period="max")
+    else:
+        history = stock.history(start=start.strftime("%Y-%m-%d"))
+    if not history.empty:
+        history.index = history.index.normalize().tz_localize(None)
+    return history
+
+
+class HistoryCache:
+    """On-disk cache of Yahoo Finance histories, one file per ticker.
+
+    Each ticker is stored as a NumPy ``.npz`` archive with one array per
+    column plus the date index and the time of the last refresh. When an
+    entry is older than ``max_age`` only the missing tail is downloaded and
+    appended. If the overlapping day changed (e.g. Yahoo re-adjusted the
+    series after a dividend) the full history is downloaded again.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_age: float = DEFAULT_MAX_AGE,
+        offline: bool = False,
+        fetch: Callable[..., pd.DataFrame] = download_history,
+    ):
+        """
+        Args:
+            cache_dir: Directory where the cache files are stored
+            max_age: Seconds after which an entry is refreshed from Yahoo
+            offline: Never touch the network, serve whatever is cached
+            fetch: Function ``fetch(yahoo_ticker, start=None)`` used to download
+        """
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.offline = offline
+        self.fetch = fetch
+
+    def path(self, yahoo_ticker: str) -> str:
+        """Return the cache file path for a ticker."""
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", yahoo_ticker)
+        return os.path.join(self.cache_dir, "history", f"{safe_name}.npz")
+
+    def load(self, yahoo_ticker: str) -> Optional[pd.DataFrame]:
+        """Load a cached history without refreshing it.
+
+        Returns:
+            The cached DataFrame, or None if the ticker is not cached.
+        """
+        entry = self._read(yahoo_ticker)
+        return None if entry is None else entry[0]
+
+    def last_date(self, yahoo_ticker: str) -> Optional[pd.Timestamp]:
+        """Return the last cached date for a ticker, or None if not cached."""
+        history = self.load(yahoo_ticker)
+        if history is None or history.empty:
+            return None
+        return history.index[-1]
+
+    def history(self, yahoo_ticker: str) -> pd.DataFrame:
+        """Return the history of a ticker, refreshing the cache if stale.
+
+        Args:
+            yahoo_ticker: Yahoo Finance ticker symbol
+
+        Returns:
+            DataFrame with historical data (empty if nothing is available)
+        """
+        entry = self._read(yahoo_ticker)
+        if self.offline:
+            if entry is None:
+                print(f"Warning: {yahoo_ticker} is not cached and offline mode is on")
+                return pd.DataFrame()
+            return entry[0]
+
+        if entry is None:
+            history = self.fetch(yahoo_ticker)
+        else:
+            cached, fetched_at = entry
+            if time.time() - fetched_at < self.max_age:
+                return cached
+            history = self._refresh(yahoo_ticker, cached)
+
+        if not history.empty:
+            self._write(yahoo_ticker, history)
+        return history
+
+    def _refresh(self, yahoo_ticker: str, cached: pd.DataFrame) -> pd.DataFrame:
+        """Download the tail after the last cached date and append it."""
+        if cached.empty:
+            return self.fetch(yahoo_ticker)
+
+        last_date = cached.index[-1]
+        tail = self.fetch(yahoo_ticker, start=last_date)
+        if tail.empty:
+            return cached
+
+        # The tail starts at the last cached day; if that day no longer
+        # matches, Yahoo rewrote the past and the tail cannot be appended.
+        if last_date in tail.index and not np.isclose(
+            tail.loc[last_date, "Close"], cached.loc[last_date, "Close"], rtol=1e-9
+        ):
+            return self.fetch(yahoo_ticker)
+
+        head = cached[cached.index < tail.index[0]]
+        return pd.concat([head, tail])
+
+    def _read(self, yahoo_ticker: str):
+        """Read a cache entry as ``(history, fetched_at)``, or None."""
+        path = self.path(yahoo_ticker)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            columns = [str(c) for c in data["columns"]]
+            history = pd.DataFrame(
+                {c: data[f"column_{i}"] for i, c in enumerate(columns)},
+                index=pd.DatetimeIndex(data["index"].astype("datetime64[ns]")),
+            )
+            fetched_at = float(data["fetched_at"])
+        return history, fetched_at
+
+    def _write(self, yahoo_ticker: str, history: pd.DataFrame) -> None:
+        """Write a cache entry atomically."""
+        path = self.path(yahoo_ticker)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        numeric = history.select_dtypes(include="number")
+        arrays = {
+            f"column_{i}": numeric[c].to_numpy() for i, c in enumerate(numeric.columns)
+        }
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                index=history.index.values.astype("datetime64[ns]").astype(np.int64),
+                columns=np.array(numeric.columns, dtype=str),
+                fetched_at=np.float64(time.time()),
+                **arrays,
+            )
+        os.replace(tmp_path, path)
+
+
+class HistoryRegistry:
+    """Per-run memo of downloaded histories, keyed by Yahoo ticker.
+
+    Every consumer in a run asks the registry instead of downloading, so
+    each symbol is fetched once no matter how many steps need it. The
+    registry is thread-safe: a consumer asking for a ticker that another
+    thread is downloading waits for that download.
+    """
+
+    def __init__(self, loader: Callable[[str], pd.DataFrame]):
+        """
+        Args:
+            loader: Function that downloads the history of a Yahoo ticker
+        """
+        self.loader = loader
+        self.fetches = 0
+        self.hits = 0
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, yahoo_ticker: str) -> pd.DataFrame:
+        """Return the history of a ticker, downloading it on first use."""
+        with self._lock:
+            future = self._futures.get(yahoo_ticker)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._futures[yahoo_ticker] = future
+                self.fetches += 1
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                future.set_result(self.loader(yahoo_ticker))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def stats(self) -> str:
+        """Return a one-line summary of the registry counters."""
+        return f"History fetches: {self.fetches}, fetches avoided: {self.hits}"
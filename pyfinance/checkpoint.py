@@ -0,0 +1,105 @@
+"""Checkpoints of the simulation, to resume it when inputs and prices grow.
+
+A checkpoint records where the simulation of an asset stopped: the last
+simulated day, the shares held and money invested up to that day, plus
+hashes of the inputs and prices up to that day. While both hashes still
+match, the next run only has to simulate the new days.
+"""
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.serialize import series_checksum
+
+
+@dataclass
+class SimulationCheckpoint:
+    """State of the simulation of an asset at the end of its last day."""
+    last_date: str  # ISO date of the last simulated day
+    shares: float
+    inputs_total: float
+    inputs_hash: str
+    history_hash: str
+
+    @property
+    def last_timestamp(self) -> pd.Timestamp:
+        return pd.Timestamp(self.last_date)
+
+
+def inputs_hash(inputs: pd.Series, until: pd.Timestamp) -> str:
+    """Hash of the inputs dated up to ``until`` (included)."""
+    daily = inputs.groupby(inputs.index).sum()
+    prefix = daily[daily.index <= until]
+    digest = hashlib.sha256()
+    digest.update(prefix.index.values.astype("datetime64[ns]").astype(np.int64).tobytes())
+    digest.update(np.round(prefix.to_numpy(dtype=np.float64), 6).tobytes())
+    return digest.hexdigest()
+
+
+def history_hash(close: pd.Series, until: pd.Timestamp) -> str:
+    """Hash of the prices up to ``until`` (included)."""
+    prefix = close[close.index <= until]
+    timestamps = prefix.index.values.astype("datetime64[ms]").astype(np.int64)
+    return series_checksum(timestamps, prefix.to_numpy(dtype=np.float64))
+
+
+def make_checkpoint(
+    close: pd.Series, inputs: pd.Series, shares: float
+) -> SimulationCheckpoint:
+    """Checkpoint at the last day of ``close`` holding ``shares``."""
+    last_date = close.index[-1]
+    return SimulationCheckpoint(
+        last_date=last_date.isoformat(),
+        shares=float(shares),
+        inputs_total=float(inputs[inputs.index <= last_date].sum()),
+        inputs_hash=inputs_hash(inputs, last_date),
+        history_hash=history_hash(close, last_date),
+    )
+
+
+def is_valid(checkpoint: SimulationCheckpoint, close: pd.Series, inputs: pd.Series) -> bool:
+    """Whether nothing before the checkpoint changed in the inputs or prices."""
+    last_date = checkpoint.last_timestamp
+    return (
+        last_date in close.index
+        and checkpoint.history_hash == history_hash(close, last_date)
+        and checkpoint.inputs_hash == inputs_hash(inputs, last_date)
+    )
+
+
+class CheckpointStore:
+    """Checkpoints on disk, one small JSON file per simulated series."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, name: str) -> str:
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", name)
+        return os.path.join(self.directory, f"{safe_name}.json")
+
+    def scenario(self, scenario: str) -> "CheckpointStore":
+        """Store of the checkpoints of one scenario, in a subdirectory."""
+        return CheckpointStore(self.path(scenario)[:-len(".json")])
+
+    def load(self, name: str) -> Optional[SimulationCheckpoint]:
+        """Return the checkpoint of a series, or None if missing or unreadable."""
+        try:
+            with open(self.path(name)) as f:
+                return SimulationCheckpoint(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def save(self, name: str, checkpoint: SimulationCheckpoint) -> None:
+        """Write a checkpoint atomically."""
+        path = self.path(name)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(checkpoint), f)
+        os.replace(tmp_path, path)
@@ -1,9 +1,27 @@
+"""Command line interface.
+
+Commands import what they use when they run, not here: pandas, yfinance and
+requests take most of a second to import, and commands like list-tickers
+or rebalance need none of them. Option defaults come from
+pyfinance.defaults, which imports nothing heavy.
+"""
+import os
+import sys
+from typing import TYPE_CHECKING, Optional
+
 import click
 
-from pyfinance.config import get_ticker_by_name, TICKERS
-from pyfinance.graphics import TickerUploader
-from pyfinance.rebalance import csv_to_assets, RebalanceAssets
-from pyfinance.simulation import PortfolioSimulator
+from pyfinance.config import PORTFOLIO_WEIGHTS, TICKERS
+from pyfinance.defaults import (BATCH_CHUNK_SIZE, BATCH_FORMATS, DEFAULT_BLOCK_SIZE,
+                                DEFAULT_CACHE_DIR, DEFAULT_EVERY, DEFAULT_LOAD_TICKERS,
+                                DEFAULT_MAX_AGE, DEFAULT_PATHS, PATHS_CHUNK_SIZE, SORT_COLUMNS,
+                                SWEEP_CHUNK_SIZE)
+
+if TYPE_CHECKING:
+    from pyfinance.cache import HistoryCache
+    from pyfinance.metrics import RunMetrics
+    from pyfinance.store import HistoryStore
+    from pyfinance.victoria import VictoriaMetricsClient
 
 
 @click.group()
@@ -12,18 +30,84 @@ def cli():
     pass
 
 
+def cache_options(command):
+    """Add the price-history cache options to a command."""
+    command = click.option('--offline', is_flag=True,
+                           help='Use only cached histories, never download')(command)
+    command = click.option('--max-age', type=float, default=DEFAULT_MAX_AGE / 3600,
+                           show_default=True,
+                           help='Hours before a cached history is refreshed')(command)
+    command = click.option('--no-cache', is_flag=True,
+                           help='Always download the full history')(command)
+    command = click.option('--cache-dir', default=DEFAULT_CACHE_DIR, show_default=True,
+                           help='Directory for the price-history cache')(command)
+    return command
+
+
+def incremental_option(command):
+    """Add the incremental upload option to a command."""
+    return click.option('--incremental', is_flag=True,
+                        help='Upload only points newer than the stored ones')(command)
+
+
+def metrics_option(command):
+    """Add the option to push the timings and counters of the run."""
+    return click.option('--metrics', 'push_metrics', is_flag=True,
+                        help='Push the stage timings and counters of the run to '
+                             'VictoriaMetrics as pyfinance_* series')(command)
+
+
+def push_metrics_of_run(metrics: "RunMetrics", vm_client: "VictoriaMetricsClient",
+                        command: str) -> None:
+    """Print the stage timings and push them, also after a failed run."""
+    click.echo(metrics.summary())
+    try:
+        count = metrics.push(vm_client, command)
+    except Exception as e:
+        click.echo(f"Could not push the metrics: {e}", err=True)
+        return
+    click.echo(f"Pushed {count} metric series")
+
+
+def make_cache(cache_dir: str, no_cache: bool, max_age: float,
+               offline: bool) -> Optional["HistoryCache"]:
+    """Build the history cache from the command line options."""
+    from pyfinance.cache import HistoryCache
+    if no_cache:
+        if offline:
+            raise click.UsageError("--offline needs the cache, remove --no-cache")
+        return None
+    return HistoryCache(cache_dir, max_age=max_age * 3600, offline=offline)
+
+
+def make_store(cache_dir: str, cache: Optional["HistoryCache"],
+               source: str) -> Optional["HistoryStore"]:
+    """The history store in the cache directory, None when the cache is off."""
+    from pyfinance.store import HistoryStore
+    if cache is None:
+        if source == "store":
+            raise click.UsageError("--source store needs the cache, remove --no-cache")
+        return None
+    return HistoryStore(os.path.join(cache_dir, "store"))
+
+
 @cli.command()
 @click.argument('name')
 @click.argument('ticker')
 @click.option('--vm-url', default='http://localhost:8428', 
               help='VictoriaMetrics URL')
-def upload_ticker(name: str, ticker: str, vm_url: str):
+@incremental_option
+@cache_options
+def upload_ticker(name: str, ticker: str, vm_url: str, incremental: bool,
+                  cache_dir: str, no_cache: bool, max_age: float, offline: bool):
     """Upload a single ticker's historical data to VictoriaMetrics.
     
     NAME: Label for the ticker in VictoriaMetrics
     TICKER: Yahoo Finance ticker symbol
     """
-    uploader = TickerUploader(vm_url)
+    from pyfinance.graphics import TickerUploader
+    cache = make_cache(cache_dir, no_cache, max_age, offline)
+    uploader = TickerUploader(vm_url, cache=cache, incremental=incremental)
     click.echo(f"Uploading {name} ({ticker})...")
     uploader.upload_ticker(name, ticker)
     click.echo("Done!")
@@ -32,14 +116,28 @@ def upload_ticker(name: str, ticker: str, vm_url: str):
 @cli.command()
 @click.option('--vm-url', default='http://localhost:8428',
               help='VictoriaMetrics URL')
-def upload_all(vm_url: str):
+@click.option('--jobs', default=4, show_default=True,
+              help='Tickers downloaded and uploaded at the same time')
+@incremental_option
+@metrics_option
+@cache_options
+def upload_all(vm_url: str, jobs: int, incremental: bool, push_metrics: bool, cache_dir: str,
+               no_cache: bool, max_age: float, offline: bool):
     """Upload all configured tickers to VictoriaMetrics.
     
     Uploads all tickers defined in config.py plus calculates
     and uploads the mymix weighted portfolio.
     """
-    uploader = TickerUploader(vm_url)
-    uploader.upload_all()
+    from pyfinance.graphics import TickerUploader
+    from pyfinance.metrics import RunMetrics
+    cache = make_cache(cache_dir, no_cache, max_age, offline)
+    metrics = RunMetrics()
+    uploader = TickerUploader(vm_url, cache=cache, incremental=incremental, metrics=metrics)
+    try:
+        uploader.upload_all(jobs=jobs)
+    finally:
+        if push_metrics:
+            push_metrics_of_run(metrics, uploader.vm_client, "upload-all")
 
 
 @cli.command()
@@ -51,19 +149,340 @@ def rebalance(threshold: int, csv_file: str):
     THRESHOLD: Percentage threshold to trigger rebalancing (0-100)
     CSV_FILE: Path to CSV file with assets (name,percentage,value)
     """
+    from pyfinance.rebalance import csv_to_assets, RebalanceAssets
     assets = csv_to_assets(csv_file)
     rebalance_assets = RebalanceAssets(assets, threeshold=threshold)
     click.echo(rebalance_assets.information())
 
 
+@cli.command(name='rebalance-batch')
+@click.argument('threshold', type=click.FloatRange(0, 100))
+@click.argument('csv_file', type=click.Path(exists=True))
+@click.option('-o', '--output', type=click.File('w'), default='-',
+              help='File for the transfer plans (default: stdout)')
+@click.option('--format', 'fmt', type=click.Choice(BATCH_FORMATS), default='csv', show_default=True,
+              help='csv: one line per transfer; jsonl: one line per account')
+@click.option('--chunk-size', default=BATCH_CHUNK_SIZE, show_default=True,
+              help='Rows read at a time (bounds memory)')
+def rebalance_batch(threshold: float, csv_file: str, output, fmt: str, chunk_size: int):
+    """Rebalance every account of a CSV file.
+    
+    THRESHOLD: Percentage threshold to trigger rebalancing (0-100)
+    CSV_FILE: Path to CSV file with account,name,percentage,value lines,
+    the lines of each account together
+    """
+    from pyfinance import batch
+    try:
+        stats = batch.rebalance_batch(csv_file, threshold, output, fmt=fmt, chunk_size=chunk_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(str(stats), err=True)
+
+
+@cli.command()
+@click.argument('threshold', type=click.FloatRange(0, 100))
+@click.argument('csv_file', type=click.Path(exists=True))
+@click.option('--poll', type=float, default=None,
+              help='Seconds between reads of the latest finance_close prices '
+                   '(default: read JSON lines from stdin)')
+@click.option('--vm-url', default='http://localhost:8428',
+              help='VictoriaMetrics URL')
+@click.option('--no-upload', is_flag=True,
+              help='Do not upload the finance_rebalance_drift series')
+def monitor(threshold: float, csv_file: str, poll: Optional[float], vm_url: str, no_upload: bool):
+    """Watch a portfolio and print the transfers when it has to be rebalanced.
+    
+    THRESHOLD: Percentage threshold to trigger rebalancing (0-100)
+    CSV_FILE: Path to CSV file with assets (name,percentage,value)
+    
+    The values come as {"asset": ..., "value": ...} JSON lines on stdin or,
+    with --poll, from the latest finance_close price of each asset (the
+    names must be tickers).
+    """
+    from pyfinance.monitor import RebalanceMonitor, feed_updates, poll_updates, run_monitor
+    from pyfinance.rebalance import csv_to_assets
+    from pyfinance.victoria import VictoriaMetricsClient
+    assets = csv_to_assets(csv_file)
+    vm_client = VictoriaMetricsClient(vm_url)
+    if poll is None:
+        updates = feed_updates(sys.stdin)
+    else:
+        updates = poll_updates(vm_client, {asset.name: asset.value for asset in assets}, poll)
+    rebalance_monitor = RebalanceMonitor(assets, threshold)
+    try:
+        run_monitor(rebalance_monitor, updates, vm_client=None if no_upload else vm_client)
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command()
+@click.argument('inputs', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--vm-url', default='http://localhost:8428',
+              help='VictoriaMetrics URL')
+@click.option('--jobs', default=4, show_default=True,
+              help='Assets downloaded and simulated at the same time')
+@click.option('--processes', default=1, show_default=True,
+              help='Worker processes simulating the scenarios')
+@click.option('--source', type=click.Choice(['yahoo', 'vm', 'store']), default='yahoo',
+              show_default=True,
+              help='Read prices from Yahoo Finance, from the finance_close '
+                   'series already in VictoriaMetrics or from the history '
+                   'store of the last simulate')
+@click.option('--full', is_flag=True,
+              help='Ignore the checkpoints and simulate from the first input')
+@incremental_option
+@metrics_option
+@cache_options
+def simulate(inputs: tuple, vm_url: str, jobs: int, processes: int, source: str,
+             full: bool, incremental: bool, push_metrics: bool, cache_dir: str,
+             no_cache: bool, max_age: float, offline: bool):
+    """Run portfolio simulation based on inputs.
+    
+    INPUTS: CSV file with Date,Quantity columns. Several files, or
+    directories of them, are scenarios simulated over the same histories
+    and labelled scenario="<file name>".
+    
+    The state of every simulated series is checkpointed in the cache
+    directory, so later runs only simulate and upload the new days. The
+    aligned prices are written to a memory-mapped history store there too,
+    shared with the worker processes.
+    """
+    from pyfinance.checkpoint import CheckpointStore
+    from pyfinance.metrics import RunMetrics
+    from pyfinance.simulation import InputLoader, PortfolioSimulator
+    cache = make_cache(cache_dir, no_cache, max_age, offline)
+    store = make_store(cache_dir, cache, source)
+    checkpoints = None
+    if cache is not None:
+        checkpoints = CheckpointStore(os.path.join(cache_dir, "checkpoints"))
+    scenarios = None
+    if len(inputs) > 1 or os.path.isdir(inputs[0]):
+        try:
+            scenarios = InputLoader.find_scenarios(inputs)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        if not scenarios:
+            raise click.UsageError("No CSV inputs files found")
+    metrics = RunMetrics()
+    simulator = PortfolioSimulator(vm_url, cache=cache, incremental=incremental,
+                                   checkpoints=checkpoints, store=store, metrics=metrics)
+    try:
+        if scenarios is None:
+            simulator.run(inputs[0], jobs=jobs, source=source, resume=not full)
+        else:
+            click.echo(f"Simulating {len(scenarios)} scenarios: {', '.join(scenarios)}")
+            simulator.run_scenarios(scenarios, jobs=jobs, processes=processes, source=source,
+                                    resume=not full)
+    finally:
+        if push_metrics:
+            push_metrics_of_run(metrics, simulator.vm_client, "simulate")
+
+
+@cli.command()
+@click.argument('inputs_file', type=click.Path(exists=True))
+@click.option('--vm-url', default='http://localhost:8428',
+              help='VictoriaMetrics URL')
+@click.option('--source', type=click.Choice(['yahoo', 'vm']), default='yahoo',
+              show_default=True,
+              help='Read prices from Yahoo Finance or from the finance_close '
+                   'series already in VictoriaMetrics')
+@click.option('--paths', default=DEFAULT_PATHS, show_default=True,
+              help='Resampled paths per asset')
+@click.option('--years', type=float, default=0, show_default=True,
+              help='Minimum years simulated from the first input')
+@click.option('--block-size', default=DEFAULT_BLOCK_SIZE, show_default=True,
+              help='Consecutive trading days resampled together')
+@click.option('--seed', type=int, default=None, help='Seed for reproducible results')
+@click.option('--chunk-size', default=PATHS_CHUNK_SIZE, show_default=True,
+              help='Paths simulated together (bounds memory)')
+@click.option('--processes', default=1, show_default=True,
+              help='Worker processes simulating the paths')
+@click.option('--jobs', default=4, show_default=True,
+              help='Tickers downloaded at the same time')
+@cache_options
+def montecarlo(inputs_file: str, vm_url: str, source: str, paths: int, years: float,
+               block_size: int, seed: Optional[int], chunk_size: int, processes: int,
+               jobs: int, cache_dir: str, no_cache: bool, max_age: float, offline: bool):
+    """Simulate the inputs over resampled histories and upload p5/p50/p95 bands."""
+    from pyfinance.montecarlo import MonteCarloSimulator
+    cache = make_cache(cache_dir, no_cache, max_age, offline)
+    simulator = MonteCarloSimulator(vm_url, cache=cache, paths=paths, seed=seed,
+                                    block_size=block_size, chunk_size=chunk_size,
+                                    processes=processes)
+    simulator.run(inputs_file, years=years, jobs=jobs, source=source)
+
+
 @cli.command()
 @click.argument('inputs_file', type=click.Path(exists=True))
+@click.option('--threshold', '-t', 'thresholds', type=float, multiple=True,
+              default=(1, 2, 3, 5, 10, 100), show_default=True,
+              help='Rebalance threshold in percentage points (repeatable; 100 never rebalances)')
+@click.option('--events-file', type=click.Path(dir_okay=False),
+              help='Write every rebalance (date,threshold,traded) to this CSV')
 @click.option('--vm-url', default='http://localhost:8428',
               help='VictoriaMetrics URL')
-def simulate(inputs_file: str, vm_url: str):
-    """Run portfolio simulation based on inputs."""
-    simulator = PortfolioSimulator(vm_url)
-    simulator.run(inputs_file)
+@click.option('--source', type=click.Choice(['yahoo', 'vm']), default='yahoo',
+              show_default=True,
+              help='Read prices from Yahoo Finance or from the finance_close '
+                   'series already in VictoriaMetrics')
+@click.option('--jobs', default=4, show_default=True,
+              help='Tickers downloaded at the same time')
+@cache_options
+def backtest(inputs_file: str, thresholds: tuple, events_file: Optional[str], vm_url: str,
+             source: str, jobs: int, cache_dir: str, no_cache: bool, max_age: float,
+             offline: bool):
+    """Backtest threshold rebalancing of the mymix assets with the inputs.
+    
+    Every day the rebalance rule is checked for each threshold; inputs are
+    invested at the PORTFOLIO_WEIGHTS percentages.
+    """
+    from pyfinance.backtest import backtest as backtest_thresholds
+    from pyfinance.config import get_portfolio_tickers
+    from pyfinance.panel import PricePanel
+    from pyfinance.simulation import InputLoader, PortfolioSimulator
+    cache = make_cache(cache_dir, no_cache, max_age, offline)
+    simulator = PortfolioSimulator(vm_url, cache=cache)
+    histories, _ = simulator.load_histories(source, jobs=jobs, tickers=get_portfolio_tickers())
+    missing = [name for name in PORTFOLIO_WEIGHTS if name not in histories]
+    if missing:
+        raise click.ClickException(f"Missing data for tickers: {', '.join(missing)}")
+    panel = PricePanel.from_histories(histories, tickers=list(PORTFOLIO_WEIGHTS))
+    inputs = InputLoader.load_inputs(inputs_file)
+
+    result = backtest_thresholds(panel, PORTFOLIO_WEIGHTS, inputs, thresholds)
+    click.echo(result.summary.to_string(index=False, formatters={
+        "final_value": "{:,.2f}".format, "turnover": "{:,.2f}".format,
+    }))
+    if events_file:
+        result.events.to_csv(events_file, index=False)
+        click.echo(f"Wrote {len(result.events)} rebalances to {events_file}")
+
+
+@cli.command()
+@click.option('--years', type=float, default=10, show_default=True,
+              help='Length of each plan')
+@click.option('--amount', type=float, default=100, show_default=True,
+              help='Money invested in each contribution')
+@click.option('--every', default=DEFAULT_EVERY, show_default=True,
+              help='Trading days between contributions (21 is about a month)')
+@click.option('--vm-url', default='http://localhost:8428',
+              help='VictoriaMetrics URL')
+@click.option('--source', type=click.Choice(['yahoo', 'vm']), default='yahoo',
+              show_default=True,
+              help='Read prices from Yahoo Finance or from the finance_close '
+                   'series already in VictoriaMetrics')
+@click.option('--jobs', default=4, show_default=True,
+              help='Tickers downloaded at the same time')
+@cache_options
+def rolling(years: float, amount: float, every: int, vm_url: str, source: str, jobs: int,
+            cache_dir: str, no_cache: bool, max_age: float, offline: bool):
+    """Backtest a periodic contribution plan started on every possible date.
+    
+    Uploads the terminal value and IRR of every start date and prints their
+    distribution per asset.
+    """
+    from pyfinance.rolling import RollingSimulator
+    cache = make_cache(cache_dir, no_cache, max_age, offline)
+    simulator = RollingSimulator(vm_url, cache=cache)
+    summary = simulator.run(years, amount=amount, every=every, jobs=jobs, source=source)
+    value_columns = [c for c in summary.columns if c.startswith("value_")]
+    irr_columns = [c for c in summary.columns if c.startswith("irr_")]
+    formatters = {c: "{:,.0f}".format for c in value_columns}
+    formatters.update({c: "{:.2%}".format for c in irr_columns})
+    click.echo(summary.to_string(formatters=formatters))
+
+
+@cli.command(name='sweep')
+@click.argument('inputs_file', type=click.Path(exists=True))
+@click.option('--vm-url', default='http://localhost:8428',
+              help='VictoriaMetrics URL')
+@click.option('--source', type=click.Choice(['yahoo', 'vm', 'store']), default='yahoo',
+              show_default=True,
+              help='Read prices from Yahoo Finance, from the finance_close '
+                   'series already in VictoriaMetrics or from the history '
+                   'store of the last simulate')
+@click.option('--step', type=float, default=0.05, show_default=True,
+              help='Weight increment of the grid of candidates (0 for no grid)')
+@click.option('--samples', type=int, default=0, show_default=True,
+              help='Random candidates added to the grid')
+@click.option('--seed', type=int, default=None, help='Seed of the random candidates')
+@click.option('--sort-by', type=click.Choice(list(SORT_COLUMNS)), default='final_value',
+              show_default=True, help='Metric used to rank the candidates')
+@click.option('--top', default=20, show_default=True, help='Candidates shown')
+@click.option('--chunk-size', default=SWEEP_CHUNK_SIZE, show_default=True,
+              help='Candidates evaluated together (bounds memory)')
+@click.option('--processes', default=1, show_default=True,
+              help='Worker processes evaluating the candidates')
+@click.option('--jobs', default=4, show_default=True,
+              help='Tickers downloaded at the same time')
+@cache_options
+def sweep_weights(inputs_file: str, vm_url: str, source: str, step: float,
+                  samples: int, seed: Optional[int], sort_by: str, top: int,
+                  chunk_size: int, processes: int, jobs: int, cache_dir: str,
+                  no_cache: bool, max_age: float, offline: bool):
+    """Rank alternative portfolio weights against an inputs file.
+    
+    Every candidate invests the inputs in the weighted sum of the portfolio
+    tickers, like mymix. Nothing is uploaded to VictoriaMetrics.
+    """
+    from pyfinance.config import get_portfolio_tickers
+    from pyfinance.panel import PricePanel
+    from pyfinance.simulation import InputLoader, PortfolioSimulator
+    from pyfinance.sweep import candidate_weights, format_table, sweep
+    cache = make_cache(cache_dir, no_cache, max_age, offline)
+    simulator = PortfolioSimulator(vm_url, cache=cache,
+                                   store=make_store(cache_dir, cache, source))
+    portfolio = get_portfolio_tickers()
+    histories, _ = simulator.load_histories(source, jobs=jobs, tickers=portfolio)
+    tickers = [t.name for t in portfolio]
+    missing = [name for name in tickers if name not in histories]
+    if missing:
+        raise click.ClickException(f"Missing data for tickers: {', '.join(missing)}")
+    panel = PricePanel.from_histories(histories, tickers=tickers, align="intersection")
+    inputs = InputLoader.load_inputs(inputs_file)
+    weights = candidate_weights(tickers, step=step, samples=samples, seed=seed)
+
+    click.echo(f"Evaluating {len(weights)} candidates over {len(panel)} days...")
+    table = sweep(panel, inputs, weights, chunk_size=chunk_size,
+                  processes=processes, sort_by=sort_by)
+    click.echo(format_table(table, tickers, top))
+    current = int((table["candidate"] == 0).to_numpy().argmax()) + 1
+    click.echo(f"Current PORTFOLIO_WEIGHTS rank {current} of {len(table)}")
+
+
+@cli.command()
+@click.option('--tickers', 'counts', type=int, multiple=True, default=DEFAULT_LOAD_TICKERS,
+              show_default=True, help='Tickers uploaded in a run (repeatable)')
+@click.option('--years', default=10, show_default=True,
+              help='Years of daily prices of every ticker')
+@click.option('--jobs', default=4, show_default=True,
+              help='Tickers downloaded and uploaded at the same time')
+@click.option('--latency', default=0.0, show_default=True,
+              help='Milliseconds the stand-in waits before every answer')
+@click.option('--error-rate', default=0.0, show_default=True,
+              help='Share of the requests answered with 503 (0-1)')
+@incremental_option
+def loadtest(counts: tuple, years: int, jobs: int, latency: float, error_rate: float,
+             incremental: bool):
+    """Load-test upload-all against an in-process VictoriaMetrics.
+
+    Runs the upload pipeline with synthetic prices for each number of
+    tickers and reports requests per second, bytes sent and the end to
+    end time. Nothing is downloaded and no VictoriaMetrics is needed.
+    """
+    from pyfinance.config import TICKERS
+    from pyfinance.loadtest import format_results, run_load
+    if not 0 <= error_rate < 1:
+        raise click.BadParameter("must be at least 0 and below 1", param_hint="--error-rate")
+    if min(counts) < len(TICKERS):
+        raise click.BadParameter(f"must be at least {len(TICKERS)}, the configured tickers",
+                                 param_hint="--tickers")
+    results = []
+    for count in counts:
+        click.echo(f"Uploading {count} tickers...")
+        results.append(run_load(count, years=years, jobs=jobs, latency=latency / 1000,
+                                error_rate=error_rate, incremental=incremental))
+    click.echo(format_results(results))
 
 
 @cli.command()
@@ -0,0 +1,37 @@
+"""Defaults shared by the commands and the modules that run them.
+
+The CLI builds its options from these at import time, so this module
+imports nothing heavy: importing numpy, pandas, requests or yfinance here
+would slow down every command, even the ones that never use them.
+"""
+import os
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pyfinance")
+
+# Histories refreshed less than this many seconds ago are served from disk.
+DEFAULT_MAX_AGE = 12 * 60 * 60
+
+# rebalance-batch: rows read at a time, and the output formats
+BATCH_CHUNK_SIZE = 100_000
+BATCH_FORMATS = ("csv", "jsonl")
+
+# montecarlo
+DEFAULT_PATHS = 1000
+DEFAULT_BLOCK_SIZE = 20  # About one month of trading days
+PATHS_CHUNK_SIZE = 250  # Paths simulated together
+
+# rolling: trading days between contributions, about one month
+DEFAULT_EVERY = 21
+
+# sweep: candidates evaluated together; bounds the days x candidates matrices
+SWEEP_CHUNK_SIZE = 500
+
+# loadtest: tickers uploaded in each run
+DEFAULT_LOAD_TICKERS = (10, 100, 1000)
+
+# Metrics the sweep candidates can be ranked by, and whether lower is better
+SORT_COLUMNS = {
+    "final_value": False,
+    "cagr": False,
+    "max_drawdown": True,
+}
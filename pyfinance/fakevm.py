@@ -0,0 +1,277 @@
+"""In-process stand-in for VictoriaMetrics, for load tests and offline runs.
+
+FakeVictoriaMetrics serves the endpoints VictoriaMetricsClient uses from a
+thread of the current process and keeps the points in memory:
+
+    POST /api/v1/import                    JSON lines
+    POST /api/v1/import/csv                timestamp,value lines
+    POST /api/v1/admin/tsdb/delete_series  match[] selectors
+    GET  /api/v1/export                    JSON lines of the matching series
+    POST /api/v1/export                    the same, with a form body
+    GET  /api/v1/query                     only tlast_over_time(<selector>[...])
+    GET  /internal/resetRollupResultCache
+    GET  /health
+
+Bodies may be gzip-compressed and sent with chunked transfer encoding;
+form-encoded bodies add their fields to the ones of the query string.
+Selectors are the plain ones of format_selector: name{label="value",...},
+where an empty value matches series without the label. Every request can
+be delayed by ``latency`` seconds, and a share ``error_rate`` of them
+answered with 503 instead.
+"""
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Sorted (label, value) pairs of a series, the metric name as __name__
+SeriesKey = Tuple[Tuple[str, str], ...]
+
+_SELECTOR = re.compile(r'^\s*([A-Za-z_:][\w:]*)\s*(?:\{(.*)\})?\s*$')
+_LABEL = re.compile(r'([A-Za-z_]\w*)\s*=\s*"((?:[^"\\]|\\.)*)"')
+_TLAST = re.compile(r'^\s*tlast_over_time\((.*)\[[^\]]+\]\)\s*$')
+
+
+def parse_selector(selector: str) -> Tuple[str, Dict[str, str]]:
+    """Metric name and labels of a selector like finance_close{ticker="usa"}.
+
+    Raises:
+        ValueError: If the selector is not a plain name{label="value"} one
+    """
+    match = _SELECTOR.match(selector)
+    if match is None:
+        raise ValueError(f"Unsupported selector: {selector}")
+    labels = {name: json.loads(f'"{value}"') for name, value in _LABEL.findall(match.group(2) or "")}
+    return match.group(1), labels
+
+
+def _matches(key: SeriesKey, name: str, labels: Dict[str, str]) -> bool:
+    series_labels = dict(key)
+    return (series_labels.get("__name__") == name
+            and all(series_labels.get(label, "") == value for label, value in labels.items()))
+
+
+@dataclass
+class FakeStats:
+    """Counters of the requests served."""
+    requests: Dict[str, int] = field(default_factory=dict)  # By path
+    errors: int = 0  # Injected 503 answers
+    bytes_received: int = 0  # Bodies as sent, before decompression
+    points_received: int = 0
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+
+class FakeVictoriaMetrics:
+    """VictoriaMetrics endpoints on a local port, with the points in memory."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None, port: int = 0):
+        """
+        Args:
+            latency: Seconds every request waits before it is answered
+            error_rate: Share of the requests answered with 503 (0-1)
+            seed: Seed of the injected errors, for reproducible runs
+            port: Port to listen on (default: any free port)
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stats = FakeStats()
+        self.series: Dict[SeriesKey, Dict[int, float]] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.vm = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeVictoriaMetrics":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeVictoriaMetrics":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def points(self) -> int:
+        """Points stored, over every series."""
+        with self._lock:
+            return sum(len(points) for points in self.series.values())
+
+    def add_points(self, labels: Dict[str, str], timestamps: List[int], values: List[float]) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            points = self.series.setdefault(key, {})
+            points.update(zip(map(int, timestamps), map(float, values)))
+            self.stats.points_received += len(timestamps)
+
+    def delete(self, selectors: List[str]) -> int:
+        """Delete the series matching any selector; returns how many."""
+        parsed = [parse_selector(selector) for selector in selectors]
+        with self._lock:
+            doomed = [key for key in self.series
+                      if any(_matches(key, name, labels) for name, labels in parsed)]
+            for key in doomed:
+                del self.series[key]
+        return len(doomed)
+
+    def find(self, selectors: List[str]) -> Dict[SeriesKey, Dict[int, float]]:
+        """Copy of the series matching any selector."""
+        parsed = [parse_selector(selector) for selector in selectors]
+        with self._lock:
+            return {key: dict(points) for key, points in self.series.items()
+                    if any(_matches(key, name, labels) for name, labels in parsed)}
+
+    def _inject_error(self) -> bool:
+        with self._lock:
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+            if failed:
+                self.stats.errors += 1
+            return failed
+
+    def _count(self, path: str, body_size: int) -> None:
+        with self._lock:
+            self.stats.requests[path] = self.stats.requests.get(path, 0) + 1
+            self.stats.bytes_received += body_size
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like VictoriaMetrics
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    @property
+    def vm(self) -> FakeVictoriaMetrics:
+        return self.server.vm
+
+    def do_GET(self) -> None:
+        self._serve({
+            "/api/v1/export": self._export,
+            "/api/v1/query": self._query,
+            "/internal/resetRollupResultCache": lambda params, body: (200, b""),
+            "/health": lambda params, body: (200, b"OK"),
+        })
+
+    def do_POST(self) -> None:
+        self._serve({
+            "/api/v1/import": self._import,
+            "/api/v1/import/csv": self._import_csv,
+            "/api/v1/admin/tsdb/delete_series": self._delete_series,
+            "/api/v1/export": self._export,
+        })
+
+    def _serve(self, routes) -> None:
+        url = urlsplit(self.path)
+        raw = self._read_body()
+        self.vm._count(url.path, len(raw))
+        if self.vm.latency:
+            time.sleep(self.vm.latency)
+        route = routes.get(url.path)
+        if route is None:
+            status, body = 404, b"unsupported path\n"
+        elif self.vm._inject_error():
+            status, body = 503, b"injected error\n"
+        else:
+            if self.headers.get("Content-Encoding") == "gzip":
+                raw = gzip.decompress(raw)
+            params = parse_qs(url.query, keep_blank_values=True)
+            if self.headers.get("Content-Type") == "application/x-www-form-urlencoded":
+                for name, values in parse_qs(raw.decode(), keep_blank_values=True).items():
+                    params.setdefault(name, []).extend(values)
+            try:
+                status, body = route(params, raw)
+            except (ValueError, KeyError) as e:
+                status, body = 400, f"{e}\n".encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _import(self, params, body: bytes) -> Tuple[int, bytes]:
+        for line in body.splitlines():
+            if line.strip():
+                row = json.loads(line)
+                self.vm.add_points(row["metric"], row["timestamps"], row["values"])
+        return 204, b""
+
+    def _import_csv(self, params, body: bytes) -> Tuple[int, bytes]:
+        # Only the format of upload_csv: 1:time:unix_ms,2:metric:<name>
+        metric = params["format"][0].split(",")[1].split(":")[2]
+        labels = {"__name__": metric}
+        for extra in params.get("extra_label", []):
+            name, value = extra.split("=", 1)
+            labels[name] = value
+        timestamps, values = [], []
+        for line in body.decode().splitlines():
+            if line.strip():
+                timestamp, value = line.split(",")
+                timestamps.append(int(timestamp))
+                values.append(float(value))
+        self.vm.add_points(labels, timestamps, values)
+        return 204, b""
+
+    def _delete_series(self, params, body: bytes) -> Tuple[int, bytes]:
+        self.vm.delete(params["match[]"])
+        return 204, b""
+
+    def _export(self, params, body: bytes) -> Tuple[int, bytes]:
+        start = float(params["start"][0]) * 1000 if "start" in params else float("-inf")
+        end = float(params["end"][0]) * 1000 if "end" in params else float("inf")
+        lines = []
+        for key, points in self.vm.find(params["match[]"]).items():
+            timestamps = sorted(t for t in points if start <= t <= end)
+            if timestamps:
+                lines.append(json.dumps({
+                    "metric": dict(key),
+                    "values": [points[t] for t in timestamps],
+                    "timestamps": timestamps,
+                }, separators=(",", ":")))
+        return 200, "".join(f"{line}\n" for line in lines).encode()
+
+    def _query(self, params, body: bytes) -> Tuple[int, bytes]:
+        match = _TLAST.match(params["query"][0])
+        if match is None:
+            raise ValueError(f"Unsupported query: {params['query'][0]}")
+        result = []
+        for key, points in self.vm.find([match.group(1)]).items():
+            if points:
+                metric = {name: value for name, value in key if name != "__name__"}
+                result.append({"metric": metric, "value": [time.time(), str(max(points) / 1000)]})
+        return 200, json.dumps({"status": "success",
+                                "data": {"resultType": "vector", "result": result}}).encode()
@@ -1,10 +1,12 @@
 import datetime
-import io
-from typing import Dict, List, Optional
+import functools
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
 
+from pyfinance import serialize
+from pyfinance.cache import HistoryCache, HistoryRegistry, download_history
 from pyfinance.config import (
     PORTFOLIO_WEIGHTS,
     TICKERS,
@@ -12,49 +14,83 @@ from pyfinance.config import (
     get_portfolio_tickers,
     get_ticker_by_name,
 )
-from pyfinance.victoria import VictoriaMetricsClient
+from pyfinance.metrics import RunMetrics
+from pyfinance.panel import PricePanel
+from pyfinance.pipeline import run_tasks
+from pyfinance.store import HistoryStore
+from pyfinance.victoria import MetricSeries, VictoriaMetricsClient
+
+# Days before the last stored point compared to detect a rewritten history
+OVERLAP_DAYS = 30
+
+# (selector to delete or None, series to import or None)
+SeriesPlan = Tuple[Optional[str], Optional[MetricSeries]]
 
 
 class TickerUploader:
     """Handles downloading ticker data and uploading to VictoriaMetrics."""
 
-    def __init__(self, vm_url: str = "http://localhost:8428"):
-        self.vm_client = VictoriaMetricsClient(vm_url)
+    def __init__(
+        self,
+        vm_url: str = "http://localhost:8428",
+        cache: Optional[HistoryCache] = None,
+        registry: Optional[HistoryRegistry] = None,
+        incremental: bool = False,
+        metrics: Optional[RunMetrics] = None,
+    ):
+        # Timings and counters of the stages, shared with the client
+        self.metrics = metrics or RunMetrics()
+        self.vm_client = VictoriaMetricsClient(vm_url, metrics=self.metrics)
+        self.cache = cache
+        # Append only the new points instead of replacing the whole series
+        self.incremental = incremental
+        # Histories downloaded during this run, shared by every step
+        self.registry = registry or HistoryRegistry(
+            lambda yahoo_ticker: self.download_history(yahoo_ticker)
+        )
 
     def download_history(self, yahoo_ticker: str) -> pd.DataFrame:
         """Download full historical data from Yahoo Finance.
         
+        If a history cache is configured, only the missing tail is
+        downloaded and the rest is read from disk.
+        
+        Args:
+            yahoo_ticker: Yahoo Finance ticker symbol
+            
+        Returns:
+            DataFrame with historical data
+        """
+        if self.cache is not None:
+            return self.cache.history(yahoo_ticker)
+        return download_history(yahoo_ticker)
+
+    def get_history(self, yahoo_ticker: str) -> pd.DataFrame:
+        """Return the history of a ticker, downloading it once per run.
+        
         Args:
             yahoo_ticker: Yahoo Finance ticker symbol
             
         Returns:
             DataFrame with historical data
         """
-        stock = yf.Ticker(yahoo_ticker)
-        history = stock.history(period="max")
-        if not history.empty:
-            history.index = history.index.normalize().tz_localize(None)
-        return history
+        return self.registry.get(yahoo_ticker)
 
-    def format_csv(self, df: pd.DataFrame) -> str:
+    def format_csv(self, df: pd.DataFrame) -> bytes:
         """Format DataFrame to CSV for VictoriaMetrics import.
         
-        Only includes Date and Close columns.
+        Only includes the date (unix milliseconds, VictoriaMetrics'
+        unix_ms time format) and the Close column, without header.
         
         Args:
             df: DataFrame with Close column and DatetimeIndex
             
         Returns:
-            CSV string with Date,Close format
+            CSV bytes with timestamp,close lines
         """
-        output_df = pd.DataFrame({
-            'Date': df.index.strftime('%Y-%m-%dT%H:%M:%SZ'),
-            'Close': df['Close'].values
-        })
-        
-        buffer = io.StringIO()
-        output_df.to_csv(buffer, index=False)
-        return buffer.getvalue()
+        with self.metrics.stage("format_csv"):
+            timestamps = df.index.values.astype("datetime64[ms]").astype(np.int64)
+            return serialize.format_csv(timestamps, df["Close"].to_numpy(dtype=np.float64))
 
     def upload_ticker(self, name: str, yahoo_ticker: str) -> None:
         """Download and upload a single ticker to VictoriaMetrics.
@@ -63,17 +99,104 @@ class TickerUploader:
             name: Ticker name for labeling in VictoriaMetrics
             yahoo_ticker: Yahoo Finance ticker symbol
         """
+        self.publish([self.plan_ticker(name, yahoo_ticker)])
+
+    def plan_ticker(self, name: str, yahoo_ticker: str) -> SeriesPlan:
+        """Download a ticker and plan its upload without sending it.
+        
+        Args:
+            name: Ticker name for labeling in VictoriaMetrics
+            yahoo_ticker: Yahoo Finance ticker symbol
+            
+        Returns:
+            The upload plan, see plan_series
+        """
         # Download history
-        history = self.download_history(yahoo_ticker)
+        with self.metrics.stage("download", name):
+            history = self.get_history(yahoo_ticker)
         if history.empty:
             raise ValueError(f"No data found for ticker: {yahoo_ticker}")
         
-        # Format CSV
-        csv_data = self.format_csv(history)
+        return self.plan_series(name, history)
+
+    def sync_series(
+        self, name: str, df: pd.DataFrame, metric_name: str = "finance_close"
+    ) -> None:
+        """Make the series stored in VictoriaMetrics match the DataFrame.
+        
+        Args:
+            name: Ticker name for labeling in VictoriaMetrics
+            df: DataFrame with Close column and DatetimeIndex
+            metric_name: Name of the metric (default: finance_close)
+        """
+        self.publish([self.plan_series(name, df, metric_name)])
+
+    def plan_series(
+        self, name: str, df: pd.DataFrame, metric_name: str = "finance_close",
+        labels: Optional[Dict[str, str]] = None, absent: Sequence[str] = (),
+    ) -> SeriesPlan:
+        """Decide what has to be deleted and imported to store the DataFrame.
+        
+        In incremental mode only the points after the last stored timestamp
+        are imported. The series is replaced (delete and full import) when
+        incremental mode is off, the series does not exist yet, or the last
+        OVERLAP_DAYS already stored differ from the DataFrame, e.g. after
+        Yahoo adjusted the history for a dividend.
+        
+        Args:
+            name: Ticker name for labeling in VictoriaMetrics
+            df: DataFrame with Close column and DatetimeIndex
+            metric_name: Name of the metric (default: finance_close)
+            labels: Labels of the series besides the ticker
+            absent: Labels the series does not have; the series is told
+                apart from the ones that only add these labels to it
+            
+        Returns:
+            Tuple of (selector to delete or None, series to import or None)
+        """
+        with self.metrics.stage("plan", name):
+            return self._plan_series(name, df, metric_name, labels, absent)
+
+    def _plan_series(
+        self, name: str, df: pd.DataFrame, metric_name: str,
+        labels: Optional[Dict[str, str]], absent: Sequence[str],
+    ) -> SeriesPlan:
+        series = frame_to_series(df, metric_name, {"ticker": name, **(labels or {})})
+        series.absent = tuple(absent)
+        if self.incremental:
+            # Only the labels besides the ticker, None when there are none
+            other_labels = {k: v for k, v in series.selector_labels().items() if k != "ticker"}
+            last_ts = self.vm_client.last_timestamp(name, metric_name, labels=other_labels or None)
+            if last_ts is not None:
+                timestamps = np.asarray(series.timestamps)
+                values = np.asarray(series.values)
+                window_start = last_ts - OVERLAP_DAYS * 86_400_000
+                stored_ts, stored_values = self.vm_client.export_points(
+                    name, metric_name, start=window_start, labels=other_labels or None
+                )
+                overlap = (timestamps >= window_start) & (timestamps <= last_ts)
+                if serialize.series_checksum(timestamps[overlap], values[overlap]) == serialize.series_checksum(
+                    stored_ts, stored_values
+                ):
+                    new_points = timestamps > last_ts
+                    if not new_points.any():
+                        return None, None
+                    series.timestamps = timestamps[new_points]
+                    series.values = values[new_points]
+                    return None, series
+                print(f"Stored history of {name} changed, replacing the series")
         
         # Delete existing data and upload new
-        self.vm_client.delete_series(name)
-        self.vm_client.upload_csv(csv_data, name)
+        return series.selector(), series
+
+    def publish(self, plans: List[SeriesPlan]) -> None:
+        """Send the planned deletes and imports in batches, few requests for many series.
+        
+        Args:
+            plans: Upload plans returned by plan_series
+        """
+        self.vm_client.delete_matching([d for d, _ in plans if d is not None])
+        self.vm_client.import_series([s for _, s in plans if s is not None])
 
     def upload_ticker_by_name(self, name: str) -> None:
         """Upload ticker by its configured name.
@@ -85,39 +208,41 @@ class TickerUploader:
         self.upload_ticker(name, ticker_config.yahoo_ticker)
 
     def calculate_mymix(
-        self, histories: Dict[str, pd.DataFrame]
+        self, histories: Union[Dict[str, pd.DataFrame], PricePanel, HistoryStore]
     ) -> pd.DataFrame:
         """Calculate weighted portfolio average.
         
         Args:
-            histories: Dict mapping ticker name to its history DataFrame
+            histories: Dict mapping ticker name to its history DataFrame,
+                the aligned prices of the run, or the store holding them
             
         Returns:
-            DataFrame with weighted Close values
+            DataFrame with weighted Close values on the dates common to
+            every portfolio ticker
         """
-        # Get common dates across all portfolios
-        all_indices = [h.index for h in histories.values()]
-        common_dates = all_indices[0]
-        for idx in all_indices[1:]:
-            common_dates = common_dates.intersection(idx)
+        with self.metrics.stage("mymix"):
+            if isinstance(histories, HistoryStore):
+                panel = histories.read()
+            elif isinstance(histories, PricePanel):
+                panel = histories
+            else:
+                panel = PricePanel.from_histories(histories, tickers=list(PORTFOLIO_WEIGHTS))
+            weighted_close = panel.weighted(PORTFOLIO_WEIGHTS)
         
-        if len(common_dates) == 0:
+        if weighted_close.empty:
             raise ValueError("No common dates found across portfolio tickers")
         
-        # Calculate weighted average
-        weighted_close = pd.Series(0.0, index=common_dates)
-        for name, weight in PORTFOLIO_WEIGHTS.items():
-            ticker_close = histories[name].loc[common_dates, 'Close']
-            weighted_close += ticker_close * weight
-        
-        result = pd.DataFrame({'Close': weighted_close}, index=common_dates)
-        return result
+        return pd.DataFrame({'Close': weighted_close})
 
     def upload_mymix(self) -> None:
         """Download portfolio tickers and upload weighted average."""
+        self.publish([self.plan_mymix()])
+
+    def plan_mymix(self) -> SeriesPlan:
+        """Download portfolio tickers and plan the weighted average upload."""
         histories = {}
         for ticker_config in get_portfolio_tickers():
-            history = self.download_history(ticker_config.yahoo_ticker)
+            history = self.get_history(ticker_config.yahoo_ticker)
             if not history.empty:
                 histories[ticker_config.name] = history
         
@@ -126,22 +251,64 @@ class TickerUploader:
             raise ValueError(f"Missing data for tickers: {missing}")
         
         mymix_df = self.calculate_mymix(histories)
-        csv_data = self.format_csv(mymix_df)
-        
-        self.vm_client.delete_series("mymix")
-        self.vm_client.upload_csv(csv_data, "mymix")
+        return self.plan_series("mymix", mymix_df)
 
-    def upload_all(self) -> None:
-        """Upload all configured tickers including mymix."""
-        # Upload individual tickers
-        for ticker_config in TICKERS:
-            print(f"Uploading {ticker_config.name}...")
-            self.upload_ticker(ticker_config.name, ticker_config.yahoo_ticker)
+    def upload_all(self, jobs: int = 1, tickers: Optional[List[TickerConfig]] = None) -> None:
+        """Upload all configured tickers including mymix.
+        
+        Tickers are downloaded and compared with the stored series
+        concurrently. mymix waits for the portfolio histories through the
+        registry. Then every series is sent in one batched import, and the
+        cache reset runs last. A failing ticker does not stop the others;
+        the failures are raised together at the end.
+        
+        Args:
+            jobs: Maximum number of tickers processed at the same time
+            tickers: Tickers to upload (default: the configured ones)
+        """
+        tasks = {
+            ticker_config.name: functools.partial(
+                self._plan_ticker_task, ticker_config
+            )
+            for ticker_config in (TICKERS if tickers is None else tickers)
+        }
+        tasks["mymix"] = self._plan_mymix_task
+        plans, errors = run_tasks(tasks, jobs=jobs)
         
-        # Upload mymix
-        print("Calculating and uploading mymix...")
-        self.upload_mymix()
+        print(f"Uploading {len(plans)} series...")
+        self.publish(list(plans.values()))
         
         # Reset cache
         self.vm_client.reset_cache()
+        print(self.registry.stats())
+        if errors:
+            raise RuntimeError(f"Failed to upload: {', '.join(errors)}")
         print("Done!")
+
+    def _plan_ticker_task(self, ticker_config: TickerConfig) -> SeriesPlan:
+        print(f"Downloading {ticker_config.name}...")
+        return self.plan_ticker(ticker_config.name, ticker_config.yahoo_ticker)
+
+    def _plan_mymix_task(self) -> SeriesPlan:
+        print("Calculating mymix...")
+        return self.plan_mymix()
+
+
+def frame_to_series(df: pd.DataFrame, metric_name: str, labels: Dict[str, str]) -> MetricSeries:
+    """Convert the Close column of a DataFrame to a series to import.
+    
+    Points with a missing value are skipped.
+    
+    Args:
+        df: DataFrame with Close column and DatetimeIndex
+        metric_name: Name of the metric
+        labels: Labels of the series
+        
+    Returns:
+        MetricSeries with unix-millisecond timestamps
+    """
+    timestamps = df.index.values.astype("datetime64[ms]").astype(np.int64)
+    values = df["Close"].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    return MetricSeries(metric_name, labels, timestamps[valid], values[valid])
+
@@ -0,0 +1,137 @@
+"""Load test of the ingest pipeline against an in-process VictoriaMetrics.
+
+Each step runs TickerUploader.upload_all, the code of upload-all, for a
+growing number of synthetic tickers against a fresh FakeVictoriaMetrics.
+Prices come from a seeded random walk instead of Yahoo, so a run needs no
+network and gives the same points every time. The configured tickers are
+served from the same source, so mymix is planned and uploaded as usual.
+
+In incremental mode a first run stores the histories without their last
+day, and the measured run uploads only that day, like a daily upload.
+"""
+import contextlib
+import io
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import pandas as pd
+
+from pyfinance.cache import HistoryRegistry
+from pyfinance.config import TICKERS, TickerConfig
+from pyfinance.fakevm import FakeVictoriaMetrics
+from pyfinance.graphics import TickerUploader
+from pyfinance.metrics import BYTES_SENT, CALLS, DURATION, RunMetrics
+from pyfinance.synthetic import business_days, synthetic_close
+
+
+def synthetic_tickers(count: int) -> List[TickerConfig]:
+    """The configured tickers, plus synthetic ones up to ``count`` in total.
+
+    Raises:
+        ValueError: If ``count`` is below the number of configured tickers,
+            which are always uploaded
+    """
+    if count < len(TICKERS):
+        raise ValueError(f"The load test uploads the {len(TICKERS)} configured tickers, "
+                         f"{count} tickers are too few")
+    extra = [TickerConfig(f"load{i:04d}", f"LOAD{i:04d}") for i in range(count - len(TICKERS))]
+    return list(TICKERS) + extra
+
+
+class SyntheticPrices:
+    """Loader of close histories, the synthetic_close of the Yahoo ticker."""
+
+    def __init__(self, years: int, drop_days: int = 0):
+        """
+        Args:
+            years: Years of business days in every history
+            drop_days: Last days left out, to leave new points for a later run
+        """
+        self.dates = business_days(years)
+        self.drop_days = drop_days
+
+    def __call__(self, yahoo_ticker: str) -> pd.DataFrame:
+        history = pd.DataFrame({"Close": synthetic_close(yahoo_ticker, len(self.dates))}, index=self.dates)
+        return history.iloc[:len(history) - self.drop_days]
+
+
+@dataclass
+class LoadResult:
+    """Measures of one run of the pipeline."""
+    tickers: int
+    seconds: float  # End to end, from the first download to the cache reset
+    requests: int
+    errors: int  # Injected 503 answers, retried by the client
+    bytes_sent: int
+    points: int  # Points received by the server
+    import_latency: float  # Mean seconds of an import request, retries included
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.seconds
+
+    @property
+    def points_per_second(self) -> float:
+        return self.points / self.seconds
+
+
+def upload(vm: FakeVictoriaMetrics, tickers: List[TickerConfig], prices: SyntheticPrices,
+           jobs: int, incremental: bool, metrics: Optional[RunMetrics] = None) -> None:
+    """Run upload-all against the stand-in, without its progress output."""
+    uploader = TickerUploader(vm.url, registry=HistoryRegistry(prices),
+                              incremental=incremental, metrics=metrics)
+    with contextlib.redirect_stdout(io.StringIO()):
+        uploader.upload_all(jobs=jobs, tickers=tickers)
+
+
+def run_load(count: int, years: int = 10, jobs: int = 4, latency: float = 0.0,
+             error_rate: float = 0.0, incremental: bool = False,
+             seed: Optional[int] = 0) -> LoadResult:
+    """Upload ``count`` tickers to a fresh stand-in and measure the run.
+
+    Args:
+        count: Tickers uploaded, the configured ones included
+        years: Years of daily prices of every ticker
+        jobs: Tickers processed at the same time
+        latency: Seconds the stand-in waits before every answer
+        error_rate: Share of the requests answered with 503
+        incremental: Measure a daily incremental upload instead of a full one
+        seed: Seed of the injected errors
+
+    Returns:
+        The measures of the run
+
+    Raises:
+        ValueError: If ``count`` is below the number of configured tickers
+    """
+    tickers = synthetic_tickers(count)
+    with FakeVictoriaMetrics(latency=latency, error_rate=error_rate, seed=seed) as vm:
+        if incremental:
+            upload(vm, tickers, SyntheticPrices(years, drop_days=1), jobs, incremental=False)
+        before = (vm.stats.total_requests, vm.stats.errors, vm.stats.points_received)
+        metrics = RunMetrics()
+        start = time.perf_counter()
+        upload(vm, tickers, SyntheticPrices(years), jobs, incremental, metrics)
+        seconds = time.perf_counter() - start
+        import_calls = metrics.totals(CALLS).get("import", 0)
+        return LoadResult(
+            tickers=len(tickers),
+            seconds=seconds,
+            requests=vm.stats.total_requests - before[0],
+            errors=vm.stats.errors - before[1],
+            bytes_sent=int(sum(metrics.totals(BYTES_SENT).values())),
+            points=vm.stats.points_received - before[2],
+            import_latency=metrics.totals(DURATION).get("import", 0) / import_calls if import_calls else 0.0,
+        )
+
+
+def format_results(results: List[LoadResult]) -> str:
+    """Table of the runs, one line per ticker count."""
+    lines = [f"{'tickers':>8} {'seconds':>8} {'requests':>9} {'req/s':>8} {'errors':>7} "
+             f"{'MiB sent':>9} {'points':>10} {'points/s':>11} {'import ms':>10}"]
+    for r in results:
+        lines.append(f"{r.tickers:8d} {r.seconds:8.2f} {r.requests:9d} {r.requests_per_second:8.1f} "
+                     f"{r.errors:7d} {r.bytes_sent / 2**20:9.2f} {r.points:10d} "
+                     f"{r.points_per_second:11,.0f} {r.import_latency * 1000:10.1f}")
+    return "\n".join(lines)
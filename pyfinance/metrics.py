@@ -0,0 +1,111 @@
+"""Timings and counters of the stages of a run, pushed to VictoriaMetrics.
+
+TickerUploader, PortfolioSimulator and VictoriaMetricsClient record into a
+RunMetrics how long each stage took and how many times it ran, per ticker
+when the stage works on one ticker, plus the bytes sent, points written
+and retries of the requests. Stages may run inside others (e.g. export
+inside plan), so their durations overlap.
+
+The totals of a run are imported at its end as one point per series:
+
+    pyfinance_stage_duration_seconds{command, stage, ticker}
+    pyfinance_stage_calls{command, stage, ticker}
+    pyfinance_bytes_sent{command, stage, ticker}
+    pyfinance_points_written{command, stage, ticker}
+    pyfinance_retries{command, stage, ticker}
+
+Batched requests (import, delete of many series) carry no ticker label.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from pyfinance.victoria import MetricSeries, VictoriaMetricsClient
+
+DURATION = "pyfinance_stage_duration_seconds"
+CALLS = "pyfinance_stage_calls"
+BYTES_SENT = "pyfinance_bytes_sent"
+POINTS_WRITTEN = "pyfinance_points_written"
+RETRIES = "pyfinance_retries"
+
+# (metric, stage, ticker)
+Key = Tuple[str, str, str]
+
+
+class RunMetrics:
+    """Counters of a run, safe to update from the threads of the pipeline."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[Key, float] = {}
+
+    @contextmanager
+    def stage(self, stage: str, ticker: str = "") -> Iterator[None]:
+        """Time a stage, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._add((DURATION, stage, ticker), elapsed)
+                self._add((CALLS, stage, ticker), 1)
+
+    def add(self, metric: str, value: float, stage: str, ticker: str = "") -> None:
+        """Add to a counter, e.g. add(BYTES_SENT, 1024, "import")."""
+        with self._lock:
+            self._add((metric, stage, ticker), value)
+
+    def value(self, metric: str, stage: str, ticker: str = "") -> float:
+        return self._values.get((metric, stage, ticker), 0)
+
+    def totals(self, metric: str) -> Dict[str, float]:
+        """Value of a metric per stage, added over the tickers."""
+        totals: Dict[str, float] = {}
+        for (name, stage, _), value in list(self._values.items()):
+            if name == metric:
+                totals[stage] = totals.get(stage, 0) + value
+        return totals
+
+    def series(self, command: str, timestamp: Optional[int] = None) -> List["MetricSeries"]:
+        """One point per counter, labelled with the command of the run.
+
+        Args:
+            command: Command of the run, e.g. upload-all
+            timestamp: Unix milliseconds of the points (default: now)
+        """
+        # victoria imports this module
+        from pyfinance.victoria import MetricSeries
+        timestamp = timestamp if timestamp is not None else int(time.time() * 1000)
+        with self._lock:
+            values = sorted(self._values.items())
+        series = []
+        for (metric, stage, ticker), value in values:
+            labels = {"command": command, "stage": stage}
+            if ticker:
+                labels["ticker"] = ticker
+            series.append(MetricSeries(metric, labels, [timestamp], [value]))
+        return series
+
+    def push(self, vm_client: "VictoriaMetricsClient", command: str) -> int:
+        """Import the counters of the run.
+
+        Returns:
+            Number of series imported
+        """
+        series = self.series(command)
+        vm_client.import_series(series)
+        return len(series)
+
+    def summary(self) -> str:
+        """Seconds and calls of each stage, slowest first."""
+        durations = self.totals(DURATION)
+        calls = self.totals(CALLS)
+        lines = [f"{stage:>15}: {seconds:8.3f}s {int(calls[stage]):6d} calls"
+                 for stage, seconds in sorted(durations.items(), key=lambda item: -item[1])]
+        return "\n".join(["Stage timings:"] + lines)
+
+    def _add(self, key: Key, value: float) -> None:
+        self._values[key] = self._values.get(key, 0) + value
@@ -0,0 +1,263 @@
+"""Watch the values of a portfolio and plan its rebalance as soon as it needs one.
+
+RebalanceMonitor keeps the values of the assets and their total in memory.
+An asset is further than the threshold above its goal when
+
+    value / (goal + threshold) > total / 100
+
+and below it when value / (goal - threshold) < total / 100. Neither key
+depends on the total, so an update only changes the total and the two keys
+of one asset, kept in a max-heap and a min-heap. Comparing the tops of the
+heaps with the total tells whether the rule of RebalanceAssets may be
+crossed, and the asset on top crossing it by more than the rounding
+margin tells that it surely is. Only in between, near the threshold, the
+percentages of every asset are computed, and only when the rule is
+crossed RebalanceAssets plans the transfers.
+"""
+import heapq
+import json
+import math
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+from pyfinance.rebalance import Asset, RebalanceAssets, current_percentages, exceeds_threshold
+from pyfinance.victoria import MetricSeries, VictoriaMetricsClient
+
+DRIFT_METRIC = "finance_rebalance_drift"
+
+# Percentages are rounded to 2 decimals before the threshold rule, so the
+# keys leave half a hundredth of margin and the exact rule decides
+ROUNDING_MARGIN = 0.005
+
+# The heaps are rebuilt when they hold this many stale keys per asset
+COMPACT_FACTOR = 4
+
+DEFAULT_LOOKBACK_DAYS = 30  # Days of finance_close read to find the latest price
+
+# (asset name, value, unix milliseconds or None)
+Update = Tuple[str, float, Optional[int]]
+
+
+class RebalanceMonitor:
+    """Threshold rule of RebalanceAssets, checked on every update of a value."""
+
+    def __init__(self, assets: List[Asset], threeshold: float):
+        """
+        Args:
+            assets: Assets with their goal percentages and first values
+            threeshold: Threshold in percentage points (0-100)
+
+        Raises:
+            ValueError: If RebalanceAssets does not accept the assets
+        """
+        self.threeshold = threeshold
+        self.names = [asset.name for asset in assets]
+        self.goals = [asset.goal_percentage for asset in assets]
+        self.values = [float(asset.value) for asset in assets]
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        self._versions = [0] * len(assets)
+        self.total = sum(self.values)
+        self.has_to_be_rebalanced = self.plan().has_to_be_rebalanced
+        self._rebuild()
+
+    def update(self, name: str, value: float) -> bool:
+        """Set the value of an asset.
+
+        Args:
+            name: Asset name
+            value: Its new value
+
+        Returns:
+            True if the rule changed: the assets have to be rebalanced and
+            did not before, or the other way round
+
+        Raises:
+            KeyError: If the asset is not monitored
+        """
+        i = self._positions[name]
+        self.total += value - self.values[i]
+        self.values[i] = value
+        self._versions[i] += 1
+        if len(self._above) > COMPACT_FACTOR * len(self.values):
+            self._rebuild()
+        else:
+            self._push(i)
+        has_to_be_rebalanced = self._exceeds()
+        changed = has_to_be_rebalanced != self.has_to_be_rebalanced
+        self.has_to_be_rebalanced = has_to_be_rebalanced
+        return changed
+
+    def plan(self) -> RebalanceAssets:
+        """Rebalance of the current values, with its transfers when it has to be done."""
+        assets = [Asset(name, goal, value)
+                  for name, goal, value in zip(self.names, self.goals, self.values)]
+        return RebalanceAssets(assets, self.threeshold)
+
+    def drift(self) -> Dict[str, float]:
+        """Current percentage minus goal percentage of each asset."""
+        percentages = current_percentages(np.array(self.values))
+        return dict(zip(self.names, (percentages - np.array(self.goals)).tolist()))
+
+    def _exceeds(self) -> bool:
+        limit = self.total / 100
+        if limit <= 0:
+            return False
+        if -self._top(self._above) <= limit and self._top(self._below) >= limit:
+            return False
+        if self._beyond(self._above[0][2]) or self._beyond(self._below[0][2]):
+            return True
+        # Near the threshold: the exact rule, and the total without the
+        # float noise of the running sum
+        self.total = sum(self.values)
+        return bool(exceeds_threshold(np.array(self.goals), np.array(self.values), self.threeshold))
+
+    def _beyond(self, i: int) -> bool:
+        """If an asset is further from its goal than the threshold, whatever the rounding."""
+        percentage = self.values[i] * 100 / self.total
+        return abs(percentage - self.goals[i]) > self.threeshold + 2 * ROUNDING_MARGIN
+
+    def _keys(self, i: int) -> Tuple[float, float]:
+        """Keys of an asset in the heaps, see the module docstring."""
+        value, goal = self.values[i], self.goals[i]
+        above = goal + self.threeshold - ROUNDING_MARGIN
+        below = goal - self.threeshold + ROUNDING_MARGIN
+        above_key = value / above if above > 0 else math.inf
+        below_key = value / below if below > 0 else math.inf
+        return above_key, below_key
+
+    def _push(self, i: int) -> None:
+        above_key, below_key = self._keys(i)
+        heapq.heappush(self._above, (-above_key, self._versions[i], i))
+        heapq.heappush(self._below, (below_key, self._versions[i], i))
+
+    def _top(self, heap: List[Tuple[float, int, int]]) -> float:
+        """Key on top of a heap, dropping the stale keys of updated assets."""
+        while heap[0][1] != self._versions[heap[0][2]]:
+            heapq.heappop(heap)
+        return heap[0][0]
+
+    def _rebuild(self) -> None:
+        # Also drop the float noise of the running total
+        self.total = sum(self.values)
+        keys = [self._keys(i) for i in range(len(self.values))]
+        self._above = [(-above, self._versions[i], i) for i, (above, _) in enumerate(keys)]
+        self._below = [(below, self._versions[i], i) for i, (_, below) in enumerate(keys)]
+        heapq.heapify(self._above)
+        heapq.heapify(self._below)
+
+
+def drift_series(drift: Dict[str, float], timestamp: int) -> List[MetricSeries]:
+    """One finance_rebalance_drift{asset=...} point per asset."""
+    return [MetricSeries(DRIFT_METRIC, {"asset": name}, [timestamp], [value])
+            for name, value in drift.items()]
+
+
+def feed_updates(lines: Iterable[str]) -> Iterator[Update]:
+    """Updates of a JSON-lines feed.
+
+    Each line is {"asset": "US", "value": 1234.5}, with an optional
+    "timestamp" in unix milliseconds. Lines that cannot be read are skipped
+    with a warning.
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            update = json.loads(line)
+            timestamp = update.get("timestamp")
+            yield (update["asset"], float(update["value"]),
+                   int(timestamp) if timestamp is not None else None)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Warning: Skipping line {number} of the feed: {e!r}", file=sys.stderr)
+
+
+def poll_updates(
+    vm_client: VictoriaMetricsClient, values: Dict[str, float], interval: float,
+    polls: Optional[int] = None, lookback_days: int = DEFAULT_LOOKBACK_DAYS, sleep=time.sleep,
+) -> Iterator[Update]:
+    """Values of the assets at the latest finance_close price of their tickers.
+
+    The shares of each asset are its value over the first price read; after
+    that, every new price gives the value of those shares.
+
+    Args:
+        vm_client: Client of the VictoriaMetrics holding finance_close
+        values: Dict mapping ticker name to the value of the asset
+        interval: Seconds between reads
+        polls: Number of reads (default: forever)
+        lookback_days: Days read back to find the latest price
+        sleep: Function waiting between reads
+
+    Yields:
+        An update for each asset whose latest price changed
+    """
+    shares: Dict[str, float] = {}
+    latest: Dict[str, Tuple[int, float]] = {}
+    poll = 0
+    while polls is None or poll < polls:
+        if poll:
+            sleep(interval)
+        poll += 1
+        now = int(time.time() * 1000)
+        frame = vm_client.export_frame(list(values), start=now - lookback_days * 86_400_000)
+        for name in frame.columns:
+            prices = frame[name].dropna()
+            if prices.empty:
+                continue
+            point = (prices.index[-1].value // 1_000_000, float(prices.iloc[-1]))
+            if name not in shares:
+                shares[name] = values[name] / point[1]
+            elif latest[name] != point:
+                yield name, shares[name] * point[1], point[0]
+            latest[name] = point
+        if poll == 1:
+            missing = [name for name in values if name not in shares]
+            if missing:
+                print(f"Warning: No finance_close price in the last {lookback_days} days for "
+                      f"{', '.join(missing)}", file=sys.stderr)
+
+
+def run_monitor(
+    monitor: RebalanceMonitor, updates: Iterable[Update],
+    vm_client: Optional[VictoriaMetricsClient] = None, output: TextIO = sys.stdout,
+) -> int:
+    """Apply the updates, reporting every time the rule changes.
+
+    The drift of every asset is uploaded at the start and each time the
+    rule changes. When the assets have to be rebalanced the transfers of
+    RebalanceAssets are printed.
+
+    Args:
+        monitor: Monitor of the portfolio
+        updates: Updates of the values, e.g. from feed_updates or poll_updates
+        vm_client: Client to upload the drift series (default: no upload)
+        output: Where the reports are written
+
+    Returns:
+        Number of rebalances planned
+    """
+    def report(timestamp: Optional[int]) -> None:
+        if monitor.has_to_be_rebalanced:
+            print(monitor.plan().information(), file=output, flush=True)
+        else:
+            print(f"The assets do not have to be rebalanced. The drifts are {monitor.drift()}",
+                  file=output, flush=True)
+        if vm_client is not None:
+            timestamp = timestamp if timestamp is not None else int(time.time() * 1000)
+            vm_client.import_series(drift_series(monitor.drift(), timestamp))
+
+    rebalances = int(monitor.has_to_be_rebalanced)
+    report(None)
+    for name, value, timestamp in updates:
+        try:
+            changed = monitor.update(name, value)
+        except KeyError:
+            print(f"Warning: {name} is not in the portfolio", file=sys.stderr)
+            continue
+        if changed:
+            rebalances += monitor.has_to_be_rebalanced
+            report(timestamp)
+    return rebalances
@@ -0,0 +1,283 @@
+"""Monte Carlo simulation of the inputs schedule under resampled history.
+
+Daily returns of every asset are resampled with a circular block
+bootstrap, so volatility clusters and short-term momentum survive the
+resampling. Paths are simulated in chunks, each chunk with its own seed
+spawned from one SeedSequence, so the result only depends on the seed and
+the chunk size, never on the number of worker processes.
+
+Percentiles are computed from a per-day histogram of value / invested
+ratios (log-spaced bins). Chunks only add counts to it, so memory does not
+grow with the number of paths.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.cache import HistoryCache
+from pyfinance.defaults import (DEFAULT_BLOCK_SIZE, DEFAULT_PATHS,
+                                PATHS_CHUNK_SIZE as DEFAULT_CHUNK_SIZE)
+from pyfinance.graphics import SeriesPlan, frame_to_series
+from pyfinance.panel import PricePanel
+from pyfinance.pipeline import worker_args, worker_pool
+from pyfinance.simulation import InputLoader, PortfolioSimulator
+from pyfinance.sweep import invested_per_day
+
+DEFAULT_PERCENTILES = (5, 50, 95)
+
+# Own metric, so simulate never deletes or reads the bands as its series
+BAND_METRIC = "finance_simulation_band"
+
+# Histogram of value / invested ratios: 0.78% wide bins from 0.02x to 50x.
+# Ratios outside the range are counted in the first or last bin.
+RATIO_MIN = 0.02
+RATIO_MAX = 50.0
+RATIO_BINS = 1000
+
+def block_bootstrap_indices(
+    rng: np.random.Generator, n_returns: int, paths: int, days: int, block_size: int
+) -> np.ndarray:
+    """Indices of resampled returns, in blocks of consecutive days.
+
+    Blocks wrap around the end of the history (circular block bootstrap),
+    so every return has the same chance of being drawn.
+
+    Returns:
+        Matrix (paths x days) of indices into the returns
+    """
+    blocks = -(-days // block_size)
+    starts = rng.integers(0, n_returns, size=(paths, blocks))
+    indices = (starts[:, :, None] + np.arange(block_size)) % n_returns
+    return indices.reshape(paths, blocks * block_size)[:, :days]
+
+
+def simulate_paths(
+    returns: np.ndarray,
+    invested: np.ndarray,
+    rng: np.random.Generator,
+    paths: int,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> np.ndarray:
+    """Value of the investments along resampled price paths.
+
+    Args:
+        returns: Historical daily returns of the asset
+        invested: Money invested on each simulated day
+        rng: Random generator of this chunk
+        paths: Number of paths
+        block_size: Consecutive days drawn together
+
+    Returns:
+        Matrix (paths x days) with the value on each day
+    """
+    days = len(invested)
+    indices = block_bootstrap_indices(rng, len(returns), paths, days - 1, block_size)
+    # Price of each path relative to the first day
+    prices = np.ones((paths, days))
+    np.cumprod(1 + returns[indices], axis=1, out=prices[:, 1:])
+    shares = np.cumsum(invested / prices, axis=1)
+    return shares * prices
+
+
+class RatioHistogram:
+    """Per-day histogram of value / invested ratios, mergeable across chunks."""
+
+    def __init__(self, days: int, bins: int = RATIO_BINS,
+                 low: float = RATIO_MIN, high: float = RATIO_MAX):
+        self.bins = bins
+        self.log_low = np.log(low)
+        self.log_width = (np.log(high) - self.log_low) / bins
+        self.counts = np.zeros((days, bins), dtype=np.int32)
+        self.paths = 0
+
+    def add(self, ratios: np.ndarray) -> None:
+        """Count a chunk of paths (paths x days)."""
+        paths, days = ratios.shape
+        with np.errstate(divide="ignore"):
+            bins = np.floor((np.log(ratios) - self.log_low) / self.log_width)
+        bins = np.clip(np.nan_to_num(bins, nan=0, neginf=0), 0, self.bins - 1).astype(np.int64)
+        flat = np.arange(days) * self.bins + bins
+        self.counts += np.bincount(
+            flat.ravel(), minlength=days * self.bins
+        ).reshape(days, self.bins).astype(np.int32)
+        self.paths += paths
+
+    def merge(self, other: "RatioHistogram") -> None:
+        self.counts += other.counts
+        self.paths += other.paths
+
+    def percentile(self, q: float) -> np.ndarray:
+        """Ratio at percentile q (0-100) of each day, interpolated within bins."""
+        target = q / 100 * self.paths
+        cumulative = np.cumsum(self.counts, axis=1, dtype=np.int64)
+        bins = np.minimum((cumulative < target).sum(axis=1), self.bins - 1)
+        rows = np.arange(len(bins))
+        before = cumulative[rows, bins] - self.counts[rows, bins]
+        inside = np.divide(
+            target - before, self.counts[rows, bins],
+            out=np.zeros(len(bins)), where=self.counts[rows, bins] > 0,
+        )
+        return np.exp(self.log_low + (bins + np.clip(inside, 0, 1)) * self.log_width)
+
+
+def _simulate_chunks(
+    returns: np.ndarray, invested: np.ndarray, block_size: int,
+    tasks: Sequence[Tuple[np.random.SeedSequence, int]],
+) -> RatioHistogram:
+    """Simulate chunks of paths, each (seed, paths), into one histogram."""
+    total = np.cumsum(invested)
+    histogram = RatioHistogram(len(invested))
+    for seed, paths in tasks:
+        values = simulate_paths(returns, invested, np.random.default_rng(seed), paths, block_size)
+        histogram.add(np.divide(values, total, out=np.ones_like(values), where=total > 0))
+    return histogram
+
+
+def _simulate_chunks_in_worker(tasks: Sequence[Tuple[np.random.SeedSequence, int]]) -> RatioHistogram:
+    return _simulate_chunks(*worker_args(), tasks)
+
+
+def simulate_bands(
+    returns: np.ndarray,
+    invested: np.ndarray,
+    paths: int = DEFAULT_PATHS,
+    seed: Optional[int] = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    processes: int = 1,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+) -> Dict[float, np.ndarray]:
+    """Percentile bands of the value of the investments on each day.
+
+    Args:
+        returns: Historical daily returns of the asset
+        invested: Money invested on each simulated day
+        paths: Number of resampled paths
+        seed: Seed of the simulation (None for a random one)
+        block_size: Consecutive days drawn together
+        chunk_size: Paths simulated together; bounds memory
+        processes: Worker processes; 1 simulates in this process
+        percentiles: Percentiles to return (0-100)
+
+    Returns:
+        Dict mapping each percentile to the value on each day
+    """
+    sizes = [min(chunk_size, paths - start) for start in range(0, paths, chunk_size)]
+    tasks = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+
+    if processes > 1:
+        # One histogram per worker, merged here
+        batches = [tasks[worker::processes] for worker in range(processes)]
+        with worker_pool(processes, returns, invested, block_size) as executor:
+            histograms = list(executor.map(_simulate_chunks_in_worker, batches))
+        histogram = histograms[0]
+        for other in histograms[1:]:
+            histogram.merge(other)
+    else:
+        histogram = _simulate_chunks(returns, invested, block_size, tasks)
+
+    total = np.cumsum(invested)
+    return {q: histogram.percentile(q) * total for q in percentiles}
+
+
+class MonteCarloSimulator:
+    """Simulates the inputs schedule over resampled histories of every asset."""
+
+    def __init__(self, vm_url: str = "http://localhost:8428",
+                 cache: Optional[HistoryCache] = None,
+                 paths: int = DEFAULT_PATHS,
+                 seed: Optional[int] = None,
+                 block_size: int = DEFAULT_BLOCK_SIZE,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 processes: int = 1):
+        self.simulator = PortfolioSimulator(vm_url, cache=cache)
+        self.uploader = self.simulator.uploader
+        self.paths = paths
+        self.seed = seed
+        self.block_size = block_size
+        self.chunk_size = chunk_size
+        self.processes = processes
+
+    def schedule(self, inputs: pd.Series, years: float = 0) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        """Business days simulated and the money invested on each of them.
+
+        The schedule runs from the first input to the last one, or for
+        ``years`` from the first input if that is later.
+        """
+        start = inputs.index.min()
+        end = max(inputs.index.max(), start + pd.DateOffset(days=round(years * 365.25)))
+        dates = pd.bdate_range(start, end)
+        daily_inputs = inputs.groupby(inputs.index).sum()
+        return dates, invested_per_day(dates, daily_inputs)
+
+    def simulate_asset(
+        self, name: str, close: pd.Series, dates: pd.DatetimeIndex, invested: np.ndarray
+    ) -> pd.DataFrame:
+        """Percentile bands of one asset, one column per percentile (p5, p50...)."""
+        returns = close.pct_change().dropna().to_numpy(dtype=np.float64)
+        if len(returns) == 0:
+            raise ValueError(f"Not enough history to resample {name}")
+        # Every asset gets its own stream, derived from the seed and its name
+        seed = None if self.seed is None else [self.seed, *name.encode()]
+        bands = simulate_bands(
+            returns, invested, paths=self.paths, seed=seed,
+            block_size=self.block_size, chunk_size=self.chunk_size,
+            processes=self.processes,
+        )
+        return pd.DataFrame({f"p{q:g}": values for q, values in bands.items()}, index=dates)
+
+    def run(self, inputs_file: str, years: float = 0, jobs: int = 1, source: str = "yahoo"):
+        """Simulate every asset and upload its percentile bands to VictoriaMetrics.
+
+        Each band is a finance_simulation_band series labelled with the
+        ticker and band="p5", "p50" or "p95".
+
+        Args:
+            inputs_file: Path to CSV file with Date,Quantity columns.
+            years: Minimum length of the simulation from the first input.
+            jobs: Maximum number of downloads running at the same time.
+            source: "yahoo" (or its cache) or "vm", see PortfolioSimulator.run
+        """
+        inputs = InputLoader.load_inputs(inputs_file)
+        if inputs.empty:
+            print("No inputs found.")
+            return
+
+        histories, errors = self.simulator.load_histories(source, jobs=jobs)
+        panel = PricePanel.from_histories(histories)
+        try:
+            panel = panel.with_column('mymix', self.uploader.calculate_mymix(panel)['Close'])
+        except (KeyError, ValueError) as e:
+            print(f"Error calculating mymix: {e}")
+
+        dates, invested = self.schedule(inputs, years)
+        plans = []
+        for name in panel.tickers:
+            print(f"Simulating {self.paths} paths of {name}...")
+            try:
+                bands = self.simulate_asset(name, panel.close(name), dates, invested)
+            except ValueError as e:
+                print(f"Error in {name}: {e}")
+                errors[name] = e
+                continue
+            plans.extend(plan_bands(name, bands))
+
+        print(f"Uploading {len(plans)} series...")
+        self.uploader.publish(plans)
+        self.uploader.vm_client.reset_cache()
+        print("Monte Carlo simulation complete.")
+        if errors:
+            raise RuntimeError(f"Failed to simulate: {', '.join(errors)}")
+
+
+def plan_bands(name: str, bands: pd.DataFrame) -> List[SeriesPlan]:
+    """Upload plans replacing the band series of an asset."""
+    plans = []
+    for band in bands.columns:
+        series = frame_to_series(
+            bands[[band]].rename(columns={band: 'Close'}),
+            BAND_METRIC, {"ticker": name, "band": band},
+        )
+        plans.append((series.selector(), series))
+    return plans
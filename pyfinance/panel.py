@@ -0,0 +1,164 @@
+"""Close prices of several tickers aligned on one date index.
+
+A PricePanel is built once per run from the downloaded histories and
+shared by mymix, the simulation and the analytics, so the dates are
+aligned only once and every consumer reads the same float64 matrix.
+"""
+from typing import List, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Alignment policies
+INTERSECTION = "intersection"  # Only the dates every ticker has
+UNION = "union"  # Every date of any ticker, NaN where a ticker has no price
+FFILL = "ffill"  # Union, carrying the last known price forward
+
+ALIGNMENTS = (INTERSECTION, UNION, FFILL)
+
+
+class PricePanel:
+    """Dense dates x tickers matrix of Close prices.
+
+    Attributes:
+        index: Sorted DatetimeIndex shared by every ticker
+        tickers: Ticker names, one per column
+        values: float64 matrix (dates x tickers), column-major so that each
+            ticker is a contiguous view. NaN where a ticker has no price.
+        observed: Boolean matrix, True where the price was in the history
+            (False for gaps and forward-filled prices)
+    """
+
+    def __init__(
+        self,
+        index: pd.DatetimeIndex,
+        tickers: Sequence[str],
+        values: np.ndarray,
+        observed: Optional[np.ndarray] = None,
+    ):
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != (len(index), len(tickers)):
+            raise ValueError(
+                f"Values of shape {values.shape} do not match "
+                f"{len(index)} dates x {len(tickers)} tickers"
+            )
+        self.index = pd.DatetimeIndex(index)
+        self.tickers: List[str] = list(tickers)
+        self.values = np.asfortranarray(values)
+        self.observed = ~np.isnan(self.values) if observed is None else observed
+        self._columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def from_histories(
+        cls,
+        histories: Mapping[str, pd.DataFrame],
+        tickers: Optional[Sequence[str]] = None,
+        align: str = UNION,
+    ) -> "PricePanel":
+        """Align the Close column of several histories.
+
+        Args:
+            histories: Dict mapping ticker name to a DataFrame with a
+                'Close' column and DatetimeIndex
+            tickers: Tickers to include, in column order (default: all)
+            align: Alignment policy: "intersection", "union" or "ffill"
+
+        Returns:
+            The aligned panel
+
+        Raises:
+            KeyError: If a requested ticker has no history
+            ValueError: If the alignment policy is unknown
+        """
+        if align not in ALIGNMENTS:
+            raise ValueError(f"Unknown alignment: {align}. Use one of {', '.join(ALIGNMENTS)}")
+        tickers = list(histories) if tickers is None else list(tickers)
+        closes = [histories[ticker]['Close'] for ticker in tickers]
+        if closes:
+            dates = np.unique(np.concatenate([c.index.values for c in closes]))
+        else:
+            dates = np.array([], dtype="datetime64[ns]")
+        index = pd.DatetimeIndex(dates)
+
+        values = np.full((len(index), len(tickers)), np.nan, order="F")
+        for column, close in enumerate(closes):
+            values[index.get_indexer(close.index), column] = close.to_numpy(dtype=np.float64)
+        panel = cls(index, tickers, values)
+
+        if align == INTERSECTION:
+            return panel.dropna()
+        if align == FFILL:
+            return panel.ffill()
+        return panel
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self._columns
+
+    @property
+    def empty(self) -> bool:
+        return self.values.size == 0
+
+    def column(self, ticker: str) -> np.ndarray:
+        """Prices of a ticker as a view of the matrix (NaN where missing)."""
+        return self.values[:, self._columns[ticker]]
+
+    def close(self, ticker: str) -> pd.Series:
+        """Prices of a ticker on the dates it has a price."""
+        column = self.column(ticker)
+        valid = ~np.isnan(column)
+        return pd.Series(column[valid], index=self.index[valid], name=ticker)
+
+    def history(self, ticker: str) -> pd.DataFrame:
+        """History of a ticker as a DataFrame with a 'Close' column."""
+        return self.close(ticker).rename('Close').to_frame()
+
+    def to_frame(self) -> pd.DataFrame:
+        """The whole matrix as a DataFrame, one column per ticker."""
+        return pd.DataFrame(self.values, index=self.index, columns=self.tickers, copy=False)
+
+    def select(self, tickers: Sequence[str]) -> "PricePanel":
+        """Panel with only some tickers, on the same dates."""
+        columns = [self._columns[ticker] for ticker in tickers]
+        return PricePanel(
+            self.index, tickers, self.values[:, columns], self.observed[:, columns]
+        )
+
+    def dropna(self) -> "PricePanel":
+        """Panel with only the dates every ticker has a price."""
+        rows = ~np.isnan(self.values).any(axis=1)
+        if rows.all():
+            return self
+        return PricePanel(self.index[rows], self.tickers, self.values[rows], self.observed[rows])
+
+    def ffill(self) -> "PricePanel":
+        """Panel where missing prices take the last known price of the ticker."""
+        values = self.values
+        rows = np.where(~np.isnan(values), np.arange(len(values))[:, None], 0)
+        last = np.maximum.accumulate(rows, axis=0)
+        filled = np.take_along_axis(values, last, axis=0)
+        return PricePanel(self.index, self.tickers, filled, self.observed)
+
+    def with_column(self, ticker: str, close: pd.Series) -> "PricePanel":
+        """Panel with one more ticker, aligned on the existing dates."""
+        column = close.reindex(self.index).to_numpy(dtype=np.float64)
+        values = np.column_stack([self.values, column])
+        observed = np.column_stack([self.observed, ~np.isnan(column)])
+        return PricePanel(self.index, self.tickers + [ticker], values, observed)
+
+    def weighted(self, weights: Mapping[str, float]) -> pd.Series:
+        """Weighted sum of the prices, on the dates every weighted ticker has a price.
+
+        Args:
+            weights: Dict mapping ticker name to its weight
+
+        Returns:
+            Series of the weighted prices
+        """
+        columns = [self._columns[ticker] for ticker in weights]
+        prices = self.values[:, columns]
+        rows = ~np.isnan(prices).any(axis=1)
+        weighted = prices[rows] @ np.fromiter(weights.values(), dtype=np.float64)
+        return pd.Series(weighted, index=self.index[rows])
@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Set in every worker process of worker_pool
+_WORKER_ARGS: Tuple[Any, ...] = None
+
+
+def run_tasks(
+    tasks: Dict[str, Callable[[], T]], jobs: int = 1
+) -> Tuple[Dict[str, T], Dict[str, Exception]]:
+    """Run named tasks on a bounded thread pool.
+
+    A failing task does not stop the others: its exception is reported and
+    returned instead of raised.
+
+    Args:
+        tasks: Dict mapping a task name to a callable without arguments
+        jobs: Maximum number of tasks running at the same time
+
+    Returns:
+        Tuple of (results by task name, exceptions by task name)
+    """
+    results: Dict[str, T] = {}
+    errors: Dict[str, Exception] = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {name: executor.submit(task) for name, task in tasks.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Error in {name}: {e}")
+                errors[name] = e
+    return results, errors
+
+
+def worker_pool(
+    processes: int, *args: Any, setup: Optional[Callable[..., Tuple[Any, ...]]] = None
+) -> ProcessPoolExecutor:
+    """Process pool whose workers get the same arguments once, not with every task.
+
+    The tasks read the arguments with worker_args.
+
+    Args:
+        processes: Number of worker processes
+        *args: Arguments sent to every worker when it starts
+        setup: Function called once in each worker with the arguments; the
+            tuple it returns replaces them (default: keep them)
+
+    Returns:
+        The pool, to use as a context manager
+    """
+    return ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(setup, args))
+
+
+def _init_worker(setup: Optional[Callable[..., Tuple[Any, ...]]], args: Tuple[Any, ...]) -> None:
+    global _WORKER_ARGS
+    _WORKER_ARGS = args if setup is None else setup(*args)
+
+
+def worker_args() -> Tuple[Any, ...]:
+    """Arguments of the worker_pool this process works for."""
+    return _WORKER_ARGS
@@ -1,6 +1,11 @@
 from dataclasses import dataclass, field
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 import logging as log
+import math
+
+if TYPE_CHECKING:
+    import numpy as np
+
 
 # A data class to represent a Asset
 @dataclass
@@ -12,22 +17,26 @@ class Asset:
     rebalanced_value: float = 0.0
     sending_to: Dict['Asset', float] = field(default_factory=dict)
     reciving_from: Dict['Asset', float] = field(default_factory=dict)  # Double accounting
+    # Running sums of sending_to and reciving_from, so checks do not add them up again
+    sent: float = field(default=0.0, repr=False, compare=False)
+    recived: float = field(default=0.0, repr=False, compare=False)
 
     def current_percentage(self, total_value) -> float:
         """ Return the current percentage of the asset."""
         return round(self.value * 100 / total_value, 2)
     
     def how_much_send(self) -> float:
-        return self.value - self.rebalanced_value - sum(self.sending_to.values())
+        return self.value - self.rebalanced_value - self.sent
     
     def how_much_recive(self) -> float:
-        return self.rebalanced_value - self.value - sum(self.reciving_from.values())
+        return self.rebalanced_value - self.value - self.recived
     
     def send_to(self, asset: 'Asset', value: float) -> None:
         """ Send value to asset."""
         if self.how_much_send() < value:
             raise ValueError(f"You can't send {value} to {asset.name}. You can send {self.how_much_send()}")
         self.sending_to[asset] = value
+        self.sent += value
         asset.recive_from(self, value)
 
     def recive_from(self, asset: 'Asset', value: float) -> None:
@@ -35,6 +44,7 @@ class Asset:
         if self.how_much_recive() < value:
             raise ValueError(f"You can't recive {value} from {asset.name}. You can recive {self.how_much_recive()}")
         self.reciving_from[asset] = value
+        self.recived += value
 
     def __eq__(self, other):
         """ Check if two assets are equal."""
@@ -67,7 +77,8 @@ class RebalanceAssets(object):
         # Invariants:
         # check if the sum of the assets is equal to 100
         percentage_sum = sum([asset.goal_percentage for asset in self.assets])
-        if percentage_sum != 100:
+        # Fractional percentages (e.g. hundreds of positions) may add up to 100 with float noise
+        if not math.isclose(percentage_sum, 100):
             raise ValueError(f"The sum of the assets' percentage is {percentage_sum}, not equal to 100")
         # check if the threeshold is between 0 and 100
         if not 0 <= self.threeshold <= 100:
@@ -120,16 +131,149 @@ class RebalanceAssets(object):
 
 
     def _calculate_sends_and_recives(self):
-        """ Calculate the sends and recives for each asset."""
-        for asset in self.assets:
-            if asset.how_much_send() > 0:
-                for asset_to_send in self.assets:
-                    if asset_to_send.how_much_recive() > 0 and asset_to_send != asset:
-                        asset.send_to(asset_to_send, min(asset.how_much_send(), asset_to_send.how_much_recive()))
+        """ Calculate the sends and recives for each asset.
+        
+        The amounts are whole cents: what an asset has over its rebalanced value goes to the assets under it, see plan_transfers.
+        A transfer is capped at what the sender and the reciver have left.
+        """
+        surplus_cents = [round(asset.value * 100) - round(asset.rebalanced_value * 100) for asset in self.assets]
+        for sender, reciver, cents in _plan_transfers(surplus_cents):
+            sender, reciver = self.assets[sender], self.assets[reciver]
+            # Values with fractions of a cent, or the float noise of the subtractions, can leave a bit less than
+            # the planned cents: never more than what is left is sent
+            sender.send_to(reciver, min(cents / 100, sender.how_much_send(), reciver.how_much_recive()))
     
     def __str__(self):
         return f"RebalanceAssets with {len(self.assets)} assets and a threshold of {self.threeshold}"
 
+def current_percentages(values: 'np.ndarray', total: Optional['np.ndarray'] = None) -> 'np.ndarray':
+    """ Return the current percentages of the assets, rounded to 2 decimals like Asset.current_percentage.
+    
+    Args:
+        values (np.ndarray): Values of the assets in the last axis. Leading axes are independent portfolios.
+        total (np.ndarray): Total value of the portfolio of each value, when the values are not one matrix (default: the sum of the last axis).
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    if total is None:
+        total = values.sum(axis=-1, keepdims=True)
+    return round_cents(values * 100 / total)
+
+
+def round_cents(values: 'np.ndarray') -> 'np.ndarray':
+    """ Return round(value, 2) of each value.
+    
+    np.round scales by 100 before rounding, so values close to half a cent may round the other way than round(); those few are rounded with round().
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 100
+    rounded = np.round(scaled) / 100
+    ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    rounded[ties] = [round(value, 2) for value in values[ties].tolist()]
+    return rounded
+
+
+def exceeds_threshold(goal_percentages: 'np.ndarray', values: 'np.ndarray', threeshold) -> 'np.ndarray':
+    """ Return if the assets have to be rebalanced, the rule of RebalanceAssets.
+    
+    Args:
+        goal_percentages (np.ndarray): Goal percentage of each asset.
+        values (np.ndarray): Values of the assets in the last axis. Leading axes are independent portfolios.
+        threeshold: Threshold in percentage points; an array to check one threshold per portfolio.
+    
+    Returns:
+        np.ndarray: True for each portfolio where any asset is further than the threeshold from its goal.
+    """
+    import numpy as np
+
+    drift = np.abs(goal_percentages - current_percentages(values))
+    return (drift > np.asarray(threeshold)[..., None]).any(axis=-1)
+
+
+def plan_transfers(surplus_cents: 'np.ndarray') -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+    """ Match the assets over their rebalanced value with the ones under it, in O(n log n).
+    
+    Surpluses and deficits that are equal are matched first, one transfer each. The rest are sorted once, largest
+    first, and matched with two pointers: every transfer empties a surplus or a deficit. The former asset by asset
+    loop is the same two pointers walk in the order of the assets, O(n) too, so both plans are made and the one
+    with fewer transfers is returned: never more transfers than before.
+    
+    Amounts are integer cents, so every transfer is exactly what one asset sends and the other recives. When the
+    rounding makes the surpluses and the deficits differ by some cents, those cents are not moved.
+    
+    Args:
+        surplus_cents (np.ndarray): Cents each asset has over its rebalanced value (negative when under it).
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Sender index, reciver index and cents of each transfer.
+    """
+    import numpy as np
+
+    transfers = _plan_transfers(np.asarray(surplus_cents, dtype=np.int64).tolist())
+    if not transfers:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    sender_ids, reciver_ids, cents = np.array(transfers, dtype=np.int64).T
+    return sender_ids, reciver_ids, cents
+
+
+def _plan_transfers(surplus_cents: List[int]) -> List[Tuple[int, int, int]]:
+    """ The transfers of plan_transfers, as (sender, reciver, cents). Plain Python: lists are faster than NumPy scalars here."""
+    senders = [i for i, cents in enumerate(surplus_cents) if cents > 0]
+    recivers = [i for i, cents in enumerate(surplus_cents) if cents < 0]
+    amounts = [abs(cents) for cents in surplus_cents]
+
+    in_order = _match(senders, recivers, amounts[:])
+
+    # Largest first; sorted is stable, so equal amounts keep the order of the assets
+    senders = sorted(senders, key=lambda i: -amounts[i])
+    recivers = sorted(recivers, key=lambda i: -amounts[i])
+    left = amounts
+    transfers = _match_equal(senders, recivers, left)
+    transfers += _match([i for i in senders if left[i]], [j for j in recivers if left[j]], left)
+    if len(in_order) < len(transfers):
+        return in_order
+    return transfers
+
+
+def _match_equal(senders: List[int], recivers: List[int], left: List[int]) -> List[Tuple[int, int, int]]:
+    """ Transfers between senders and recivers with the same amount left, both sorted largest first."""
+    transfers = []
+    # Like merging two sorted lists
+    i = j = 0
+    while i < len(senders) and j < len(recivers):
+        send, recive = left[senders[i]], left[recivers[j]]
+        if send == recive:
+            transfers.append((senders[i], recivers[j], send))
+            left[senders[i]] = left[recivers[j]] = 0
+            i += 1
+            j += 1
+        elif send > recive:
+            i += 1
+        else:
+            j += 1
+    return transfers
+
+
+def _match(senders: List[int], recivers: List[int], left: List[int]) -> List[Tuple[int, int, int]]:
+    """ Two pointers: the first sender sends to the first reciver until one of them has nothing left."""
+    transfers = []
+    i = j = 0
+    while i < len(senders) and j < len(recivers):
+        sender, reciver = senders[i], recivers[j]
+        cents = min(left[sender], left[reciver])
+        transfers.append((sender, reciver, cents))
+        left[sender] -= cents
+        left[reciver] -= cents
+        if left[sender] == 0:
+            i += 1
+        if left[reciver] == 0:
+            j += 1
+    return transfers
+
+
 def csv_to_assets(csv_file: str) -> List[Asset]:
     """ Return a list of assets from a csv file.
     
@@ -0,0 +1,185 @@
+"""Backtest the same contribution plan started on every possible date.
+
+A plan invests a fixed amount every ``every`` trading days, ``contributions``
+times, and is valued one period after the last contribution. The value of
+a plan started on day i is
+
+    amount * P[end] * (1 / P[i] + 1 / P[i + every] + ...)
+
+The sum only takes the prices of one residue class modulo ``every``, so
+with prefix sums of 1 / P per residue class every start date costs O(1)
+and all of them O(days).
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.cache import HistoryCache
+from pyfinance.defaults import DEFAULT_EVERY
+from pyfinance.graphics import SeriesPlan
+from pyfinance.panel import PricePanel
+from pyfinance.simulation import PortfolioSimulator
+from pyfinance.victoria import MetricSeries
+
+TRADING_DAYS_PER_YEAR = 252
+
+SUMMARY_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@dataclass
+class RollingResult:
+    """Outcome of every plan of one asset, indexed by start date."""
+    terminal_values: pd.Series
+    irr: pd.Series
+
+
+def rolling_terminal_values(
+    prices: np.ndarray, amount: float, contributions: int, every: int = DEFAULT_EVERY
+) -> np.ndarray:
+    """Final value of the plan started on each day that has a complete horizon.
+
+    Args:
+        prices: Daily prices of the asset
+        amount: Money invested in each contribution
+        contributions: Number of contributions of the plan
+        every: Trading days between contributions
+
+    Returns:
+        Array with one value per start day (len(prices) - contributions * every)
+    """
+    starts = len(prices) - contributions * every
+    if starts <= 0:
+        return np.array([], dtype=np.float64)
+    rows = -(-len(prices) // every)
+    inverse = np.zeros(rows * every)
+    inverse[:len(prices)] = 1.0 / prices
+    # prefix[q, r]: sum of 1 / P[r + k * every] for k < q
+    prefix = np.zeros((rows + 1, every))
+    np.cumsum(inverse.reshape(rows, every), axis=0, out=prefix[1:])
+
+    start = np.arange(starts)
+    row, residue = np.divmod(start, every)
+    shares_per_amount = prefix[row + contributions, residue] - prefix[row, residue]
+    return amount * prices[start + contributions * every] * shares_per_amount
+
+
+def annualized_irr(
+    terminal_values: np.ndarray, amount: float, contributions: int,
+    periods_per_year: float, iterations: int = 100,
+) -> np.ndarray:
+    """Annual internal rate of return of each plan.
+
+    Solves amount * ((1 + r)^n - 1) / r * (1 + r) = terminal value for the
+    rate r per period (annuity due) by bisection, vectorized over plans.
+    """
+    n = contributions
+    target = np.asarray(terminal_values, dtype=np.float64) / amount
+    low = np.full(len(target), -0.9999)
+    high = np.full(len(target), 1.0)
+    for _ in range(iterations):
+        rate = (low + high) / 2
+        growth = np.log1p(rate)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            future = np.where(
+                np.abs(rate) > 1e-12, np.expm1(n * growth) / rate * (1 + rate), n
+            )
+        too_high = future > target
+        high = np.where(too_high, rate, high)
+        low = np.where(too_high, low, rate)
+    rate = (low + high) / 2
+    return np.expm1(periods_per_year * np.log1p(rate))
+
+
+def rolling_plans(
+    close: pd.Series, amount: float, contributions: int, every: int = DEFAULT_EVERY
+) -> RollingResult:
+    """Terminal value and IRR of the plan started on every possible day."""
+    prices = close.to_numpy(dtype=np.float64)
+    values = rolling_terminal_values(prices, amount, contributions, every)
+    irr = annualized_irr(values, amount, contributions, TRADING_DAYS_PER_YEAR / every)
+    index = close.index[:len(values)]
+    return RollingResult(
+        terminal_values=pd.Series(values, index=index, name=close.name),
+        irr=pd.Series(irr, index=index, name=close.name),
+    )
+
+
+def summarize(results: Dict[str, RollingResult]) -> pd.DataFrame:
+    """Distribution of terminal values and IRRs, one row per asset."""
+    rows = {}
+    for name, result in results.items():
+        row = {"plans": len(result.terminal_values)}
+        for q in SUMMARY_PERCENTILES:
+            row[f"value_p{q}"] = np.percentile(result.terminal_values, q)
+        for q in SUMMARY_PERCENTILES:
+            row[f"irr_p{q}"] = np.percentile(result.irr, q)
+        rows[name] = row
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+class RollingSimulator:
+    """Runs the rolling start-date backtest for every asset and mymix."""
+
+    def __init__(self, vm_url: str = "http://localhost:8428",
+                 cache: Optional[HistoryCache] = None):
+        self.simulator = PortfolioSimulator(vm_url, cache=cache)
+        self.uploader = self.simulator.uploader
+
+    def run(self, years: float, amount: float = 100.0, every: int = DEFAULT_EVERY,
+            jobs: int = 1, source: str = "yahoo") -> pd.DataFrame:
+        """Backtest the plan from every start date, upload and return the summary.
+
+        The terminal values and IRRs are uploaded as
+        finance_rolling_terminal_value and finance_rolling_irr series,
+        timestamped with the start date of each plan.
+
+        Args:
+            years: Length of the plan
+            amount: Money invested in each contribution
+            every: Trading days between contributions
+            jobs: Maximum number of downloads running at the same time
+            source: "yahoo" (or its cache) or "vm", see PortfolioSimulator.run
+
+        Returns:
+            The summary, one row per asset
+
+        Raises:
+            RuntimeError: If some history could not be loaded, after the
+                others were uploaded
+        """
+        contributions = max(1, round(years * TRADING_DAYS_PER_YEAR / every))
+        histories, errors = self.simulator.load_histories(source, jobs=jobs)
+        panel = PricePanel.from_histories(histories)
+        try:
+            panel = panel.with_column('mymix', self.uploader.calculate_mymix(panel)['Close'])
+        except (KeyError, ValueError) as e:
+            print(f"Error calculating mymix: {e}")
+
+        results = {}
+        for name in panel.tickers:
+            result = rolling_plans(panel.close(name), amount, contributions, every)
+            if result.terminal_values.empty:
+                print(f"Warning: History of {name} is shorter than {years:g} years")
+                continue
+            results[name] = result
+
+        horizon = f"{years:g}y"
+        plans: List[SeriesPlan] = []
+        for name, result in results.items():
+            plans.append(_plan(result.terminal_values, "finance_rolling_terminal_value", name, horizon))
+            plans.append(_plan(result.irr, "finance_rolling_irr", name, horizon))
+        print(f"Uploading {len(plans)} series...")
+        self.uploader.publish(plans)
+        self.uploader.vm_client.reset_cache()
+        if errors:
+            raise RuntimeError(f"Failed to download: {', '.join(errors)}")
+        return summarize(results)
+
+
+def _plan(series: pd.Series, metric: str, name: str, horizon: str) -> SeriesPlan:
+    timestamps = series.index.values.astype("datetime64[ms]").astype(np.int64)
+    metric_series = MetricSeries(metric, {"ticker": name, "horizon": horizon},
+                                 timestamps, series.to_numpy())
+    return metric_series.selector(), metric_series
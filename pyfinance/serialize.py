@@ -0,0 +1,316 @@
+"""Fast serialization of series for VictoriaMetrics imports and exports.
+
+Numbers are rendered with NumPy into a matrix of ASCII digits and the
+unused characters (leading zeros, trailing fraction zeros) are masked out,
+so a whole series becomes bytes without formatting each point in Python.
+Values are written exactly: with 6 decimals when those read back as the
+same float, else with 16 or, when needed, 17 significant digits, and the
+few values out of the range of the integer digits with repr().
+Exports are parsed the other way round, straight into NumPy arrays.
+"""
+import hashlib
+import json
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Decimals tried first for values; prices and simulated values are in
+# euros, so most of them are written exactly with these.
+DEFAULT_DECIMALS = 6
+
+# Significant digits of the values not exact with DEFAULT_DECIMALS: 17
+# write any float64 exactly, 16 are tried first as they are shorter
+SIGNIFICANT_DIGITS = 17
+
+# Most decimals of the integer digits path: 10 ** 22 is the largest exact
+# power of ten in a float64
+MAX_DECIMALS = 22
+_POWERS = np.array([float(10 ** i) for i in range(MAX_DECIMALS + 1)])
+
+# 2 ** 27 + 1: Dekker's split of a float64 into two halves of 26 bits
+_SPLIT = 134217729.0
+
+# Rows per chunk yielded by iter_csv_chunks
+DEFAULT_CHUNK_ROWS = 50_000
+
+_ZERO = ord("0")
+
+
+def _digits(numbers: np.ndarray, width: int) -> np.ndarray:
+    """Return the ``width`` decimal digits of non-negative integers as ASCII."""
+    digits = np.empty((len(numbers), width), dtype=np.uint8)
+    remaining = numbers
+    # Dividing by a scalar 10 column by column is much faster than one
+    # broadcast division by the powers of ten
+    for column in range(width - 1, -1, -1):
+        remaining, digits[:, column] = np.divmod(remaining, np.uint64(10))
+    return digits + _ZERO
+
+
+def _width(numbers: np.ndarray) -> int:
+    """Number of digits of the largest non-negative integer."""
+    return len(str(int(numbers.max()))) if len(numbers) else 1
+
+
+def _format_integers(numbers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Render integers as an ASCII matrix plus the mask of characters to keep."""
+    numbers = np.asarray(numbers, dtype=np.int64)
+    negative = numbers < 0
+    magnitude = np.abs(numbers).astype(np.uint64)
+    digits = _digits(magnitude, _width(magnitude))
+    keep = np.logical_or.accumulate(digits != _ZERO, axis=1)
+    keep[:, -1] = True
+    sign = np.where(negative, ord("-"), 0).astype(np.uint8)[:, None]
+    return np.hstack([sign, digits]), np.hstack([negative[:, None], keep])
+
+
+def _split(a: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    t = a * _SPLIT
+    high = t - (t - a)
+    return high, a - high
+
+
+def _round_product(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """round(a * b) of the exact products, and where they fit in an int64.
+
+    Above 2 ** 53 the float product is not the exact one, so its error is
+    computed apart (Dekker's two-product) and added to the rounded integer.
+    """
+    with np.errstate(over="ignore", invalid="ignore"):
+        product = a * b
+        fits = product < 2.0 ** 63 - 2 ** 11
+        a_high, a_low = _split(np.where(fits, a, 0))
+        b_high, b_low = _split(b)
+        error = ((a_high * b_high - product) + a_high * b_low + a_low * b_high) + a_low * b_low
+    rounded = np.round(np.where(fits, product, 0))
+    residual = np.round((np.where(fits, product, 0) - rounded) + np.where(fits, error, 0))
+    return rounded.astype(np.int64) + residual.astype(np.int64), fits
+
+
+def _reads_back(magnitude: np.ndarray, places: np.ndarray) -> np.ndarray:
+    """Where ``places`` decimals write the non-negative floats exactly."""
+    places = np.clip(places, 0, MAX_DECIMALS)
+    scaled, fits = _round_product(magnitude, _POWERS[places])
+    # Below 2 ** 53 the division is exact, like reading the decimals back
+    exact = fits & (scaled < 2 ** 53)
+    return exact & (scaled.astype(np.float64) / _POWERS[places] == magnitude)
+
+
+def _exact_decimals(magnitude: np.ndarray) -> np.ndarray:
+    """Decimals writing each non-negative float exactly: DEFAULT_DECIMALS
+    when they do, else the ones of 16 or SIGNIFICANT_DIGITS significant digits."""
+    exponent = np.floor(np.log10(magnitude, where=magnitude > 0, out=np.zeros_like(magnitude)))
+    significant = np.maximum(SIGNIFICANT_DIGITS - 1 - exponent, 0).astype(np.int64)
+    shorter = np.maximum(significant - 1, 0)
+    return np.select(
+        [_reads_back(magnitude, np.full(len(magnitude), DEFAULT_DECIMALS)),
+         (significant <= MAX_DECIMALS) & _reads_back(magnitude, shorter)],
+        [DEFAULT_DECIMALS, shorter], significant,
+    )
+
+
+def _format_floats(values: np.ndarray, decimals: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Render floats as an ASCII matrix, exactly or with at most ``decimals`` decimals.
+
+    Values the integer digits cannot hold (too large, or too small for
+    MAX_DECIMALS) are written with repr().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    magnitude = np.abs(values)
+    if decimals is None:
+        places = _exact_decimals(magnitude)
+    else:
+        places = np.full(n, decimals, dtype=np.int64)
+    fallback = places > MAX_DECIMALS
+    places[fallback] = 0
+    scaled, fits = _round_product(magnitude, _POWERS[places])
+    fallback |= ~fits
+    scaled[fallback] = 0
+    scaled = scaled.astype(np.uint64)
+    negative = (values < 0) & (scaled > 0)
+
+    # Digits of the scaled integer, padded with zeros to a digit before the
+    # point; the point goes in column ``point``, places digits from the end
+    width = max(_width(scaled), int(places.max(initial=0)) + 1)
+    digits = _digits(scaled, width)
+    columns = np.arange(width + 1)
+    point = (width - places)[:, None]
+    body = np.take_along_axis(digits, np.where(columns < point, columns, columns - 1), axis=1)
+    body[columns == point] = ord(".")
+    # Integer digits from the first non-zero one (or the one before the point)
+    int_keep = np.logical_or.accumulate((body != _ZERO) | (columns == point - 1), axis=1) & (columns < point)
+    # The fraction up to its last non-zero digit, and the point if any is kept
+    frac_nonzero = (body != _ZERO) & (columns > point)
+    frac_keep = np.logical_or.accumulate(frac_nonzero[:, ::-1], axis=1)[:, ::-1] & (columns >= point)
+
+    sign = np.where(negative, ord("-"), 0).astype(np.uint8)[:, None]
+    chars = np.hstack([sign, body])
+    keep = np.hstack([negative[:, None], int_keep | frac_keep])
+    if fallback.any():
+        rows = np.flatnonzero(fallback)
+        texts = [repr(value).encode() for value in values[rows].tolist()]
+        longest = max(len(text) for text in texts)
+        if longest > chars.shape[1]:
+            pad = longest - chars.shape[1]
+            chars = np.hstack([chars, np.zeros((n, pad), dtype=np.uint8)])
+            keep = np.hstack([keep, np.zeros((n, pad), dtype=bool)])
+        keep[rows] = False
+        for row, text in zip(rows.tolist(), texts):
+            chars[row, :len(text)] = np.frombuffer(text, dtype=np.uint8)
+            keep[row, :len(text)] = True
+    return chars, keep
+
+
+def _separator(n: int, char: str) -> Tuple[np.ndarray, np.ndarray]:
+    return np.full((n, 1), ord(char), dtype=np.uint8), np.ones((n, 1), dtype=bool)
+
+
+def _join(*columns: Tuple[np.ndarray, np.ndarray]) -> bytes:
+    """Concatenate rendered columns row by row, dropping masked characters."""
+    chars = np.hstack([c for c, _ in columns])
+    keep = np.hstack([k for _, k in columns])
+    return chars[keep].tobytes()
+
+
+def _valid(timestamps: Sequence[int], values: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    return timestamps[valid], values[valid]
+
+
+def format_csv(
+    timestamps: Sequence[int], values: Sequence[float], decimals: Optional[int] = None
+) -> bytes:
+    """Serialize a series as ``timestamp,value`` CSV lines.
+
+    Timestamps are unix milliseconds, matching VictoriaMetrics'
+    ``1:time:unix_ms`` CSV format. Missing values are skipped.
+
+    Args:
+        timestamps: Unix timestamps in milliseconds
+        values: Values of the series
+        decimals: Maximum decimals written for each value (default: the
+            ones that read back as the same float)
+
+    Returns:
+        CSV bytes without header
+    """
+    timestamps, values = _valid(timestamps, values)
+    if len(values) == 0:
+        return b""
+    n = len(values)
+    return _join(
+        _format_integers(timestamps),
+        _separator(n, ","),
+        _format_floats(values, decimals),
+        _separator(n, "\n"),
+    )
+
+
+def iter_csv_chunks(
+    timestamps: Sequence[int],
+    values: Sequence[float],
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    decimals: Optional[int] = None,
+) -> Iterator[bytes]:
+    """Yield the CSV of a series in chunks of at most ``chunk_rows`` lines.
+
+    Useful as a streaming request body: only one chunk is rendered at a time.
+    """
+    timestamps, values = _valid(timestamps, values)
+    for start in range(0, len(values), chunk_rows):
+        yield format_csv(
+            timestamps[start:start + chunk_rows], values[start:start + chunk_rows], decimals
+        )
+
+
+def format_json_line(
+    metric: Dict[str, str],
+    timestamps: Sequence[int],
+    values: Sequence[float],
+    decimals: Optional[int] = None,
+) -> bytes:
+    """Serialize a series as one line of VictoriaMetrics' JSON import format.
+
+    Args:
+        metric: Labels of the series, including ``__name__``
+        timestamps: Unix timestamps in milliseconds
+        values: Values of the series
+        decimals: Maximum decimals written for each value (default: the
+            ones that read back as the same float)
+
+    Returns:
+        ``{"metric":{...},"values":[...],"timestamps":[...]}`` plus newline
+    """
+    timestamps, values = _valid(timestamps, values)
+    n = len(values)
+    if n:
+        values_bytes = _join(_format_floats(values, decimals), _separator(n, ","))[:-1]
+        timestamps_bytes = _join(_format_integers(timestamps), _separator(n, ","))[:-1]
+    else:
+        values_bytes = timestamps_bytes = b""
+    return b"".join([
+        b'{"metric":', json.dumps(metric, separators=(",", ":")).encode(),
+        b',"values":[', values_bytes,
+        b'],"timestamps":[', timestamps_bytes, b"]}\n",
+    ])
+
+
+def series_checksum(timestamps, values) -> str:
+    """Checksum of a series, insensitive to float formatting noise.
+    
+    Args:
+        timestamps: Unix timestamps in milliseconds
+        values: Values of the series
+        
+    Returns:
+        Hex digest identifying the points
+    """
+    digest = hashlib.sha256()
+    digest.update(np.asarray(timestamps, dtype=np.int64).tobytes())
+    digest.update(np.round(np.asarray(values, dtype=np.float64), 6).tobytes())
+    return digest.hexdigest()
+
+
+def parse_export(text: str) -> Dict[Tuple[Tuple[str, str], ...], Tuple[np.ndarray, np.ndarray]]:
+    """Parse the JSON-line output of VictoriaMetrics' /api/v1/export.
+
+    Only the small ``metric`` object of each line goes through ``json``;
+    the value and timestamp arrays are parsed straight into NumPy.
+    Lines of the same series are merged, sorted and de-duplicated.
+
+    Args:
+        text: Response body of /api/v1/export
+
+    Returns:
+        Dict mapping the sorted label pairs of each series to a tuple of
+        (timestamps in milliseconds as int64, values as float64)
+    """
+    parts: Dict[Tuple[Tuple[str, str], ...], list] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        values_at = line.index(',"values":[')
+        timestamps_at = line.index('],"timestamps":[', values_at)
+        metric = json.loads(line[len('{"metric":'):values_at])
+        values = np.fromstring(line[values_at + len(',"values":['):timestamps_at], sep=",")
+        timestamps = np.fromstring(
+            line[timestamps_at + len('],"timestamps":['):line.rindex("]")],
+            dtype=np.int64, sep=",",
+        )
+        parts.setdefault(tuple(sorted(metric.items())), []).append((timestamps, values))
+
+    series = {}
+    for key, chunks in parts.items():
+        timestamps = np.concatenate([t for t, _ in chunks])
+        values = np.concatenate([v for _, v in chunks])
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, values = timestamps[order], values[order]
+        unique = np.ones(len(timestamps), dtype=bool)
+        unique[1:] = timestamps[1:] != timestamps[:-1]
+        series[key] = (timestamps[unique], values[unique])
+    return series
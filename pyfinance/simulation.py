@@ -1,10 +1,96 @@
+import functools
+import glob
 import io
+import os
+import numpy as np
 import pandas as pd
-from typing import Dict, Optional, List
-from pyfinance.config import get_portfolio_tickers, TICKERS, get_ticker_by_name
-from pyfinance.graphics import TickerUploader
+from typing import Dict, Optional, List, Sequence, Tuple, Union
+from pyfinance.cache import HistoryCache, HistoryRegistry
+from pyfinance.config import get_portfolio_tickers, TICKERS, TickerConfig, get_ticker_by_name
+from pyfinance.checkpoint import (CheckpointStore, SimulationCheckpoint, is_valid,
+                                  make_checkpoint)
+from pyfinance.graphics import SeriesPlan, TickerUploader, frame_to_series
+from pyfinance.metrics import RunMetrics
+from pyfinance.panel import PricePanel
+from pyfinance.pipeline import run_tasks, worker_args, worker_pool
+from pyfinance.store import HistoryStore
 from pyfinance.victoria import VictoriaMetricsClient
 
+# Label telling apart the finance_simulation_value series of each scenario
+SCENARIO_LABEL = "scenario"
+
+def simulation_labels(scenario: Optional[str]) -> Tuple[Dict[str, str], Tuple[str, ...]]:
+    """Labels of the simulated series of a scenario, and the labels they lack.
+    
+    The scenario None is a plain run: its series have no scenario label.
+    """
+    if scenario is None:
+        return {}, (SCENARIO_LABEL,)
+    return {SCENARIO_LABEL: scenario}, ()
+
+
+def simulate_prices(prices: PricePanel, inputs: pd.Series) -> pd.DataFrame:
+    """Simulate investing inputs into every asset of a price matrix at once.
+    
+    Each input buys shares on the first day on or after its date with a
+    price for that asset (inputs on weekends or before the asset existed
+    move forward). Inputs after the last price of an asset are ignored.
+    
+    Args:
+        prices: Aligned Close prices, NaN where an asset has no price.
+        inputs: Series with DatetimeIndex and amount to invest.
+        
+    Returns:
+        DataFrame with one column per asset of the panel, on its dates,
+        holding the value of the shares bought (NaN where the price is NaN).
+    """
+    if prices.empty:
+        return pd.DataFrame()
+
+    close = prices.values
+    n_days, n_assets = close.shape
+    has_price = ~np.isnan(close)
+
+    # Row of the first day with a price, per asset, from each day on.
+    # The extra last row (n_days) means "no price left".
+    rows = np.where(has_price, np.arange(n_days)[:, None], n_days)
+    next_priced = np.minimum.accumulate(rows[::-1], axis=0)[::-1]
+    next_priced = np.vstack([next_priced, np.full((1, n_assets), n_days)])
+
+    daily_inputs = inputs.groupby(inputs.index).sum()
+    input_rows = prices.index.searchsorted(daily_inputs.index)
+    buy_rows = next_priced[input_rows]  # (inputs, assets)
+    amounts = np.broadcast_to(daily_inputs.to_numpy(dtype=np.float64)[:, None], buy_rows.shape)
+    columns = np.broadcast_to(np.arange(n_assets), buy_rows.shape)
+
+    bought = buy_rows < n_days
+    for asset, ignored in zip(prices.tickers, (~bought).sum(axis=0)):
+        if ignored:
+            print(f"Warning: {ignored} input(s) after last history date of {asset}. Ignoring.")
+
+    # Money invested per (day, asset), summed when inputs share a day
+    # float64 also without inputs, when bincount would return integers
+    invested = np.bincount(
+        buy_rows[bought] * n_assets + columns[bought],
+        weights=amounts[bought],
+        minlength=n_days * n_assets,
+    ).astype(np.float64).reshape(n_days, n_assets)
+    shares_bought = np.divide(invested, close, out=np.zeros_like(invested), where=has_price)
+    value = np.cumsum(shares_bought, axis=0) * close
+    return pd.DataFrame(value, index=prices.index, columns=prices.tickers)
+
+
+def _attach_panel(panel: Union[PricePanel, str]) -> Tuple[PricePanel]:
+    """The panel of a worker, read from the HistoryStore when it is a directory."""
+    return (HistoryStore(panel).read() if isinstance(panel, str) else panel,)
+
+
+def _simulate_in_worker(job: Tuple[List[str], pd.Series]) -> pd.DataFrame:
+    names, inputs = job
+    (panel,) = worker_args()
+    return simulate_prices(panel.select(names), inputs)
+
+
 class InputLoader:
     @staticmethod
     def load_inputs(filepath: str) -> pd.Series:
@@ -25,10 +111,43 @@ class InputLoader:
         df['Date'] = df['Date'].dt.normalize().dt.tz_localize(None)
         return df.set_index('Date')['Quantity']
 
+    @staticmethod
+    def find_scenarios(paths: Sequence[str]) -> Dict[str, str]:
+        """Find the inputs file of each scenario, named after the file.
+        
+        Args:
+            paths: Inputs files, or directories whose CSV files are scenarios.
+            
+        Returns:
+            Dict mapping scenario name to its inputs file.
+        """
+        scenarios = {}
+        for path in paths:
+            files = sorted(glob.glob(os.path.join(path, "*.csv"))) if os.path.isdir(path) else [path]
+            for filepath in files:
+                name = os.path.splitext(os.path.basename(filepath))[0]
+                if name in scenarios:
+                    raise ValueError(f"Two scenarios named {name}: {scenarios[name]} and {filepath}")
+                scenarios[name] = filepath
+        return scenarios
+
 class PortfolioSimulator:
-    def __init__(self, vm_url: str = "http://localhost:8428"):
-        self.vm_client = VictoriaMetricsClient(vm_url)
-        self.uploader = TickerUploader(vm_url)
+    def __init__(self, vm_url: str = "http://localhost:8428",
+                 cache: Optional[HistoryCache] = None,
+                 registry: Optional[HistoryRegistry] = None,
+                 incremental: bool = False,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 store: Optional[HistoryStore] = None,
+                 metrics: Optional[RunMetrics] = None):
+        # Timings and counters of the stages, shared with the uploader and clients
+        self.metrics = metrics or RunMetrics()
+        self.vm_client = VictoriaMetricsClient(vm_url, metrics=self.metrics)
+        self.uploader = TickerUploader(vm_url, cache=cache, registry=registry,
+                                       incremental=incremental, metrics=self.metrics)
+        # Where the state of each simulated series is kept between runs
+        self.checkpoints = checkpoints
+        # Where the aligned prices of a run are shared with worker processes
+        self.store = store
         
     def simulate_asset(self, asset_name: str, history: pd.DataFrame, inputs: pd.Series) -> pd.DataFrame:
         """Simulate investing inputs into an asset.
@@ -44,75 +163,17 @@ class PortfolioSimulator:
         if history.empty:
             print(f"Warning: No history for {asset_name}")
             return pd.DataFrame()
-            
-        # Align inputs to history index
-        # We want to reindex the inputs to the history dates
-        # Inputs on non-trading days should probably be moved to the next trading day
-        # But for simplicity, we can use searchsorted or merge_asof if needed.
-        # Simpler approach: Reindex inputs to union of indices, then ffill?
-        # No, input is a one-time event.
-        
-        # Merge history and inputs
-        df = history[['Close']].copy()
-        df['Input'] = 0.0
-        
-        # Group inputs by date (in case of multiple inputs on same day)
-        daily_inputs = inputs.groupby(inputs.index).sum()
-        
-        # Add inputs to the dataframe
-        # We need to handle inputs that fall on weekends/holidays -> move to next valid date
-        # Or just join and fillna(0) then iterate?
-        
-        # Let's combine indices
-        combined_idx = df.index.union(daily_inputs.index).sort_values()
-        combined_df = df.reindex(combined_idx)
-        combined_df['Input'] = 0.0
-        combined_df.loc[daily_inputs.index, 'Input'] = daily_inputs.values
-        
-        # Forward fill Close price (if input is on weekend, use last Friday's close? Or wait for Monday?)
-        # If input is on Sunday, we can't buy until Monday. 
-        # Ideally, we should shift input to next valid index in history.
-        
-        # Better approach:
-        # 1. Iterate through inputs.
-        # 2. Find insertion point in history index.
-        # 3. Add shares.
-        
-        shares = 0.0
-        portfolio_value = []
-        dates = []
-        
-        # We only care about dates in history for the output value series
-        # But we need to process inputs.
-        
-        # Let's align inputs to history dates (next valid trading day)
-        valid_inputs = pd.Series(0.0, index=history.index)
-        
-        for date, amount in daily_inputs.items():
-            # Find next valid date
-            future_dates = history.index[history.index >= date]
-            if not future_dates.empty:
-                valid_date = future_dates[0]
-                valid_inputs[valid_date] += amount
-            else:
-                print(f"Warning: Input on {date} is after last history date. Ignoring.")
-                
-        # Now we have aligned inputs
-        # Vectorized simulation
-        
-        # Price at each day
-        prices = history['Close']
-        
-        # Shares bought at each day: Input / Price
-        shares_bought = valid_inputs / prices
-        
-        # Cumulative shares
-        cumulative_shares = shares_bought.cumsum()
-        
-        # Portfolio value = Cumulative Shares * Price
-        value = cumulative_shares * prices
+
+        prices = PricePanel(history.index, [asset_name], history[['Close']].to_numpy())
+        values = self.simulate_assets(prices, inputs)
+        return pd.DataFrame({'Close': values[asset_name]}, index=history.index)
+
+    def simulate_assets(self, prices: PricePanel, inputs: pd.Series) -> pd.DataFrame:
+        """Simulate investing inputs into every asset of a price matrix at once.
         
-        return pd.DataFrame({'Close': value}, index=history.index)
+        See simulate_prices.
+        """
+        return simulate_prices(prices, inputs)
 
     def simulate_inputs_cumulative(self, inputs: pd.Series, dates: pd.DatetimeIndex) -> pd.DataFrame:
         """Create cumulative sum series of inputs aligned to dates."""
@@ -161,61 +222,332 @@ class PortfolioSimulator:
         
         return pd.DataFrame({'Close': result}, index=dates)
 
-    def run(self, inputs_file: str):
+    def run(self, inputs_file: str, jobs: int = 1, source: str = "yahoo",
+            resume: bool = True):
+        """Simulate every asset and upload the results to VictoriaMetrics.
+        
+        Histories are downloaded concurrently, every asset is simulated in
+        one vectorized pass and the results are uploaded in one batched import.
+        A failing asset does not stop the others.
+        
+        With checkpoints, a series whose inputs and prices did not change
+        before its checkpoint, and whose stored series ends at it, only
+        simulates and appends the new days.
+        
+        Args:
+            inputs_file: Path to CSV file with Date,Quantity columns.
+            jobs: Maximum number of downloads/uploads running at the same time.
+            source: Where prices come from: "yahoo" (or its cache), "vm",
+                the finance_close series already stored in VictoriaMetrics,
+                or "store", the history store written by the last run.
+            resume: Resume from the checkpoints; False simulates everything
+                again (and rewrites the checkpoints).
+        """
+        self.run_scenarios({None: inputs_file}, jobs=jobs, source=source, resume=resume)
+
+    def run_scenarios(self, scenarios: Dict[Optional[str], str], jobs: int = 1,
+                      processes: int = 1, source: str = "yahoo", resume: bool = True):
+        """Simulate several inputs scenarios over histories loaded once.
+        
+        The series of each scenario are labelled scenario="<name>" and keep
+        their own checkpoints. The scenario None is a plain run, see run.
+        
+        Args:
+            scenarios: Dict mapping scenario name to its inputs file.
+            jobs: Maximum number of downloads/uploads running at the same time.
+            processes: Worker processes simulating the scenarios; 1
+                simulates them in this process.
+            source: "yahoo" (or its cache), "vm" or "store", see run.
+            resume: Resume from the checkpoints, see run.
+        """
         print("Loading inputs...")
-        inputs = InputLoader.load_inputs(inputs_file)
-        if inputs.empty:
+        all_inputs = {}
+        for scenario, inputs_file in scenarios.items():
+            inputs = InputLoader.load_inputs(inputs_file)
+            if inputs.empty:
+                if scenario is not None:
+                    print(f"No inputs found in scenario {scenario}, skipping it.")
+                continue
+            all_inputs[scenario] = inputs
+        if not all_inputs:
             print("No inputs found.")
             return
 
-        print("Fetching histories...")
-        histories = {}
-        # Get individual tickers
-        for ticker_config in TICKERS:
-            print(f"  Downloading {ticker_config.name}...")
-            hist = self.uploader.download_history(ticker_config.yahoo_ticker)
-            if not hist.empty:
-                histories[ticker_config.name] = hist
-        
+        histories, download_errors = self.load_histories(source, jobs=jobs)
+
+        # Prices of every asset aligned once, shared by mymix and the simulation
+        panel = PricePanel.from_histories(histories)
+
         # Calculate mymix
         print("  Calculating mymix...")
         try:
-            mymix_df = self.uploader.calculate_mymix(histories)
-            histories['mymix'] = mymix_df
-        except ValueError as e:
+            mymix_df = self.uploader.calculate_mymix(panel)
+            panel = panel.with_column('mymix', mymix_df['Close'])
+        except (KeyError, ValueError) as e:
             print(f"Error calculating mymix: {e}")
 
-        # Determine common date range for simulation outputs?
-        # Or just use each asset's history range?
-        # The prompt implies comparing them. It's best if they share the X axis mostly, 
-        # but using the asset's own history is fine.
-        
-        # However, for the 'inputs' baseline, we need a reference date range.
-        # We can use the union of all history dates, or just mymix's range.
-        # Let's use mymix's range as the "canonical" portfolio range if available, else union.
-        
+        # The 'inputs' baseline uses mymix's range as the "canonical"
+        # portfolio range if available, else the first asset's range.
+        # Worker processes attach to the store instead of receiving a copy
+        shared: Union[PricePanel, str] = panel
+        if self.store is not None and source != "store":
+            self.store.write(panel)
+            panel = self.store.read()
+            shared = self.store.directory
+
         reference_dates = pd.Index([])
-        if 'mymix' in histories:
-            reference_dates = histories['mymix'].index
-        elif histories:
-             reference_dates = list(histories.values())[0].index
-             
-        # Upload Inputs Baseline
-        print("Simulating and uploading Inputs baseline...")
-        inputs_value = self.simulate_inputs_cumulative(inputs, reference_dates)
-        csv_data = self.uploader.format_csv(inputs_value)
-        self.vm_client.delete_series("inputs", metric_name="finance_simulation_value")
-        self.vm_client.upload_csv(csv_data, "inputs", metric_name="finance_simulation_value")
-        
-        # Simulate and Upload Assets
-        for name, history in histories.items():
-            print(f"Simulating and uploading {name}...")
-            sim_value = self.simulate_asset(name, history, inputs)
-            csv_data = self.uploader.format_csv(sim_value)
-            
-            # Using metric name 'finance_simulation_value'
-            self.vm_client.delete_series(name, metric_name="finance_simulation_value")
-            self.vm_client.upload_csv(csv_data, name, metric_name="finance_simulation_value")
+        if 'mymix' in panel:
+            reference_dates = panel.close('mymix').index
+        elif panel.tickers:
+            reference_dates = panel.close(panel.tickers[0]).index
+
+        # Series with a checkpoint resume from it in their task; the other
+        # assets of a scenario are simulated in one pass over the aligned
+        # price matrix. Then the series are planned concurrently and
+        # uploaded in one batched import
+        checkpoints = {
+            scenario: self._load_checkpoints(scenario, ["inputs"] + panel.tickers) if resume else {}
+            for scenario in all_inputs
+        }
+        full = {
+            scenario: [name for name in panel.tickers if name not in checkpoints[scenario]]
+            for scenario in all_inputs
+        }
+        with self.metrics.stage("simulate"):
+            values = self._simulate_scenarios(panel, all_inputs, full, processes, shared)
+
+        tasks = {}
+        series_names = {}  # task name -> (scenario, series name)
+        for scenario, inputs in all_inputs.items():
+            task_name = _task_name(scenario, "inputs")
+            series_names[task_name] = (scenario, "inputs")
+            tasks[task_name] = functools.partial(
+                self._plan_inputs_baseline, inputs, reference_dates,
+                checkpoints[scenario].get("inputs"), scenario,
+            )
+            for name in panel.tickers:
+                sim_value = None
+                if name in full[scenario]:
+                    sim_value = values[scenario][[name]].dropna().rename(columns={name: 'Close'})
+                task_name = _task_name(scenario, name)
+                series_names[task_name] = (scenario, name)
+                tasks[task_name] = functools.partial(
+                    self._plan_asset, name, panel.close(name), inputs, sim_value,
+                    checkpoints[scenario].get(name), scenario,
+                )
+        results, errors = run_tasks(tasks, jobs=jobs)
+        errors.update(download_errors)
+        plans = [plan for plan, _ in results.values()]
+        print(f"Uploading {len(plans)} series...")
+        self.uploader.publish(plans)
+        with self.metrics.stage("checkpoints"):
+            for scenario in all_inputs:
+                self._save_checkpoints(scenario, {
+                    series_names[task_name][1]: checkpoint
+                    for task_name, (_, checkpoint) in results.items()
+                    if series_names[task_name][0] == scenario
+                })
             
         print("Simulation complete.")
+        print(self.uploader.registry.stats())
         self.vm_client.reset_cache()
+        if errors:
+            raise RuntimeError(f"Failed to simulate: {', '.join(errors)}")
+
+    def _simulate_scenarios(
+        self, panel: PricePanel, all_inputs: Dict[Optional[str], pd.Series],
+        full: Dict[Optional[str], List[str]], processes: int = 1,
+        shared: Union[PricePanel, str, None] = None,
+    ) -> Dict[Optional[str], pd.DataFrame]:
+        """Simulate the assets without checkpoint of every scenario.
+        
+        ``shared`` is what worker processes get of the prices: the panel
+        itself (default) or the directory of the store holding it.
+        """
+        jobs = {scenario: (full[scenario], inputs)
+                for scenario, inputs in all_inputs.items() if full[scenario]}
+        for scenario, (names, _) in jobs.items():
+            of_scenario = "" if scenario is None else f" of scenario {scenario}"
+            print(f"Simulating {len(names)} assets{of_scenario}...")
+        if processes > 1 and len(jobs) > 1:
+            # The prices are sent once to every worker, then only the inputs
+            with worker_pool(
+                min(processes, len(jobs)), panel if shared is None else shared, setup=_attach_panel
+            ) as executor:
+                return dict(zip(jobs, executor.map(_simulate_in_worker, jobs.values())))
+        return {scenario: simulate_prices(panel.select(names), inputs)
+                for scenario, (names, inputs) in jobs.items()}
+
+    def load_histories(
+        self, source: str = "yahoo", jobs: int = 1,
+        tickers: Optional[List[TickerConfig]] = None,
+    ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, Exception]]:
+        """Load the history of every configured ticker.
+        
+        Args:
+            source: "yahoo" (or its cache), "vm" (finance_close series) or
+                "store" (the history store)
+            jobs: Maximum number of downloads running at the same time
+            tickers: Tickers to load (default: every configured ticker)
+            
+        Returns:
+            Tuple of (dict mapping ticker name to its non-empty history,
+            dict mapping ticker name to its download error)
+        """
+        if source == "vm":
+            print("Reading histories from VictoriaMetrics...")
+            return self.load_histories_from_vm(tickers), {}
+        if source == "store":
+            if self.store is None:
+                raise ValueError("Reading from the history store needs a store")
+            print(f"Reading histories from {self.store.directory}...")
+            return self.store.histories([t.name for t in tickers or TICKERS]), {}
+        print("Fetching histories...")
+        downloads = {
+            ticker_config.name: functools.partial(self._download, ticker_config)
+            for ticker_config in tickers or TICKERS
+        }
+        results, errors = run_tasks(downloads, jobs=jobs)
+        return {name: hist for name, hist in results.items() if not hist.empty}, errors
+
+    def _download(self, ticker_config: TickerConfig) -> pd.DataFrame:
+        with self.metrics.stage("download", ticker_config.name):
+            return self.uploader.get_history(ticker_config.yahoo_ticker)
+
+    def load_histories_from_vm(
+        self, tickers: Optional[List[TickerConfig]] = None
+    ) -> Dict[str, pd.DataFrame]:
+        """Read the finance_close series of every ticker back from VictoriaMetrics.
+        
+        Args:
+            tickers: Tickers to read (default: every configured ticker)
+            
+        Returns:
+            Dict mapping ticker name to a DataFrame with a 'Close' column.
+        """
+        tickers = tickers or TICKERS
+        closes = self.vm_client.export_frame([t.name for t in tickers])
+        histories = {}
+        for ticker_config in tickers:
+            if ticker_config.name not in closes:
+                print(f"Warning: No finance_close series for {ticker_config.name} in VictoriaMetrics")
+                continue
+            close = closes[ticker_config.name].dropna()
+            histories[ticker_config.name] = pd.DataFrame({'Close': close})
+        return histories
+
+    def _checkpoint_store(self, scenario: Optional[str]) -> Optional[CheckpointStore]:
+        if self.checkpoints is None or scenario is None:
+            return self.checkpoints
+        return self.checkpoints.scenario(scenario)
+
+    def _load_checkpoints(
+        self, scenario: Optional[str], names: List[str]
+    ) -> Dict[str, SimulationCheckpoint]:
+        store = self._checkpoint_store(scenario)
+        if store is None:
+            return {}
+        loaded = {name: store.load(name) for name in names}
+        return {name: cp for name, cp in loaded.items() if cp is not None}
+
+    def _save_checkpoints(
+        self, scenario: Optional[str], checkpoints: Dict[str, Optional[SimulationCheckpoint]]
+    ) -> None:
+        store = self._checkpoint_store(scenario)
+        if store is None:
+            return
+        for name, checkpoint in checkpoints.items():
+            if checkpoint is not None:
+                store.save(name, checkpoint)
+
+    def _plan_inputs_baseline(
+        self, inputs: pd.Series, dates: pd.DatetimeIndex,
+        checkpoint: Optional[SimulationCheckpoint] = None,
+        scenario: Optional[str] = None,
+    ) -> Tuple[SeriesPlan, Optional[SimulationCheckpoint]]:
+        labels, absent = simulation_labels(scenario)
+        if dates.empty:
+            return (None, None), None
+        # The baseline has no prices; its checkpoint only tracks the dates
+        days = pd.Series(0.0, index=dates)
+        if (checkpoint is not None and is_valid(checkpoint, days, inputs)
+                and self._stored_until(checkpoint, "inputs", labels, absent)):
+            last_date = checkpoint.last_timestamp
+            new_dates = dates[dates > last_date]
+            if new_dates.empty:
+                return (None, None), checkpoint
+            print("Resuming Inputs baseline...")
+            with self.metrics.stage("simulate", "inputs"):
+                tail = self.simulate_inputs_cumulative(inputs[inputs.index > last_date], new_dates)
+            tail['Close'] += checkpoint.inputs_total
+            plan = (None, frame_to_series(tail, "finance_simulation_value",
+                                          {"ticker": "inputs", **labels}))
+        else:
+            print("Simulating Inputs baseline...")
+            with self.metrics.stage("simulate", "inputs"):
+                inputs_value = self.simulate_inputs_cumulative(inputs, dates)
+            plan = self.uploader.plan_series("inputs", inputs_value, metric_name="finance_simulation_value",
+                                             labels=labels, absent=absent)
+        return plan, make_checkpoint(days, inputs, shares=0.0)
+
+    def _plan_asset(
+        self, name: str, close: pd.Series, inputs: pd.Series,
+        sim_value: Optional[pd.DataFrame] = None,
+        checkpoint: Optional[SimulationCheckpoint] = None,
+        scenario: Optional[str] = None,
+    ) -> Tuple[SeriesPlan, Optional[SimulationCheckpoint]]:
+        labels, absent = simulation_labels(scenario)
+        if checkpoint is not None:
+            if not is_valid(checkpoint, close, inputs):
+                print(f"Inputs or prices of {name} changed before its checkpoint, simulating it again")
+            elif not self._stored_until(checkpoint, name, labels, absent):
+                print(f"Stored series of {name} does not end at its checkpoint, simulating it again")
+            else:
+                return self._resume_asset(name, close, inputs, checkpoint, labels)
+        if sim_value is None:
+            with self.metrics.stage("simulate", name):
+                sim_value = self.simulate_asset(name, close.rename('Close').to_frame(), inputs)
+        
+        # Using metric name 'finance_simulation_value'
+        plan = self.uploader.plan_series(name, sim_value, metric_name="finance_simulation_value",
+                                         labels=labels, absent=absent)
+        shares = sim_value['Close'].iloc[-1] / close.iloc[-1]
+        return plan, make_checkpoint(close, inputs, shares)
+
+    def _stored_until(
+        self, checkpoint: SimulationCheckpoint, name: str,
+        labels: Dict[str, str], absent: Sequence[str],
+    ) -> bool:
+        """Whether the series stored in VictoriaMetrics ends at the checkpoint.
+        
+        A series deleted or replaced since the checkpoint was written would
+        get gaps or duplicates from an append, so it is simulated again.
+        """
+        stored = self.vm_client.last_timestamp(
+            name, "finance_simulation_value", labels={**labels, **{label: "" for label in absent}} or None
+        )
+        return stored == checkpoint.last_timestamp.value // 1_000_000
+
+    def _resume_asset(
+        self, name: str, close: pd.Series, inputs: pd.Series, checkpoint: SimulationCheckpoint,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> Tuple[SeriesPlan, SimulationCheckpoint]:
+        """Simulate only the days after the checkpoint and plan their append."""
+        last_date = checkpoint.last_timestamp
+        new_close = close[close.index > last_date]
+        if new_close.empty:
+            return (None, None), checkpoint
+        print(f"Resuming {name} after {last_date.date()}...")
+        with self.metrics.stage("simulate", name):
+            bought = self.simulate_asset(
+                name, new_close.rename('Close').to_frame(), inputs[inputs.index > last_date]
+            )['Close']
+        value = bought + checkpoint.shares * new_close
+        series = frame_to_series(value.rename('Close').to_frame(), "finance_simulation_value",
+                                 {"ticker": name, **(labels or {})})
+        shares = value.iloc[-1] / new_close.iloc[-1]
+        return (None, series), make_checkpoint(close, inputs, shares)
+
+
+def _task_name(scenario: Optional[str], name: str) -> str:
+    return name if scenario is None else f"{scenario}/{name}"
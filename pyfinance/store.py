@@ -0,0 +1,165 @@
+"""Memory-mapped store of aligned Close prices, shared between processes.
+
+The store is a directory with one subdirectory per written version and a
+``CURRENT`` file naming the version to read. A version holds the aligned
+prices of a PricePanel in ``.npy`` files and a small ``index.json``
+naming the tickers:
+
+    index.json    tickers, dates and written_at
+    dates.npy     int64 nanoseconds since the epoch, one per row
+    close.npy     float64 matrix (dates x tickers) in column-major order,
+                  so the series of each ticker is contiguous in the file
+    observed.npy  bool matrix, True where the price was in the history
+
+A write fills a new version and then switches ``CURRENT`` to it with one
+atomic rename, so a reader sees either the whole old version or the whole
+new one, never the matrix of one with the index of the other.
+
+Readers map the files read-only instead of loading them: every process
+attached to the store shares the same pages of the page cache, and a
+worker process only needs the directory, not a pickled copy of the prices.
+"""
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.panel import PricePanel
+
+INDEX_FILE = "index.json"
+CURRENT_FILE = "CURRENT"
+VERSION_PREFIX = "v"
+
+# Versions kept besides the current one, for readers that are still
+# opening the files of the previous one
+KEEP_VERSIONS = 1
+
+
+class HistoryStore:
+    """Aligned Close prices on disk, read through memory maps."""
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Directory of the store files
+        """
+        self.directory = directory
+
+    def current(self) -> str:
+        """Directory of the version to read.
+
+        Raises:
+            FileNotFoundError: If nothing was written to the store
+        """
+        with open(os.path.join(self.directory, CURRENT_FILE)) as f:
+            return os.path.join(self.directory, f.read().strip())
+
+    def path(self, name: str) -> str:
+        """Path of a file of the current version."""
+        return os.path.join(self.current(), name)
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.directory, CURRENT_FILE))
+
+    def write(self, panel: PricePanel) -> None:
+        """Replace the stored prices with the ones of a panel.
+
+        The files are written to a new version directory, which CURRENT is
+        then switched to. Processes that already mapped the old files keep
+        reading them; older versions are removed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        version = f"{VERSION_PREFIX}{time.time_ns()}-{os.getpid()}"
+        version_dir = os.path.join(self.directory, version)
+        os.mkdir(version_dir)
+        np.save(os.path.join(version_dir, "dates.npy"),
+                panel.index.values.astype("datetime64[ns]").astype(np.int64))
+        np.save(os.path.join(version_dir, "close.npy"), np.asfortranarray(panel.values))
+        np.save(os.path.join(version_dir, "observed.npy"), np.asfortranarray(panel.observed))
+        index = {
+            "tickers": panel.tickers,
+            "dates": len(panel.index),
+            "written_at": time.time(),
+        }
+        with open(os.path.join(version_dir, INDEX_FILE), "w") as f:
+            json.dump(index, f)
+        self._replace(CURRENT_FILE, lambda f: f.write(version.encode()))
+        self._remove_old_versions(version)
+
+    def read(self) -> PricePanel:
+        """Attach to the stored prices without copying them.
+
+        Returns:
+            A panel whose values and observed matrices are read-only maps
+            of the store files
+
+        Raises:
+            FileNotFoundError: If nothing was written to the store
+            ValueError: If the files do not match the index
+        """
+        for attempt in range(3):
+            try:
+                return self._read(self.current())
+            except FileNotFoundError:
+                # The version was removed by two writes since CURRENT was read
+                if attempt == 2 or not self.exists():
+                    raise
+
+    def _read(self, version_dir: str) -> PricePanel:
+        with open(os.path.join(version_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+        dates = np.load(os.path.join(version_dir, "dates.npy"))
+        close = np.load(os.path.join(version_dir, "close.npy"), mmap_mode="r")
+        observed = np.load(os.path.join(version_dir, "observed.npy"), mmap_mode="r")
+        shape = (index["dates"], len(index["tickers"]))
+        if close.shape != shape or observed.shape != shape or len(dates) != shape[0]:
+            raise ValueError(f"History store {self.directory} does not match its index")
+        return PricePanel(
+            pd.DatetimeIndex(dates.astype("datetime64[ns]")), index["tickers"], close, observed
+        )
+
+    def index(self) -> Dict:
+        """Contents of the index file of the current version."""
+        with open(self.path(INDEX_FILE)) as f:
+            return json.load(f)
+
+    @property
+    def tickers(self) -> List[str]:
+        return self.index()["tickers"] if self.exists() else []
+
+    def close(self, ticker: str) -> pd.Series:
+        """Prices of a ticker on the dates it has a price."""
+        return self.read().close(ticker)
+
+    def histories(self, tickers: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """Histories with a 'Close' column, like the downloaded ones.
+
+        Args:
+            tickers: Tickers to read (default: every stored ticker); the
+                ones missing in the store are left out
+
+        Returns:
+            Dict mapping ticker name to its history
+        """
+        panel = self.read()
+        names = panel.tickers if tickers is None else [t for t in tickers if t in panel]
+        return {name: panel.history(name) for name in names}
+
+    def _replace(self, name: str, write) -> None:
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def _remove_old_versions(self, current: str) -> None:
+        # Names start with the write time, so they sort oldest first; newer
+        # ones belong to a concurrent write and are left alone
+        versions = sorted(name for name in os.listdir(self.directory)
+                          if name.startswith(VERSION_PREFIX) and name < current)
+        for name in versions[:len(versions) - KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
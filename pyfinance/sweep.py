@@ -0,0 +1,177 @@
+"""Evaluate many alternative portfolio weights against the same inputs.
+
+Like mymix, a candidate portfolio is the weighted sum of the prices of the
+portfolio tickers. Every candidate of a chunk is computed at once as the
+matrix product prices @ weights.T (days x candidates).
+"""
+import itertools
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.config import PORTFOLIO_WEIGHTS
+from pyfinance.defaults import SORT_COLUMNS, SWEEP_CHUNK_SIZE as DEFAULT_CHUNK_SIZE
+from pyfinance.panel import PricePanel
+from pyfinance.pipeline import worker_args, worker_pool
+
+def weight_grid(n_assets: int, step: float) -> np.ndarray:
+    """Every weight vector with weights multiple of ``step`` that sum to 1.
+
+    Args:
+        n_assets: Number of tickers
+        step: Weight increment, e.g. 0.05
+
+    Returns:
+        Matrix (candidates x n_assets)
+    """
+    units = int(round(1 / step))
+    if units < 1 or not np.isclose(units * step, 1):
+        raise ValueError(f"Step must divide 1, got {step}")
+    # Stars and bars: the positions of n_assets - 1 bars among units stars
+    bars = np.array(
+        list(itertools.combinations(range(units + n_assets - 1), n_assets - 1)),
+        dtype=np.int64,
+    ).reshape(-1, n_assets - 1)
+    edges = np.hstack([
+        np.full((len(bars), 1), -1), bars, np.full((len(bars), 1), units + n_assets - 1)
+    ])
+    return (np.diff(edges, axis=1) - 1) / units
+
+
+def random_weights(n_assets: int, samples: int, seed: Optional[int] = None) -> np.ndarray:
+    """Weight vectors drawn uniformly from every vector that sums to 1."""
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(np.ones(n_assets), size=samples)
+
+
+def candidate_weights(
+    tickers: Sequence[str], step: Optional[float] = None,
+    samples: int = 0, seed: Optional[int] = None,
+) -> np.ndarray:
+    """Candidates to sweep; the first one is the configured PORTFOLIO_WEIGHTS.
+
+    Args:
+        tickers: Portfolio tickers, in column order
+        step: Weight increment of a grid of candidates (None for no grid)
+        samples: Random candidates added
+        seed: Seed of the random candidates
+
+    Returns:
+        Matrix (candidates x tickers)
+    """
+    candidates = [np.array([[PORTFOLIO_WEIGHTS[ticker] for ticker in tickers]])]
+    if step:
+        candidates.append(weight_grid(len(tickers), step))
+    if samples:
+        candidates.append(random_weights(len(tickers), samples, seed))
+    return np.vstack(candidates)
+
+
+def invested_per_day(index: pd.DatetimeIndex, inputs: pd.Series) -> np.ndarray:
+    """Money invested on each day of the index.
+
+    Inputs move to the next day of the index; inputs after the last day
+    are ignored.
+    """
+    rows = index.searchsorted(inputs.index)
+    kept = rows < len(index)
+    return np.bincount(
+        rows[kept], weights=inputs.to_numpy(dtype=np.float64)[kept], minlength=len(index)
+    )
+
+
+def evaluate_weights(
+    prices: np.ndarray, invested: np.ndarray, weights: np.ndarray, years: float
+) -> np.ndarray:
+    """Final value, CAGR and max drawdown of each weight vector.
+
+    Args:
+        prices: Prices without gaps (days x tickers)
+        invested: Money invested on each day
+        weights: Candidates (candidates x tickers)
+        years: Length of the period in years
+
+    Returns:
+        Matrix (candidates x 3) of final value, CAGR and max drawdown
+    """
+    mix = prices @ weights.T  # days x candidates
+    # Shares bought each day are invested / mix; their value at the end
+    # is the final mix price times the total shares
+    final_value = mix[-1] * (invested @ (1.0 / mix))
+    cagr = (mix[-1] / mix[0]) ** (1 / years) - 1 if years > 0 else np.zeros(len(weights))
+    max_drawdown = (1 - mix / np.maximum.accumulate(mix, axis=0)).max(axis=0)
+    return np.column_stack([final_value, cagr, max_drawdown])
+
+
+def _evaluate_in_worker(weights: np.ndarray) -> np.ndarray:
+    prices, invested, years = worker_args()
+    return evaluate_weights(prices, invested, weights, years)
+
+
+def _chunks(weights: np.ndarray, chunk_size: int) -> Iterator[np.ndarray]:
+    for start in range(0, len(weights), chunk_size):
+        yield weights[start:start + chunk_size]
+
+
+def sweep(
+    panel: PricePanel,
+    inputs: pd.Series,
+    weights: np.ndarray,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    processes: int = 1,
+    sort_by: str = "final_value",
+) -> pd.DataFrame:
+    """Rank candidate weights by investing the inputs in each of them.
+
+    Args:
+        panel: Prices of the tickers, aligned on their common dates
+        inputs: Series with DatetimeIndex and amount to invest
+        weights: Candidates (candidates x tickers), columns in panel order
+        chunk_size: Candidates evaluated together
+        processes: Worker processes; 1 evaluates in this process
+        sort_by: "final_value", "cagr" or "max_drawdown"
+
+    Returns:
+        DataFrame with the position of the candidate in ``weights``, one
+        weight column per ticker, final_value, cagr and max_drawdown,
+        best candidate first
+    """
+    if sort_by not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort column: {sort_by}")
+    panel = panel.dropna()
+    if panel.empty:
+        raise ValueError("No common dates found across portfolio tickers")
+    daily_inputs = inputs.groupby(inputs.index).sum()
+    invested = invested_per_day(panel.index, daily_inputs)
+    years = (panel.index[-1] - panel.index[0]).days / 365.25
+    prices = np.ascontiguousarray(panel.values)
+
+    chunks = _chunks(np.asarray(weights, dtype=np.float64), chunk_size)
+    if processes > 1:
+        with worker_pool(processes, prices, invested, years) as executor:
+            results = list(executor.map(_evaluate_in_worker, chunks))
+    else:
+        results = [evaluate_weights(prices, invested, chunk, years) for chunk in chunks]
+
+    metrics = np.vstack(results) if results else np.empty((0, 3))
+    table = pd.DataFrame(weights, columns=panel.tickers)
+    table.insert(0, "candidate", np.arange(len(table)))
+    table["final_value"] = metrics[:, 0]
+    table["cagr"] = metrics[:, 1]
+    table["max_drawdown"] = metrics[:, 2]
+    table = table.sort_values(sort_by, ascending=SORT_COLUMNS[sort_by], kind="stable")
+    return table.reset_index(drop=True)
+
+
+def format_table(table: pd.DataFrame, tickers: Sequence[str], top: int) -> str:
+    """Render the best candidates of a sweep as text."""
+    shown = table.head(top).drop(columns="candidate")
+    shown.index = pd.RangeIndex(1, len(shown) + 1, name="rank")
+    formatters = {ticker: "{:.1%}".format for ticker in tickers}
+    formatters.update({
+        "final_value": "{:,.2f}".format,
+        "cagr": "{:.2%}".format,
+        "max_drawdown": "{:.2%}".format,
+    })
+    return shown.to_string(formatters=formatters)
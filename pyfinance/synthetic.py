@@ -0,0 +1,33 @@
+"""Reproducible synthetic close prices, for the load test and the benchmarks.
+
+Prices are geometric random walks over business days, seeded by the ticker
+symbol: the same ticker and length give the same history in every run and
+on every machine, without network access.
+"""
+import zlib
+
+import numpy as np
+import pandas as pd
+
+END_DATE = "2024-12-31"
+
+# Daily log-return of the random walks: about 7% a year, 16% volatility
+DAILY_DRIFT = 0.0003
+DAILY_VOLATILITY = 0.01
+
+
+def business_days(years: int, end: str = END_DATE) -> pd.DatetimeIndex:
+    """Business days of the ``years`` years that end on ``end``."""
+    end = pd.Timestamp(end)
+    return pd.bdate_range(end - pd.DateOffset(years=years) + pd.Timedelta(days=1), end)
+
+
+def ticker_seed(ticker: str) -> int:
+    return zlib.crc32(ticker.encode())
+
+
+def synthetic_close(ticker: str, days: int) -> np.ndarray:
+    """Close prices of a ticker, starting at 100."""
+    rng = np.random.default_rng(ticker_seed(ticker))
+    returns = rng.normal(DAILY_DRIFT, DAILY_VOLATILITY, days)
+    return 100 * np.exp(np.cumsum(returns))
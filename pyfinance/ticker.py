@@ -1,13 +1,18 @@
 import datetime
 import io
+import os
 import sys
-from typing import List
+from typing import Dict, Optional
 import numpy as np
 import pandas as pd
 import yfinance as yf
 from collections import namedtuple
 import calendar
 
+from pyfinance.cache import HistoryCache
+from pyfinance.panel import PricePanel
+from pyfinance.store import HistoryStore
+
 
 _TICKER = {
     "naranja90": "0P0001E1ZI.F", # Fondo Común de Inversión Naranja 90 comparado con MSCI World net total return eur index
@@ -21,56 +26,149 @@ _TICKER = {
  
 TICKER = namedtuple('Struct', _TICKER.keys())(*_TICKER.values()) 
 
+# 1970-01-01, day 0 of the epoch, was a Thursday (Monday is 0)
+EPOCH_WEEKDAY = 3
+
+# Date format of the CSV files
+CSV_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
 class History:
     """ Class to get historical data from Yahoo Finance.
 
+    The history is kept in columnar form: the dates as int64 days since the
+    epoch, one contiguous array per numeric column (Open, Close, Volume...)
+    and the ticker symbol once. ``save``/``load`` store these arrays in a
+    NumPy ``.npz`` file that is read back without parsing.
+
     Args:
         ticker (str): Ticker symbol of the company.
         start (str): Start date of the data.
         end (str): End date of the data.
+        cache (HistoryCache): Optional on-disk cache used instead of downloading the full history.
 """
 
-    def __init__(self, ticker: str="") -> None:
+    def __init__(self, ticker: str="", cache: Optional[HistoryCache]=None) -> None:
         self.ticker = ticker
+        self.cache = cache
         # Lazy load
         self._stock: yf.Ticker = None
-        self._history: pd.core.frame.DataFrame = None
+        self._days: np.ndarray = None
+        self._columns: Dict[str, np.ndarray] = None
 
 
+    @classmethod
+    def from_panel(cls, panel: PricePanel, ticker: str) -> "History":
+        """ Build the History of a ticker from the aligned prices of a run, without downloading"""
+        history = cls(ticker)
+        history._set_frame(panel.history(ticker))
+        return history
+
+    @classmethod
+    def from_store(cls, store: HistoryStore, ticker: str) -> "History":
+        """ Build the History of a ticker from a history store, without downloading"""
+        return cls.from_panel(store.read(), ticker)
+
+    @classmethod
+    def load(cls, path: str) -> "History":
+        """ Read a History written by save"""
+        with np.load(path) as data:
+            history = cls(str(data["ticker"]))
+            history._days = data["days"]
+            history._columns = {
+                str(name): data[f"column_{i}"] for i, name in enumerate(data["columns"])
+            }
+        return history
+
+    def save(self, path: str) -> None:
+        """ Load the Data if not loaded yet and write them to a .npz file"""
+        self._ensure_loaded()
+        arrays = {f"column_{i}": values for i, values in enumerate(self._columns.values())}
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                ticker=np.array(self.ticker),
+                days=self._days,
+                columns=np.array(list(self._columns), dtype=str),
+                **arrays,
+            )
+        os.replace(tmp_path, path)
+
     def _load(self):
         self.stock = yf.Ticker(self.ticker)
-        df_history = self.stock.history(period="max")
-        df_history['ticker'] = self.stock
-        self._history = df_history
-        self._reindex()
+        if self.cache is not None:
+            df_history = self.cache.history(self.ticker)
+        else:
+            df_history = self.stock.history(period="max")
+        self._set_frame(df_history)
 
-    def _reindex(self):
-        # self._history.index = self._history.index.map(lambda x: datetime.datetime.strftime(x, '%Y-%m-%dT%H:%M:%SZ'))
-        self._history.index = pd.to_datetime(self._history.index)
+    def _ensure_loaded(self):
+        if self._days is None:
+            self._load()
+
+    def _set_frame(self, df: pd.DataFrame, dates: Optional[pd.DatetimeIndex] = None):
+        """ Keep the numeric columns of a DataFrame indexed by date (or with ``dates``)"""
+        dates = pd.DatetimeIndex(df.index if dates is None else dates)
+        if dates.tz is not None:
+            # The local date of the exchange
+            dates = dates.tz_localize(None)
+        self._days = dates.values.astype('datetime64[D]').astype(np.int64)
+        numeric = df.select_dtypes(include='number')
+        self._columns = {
+            column: np.ascontiguousarray(numeric[column].to_numpy()) for column in numeric.columns
+        }
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        """ Dates of the history, at midnight"""
+        self._ensure_loaded()
+        return pd.DatetimeIndex(self._days.astype('datetime64[D]').astype('datetime64[ns]'))
+
+    def frame(self) -> pd.DataFrame:
+        """ The history as a DataFrame indexed by date"""
+        self._ensure_loaded()
+        return pd.DataFrame(self._columns, index=self.dates)
+
+    @property
+    def _history(self) -> pd.DataFrame:
+        """ The history in the CSV layout: a Date column, the numeric columns and the ticker"""
+        self._ensure_loaded()
+        df = pd.DataFrame({'Date': self.dates.strftime(CSV_DATE_FORMAT)})
+        for column, values in self._columns.items():
+            df[column] = values
+        df['ticker'] = self.ticker
+        return df
 
     def from_csv(self, content: str) -> None:
         """ Read the data from a CSV str and populate the Ticker object"""
         buffer = io.StringIO(content)
-        self._history = pd.read_csv(buffer)
-        self.ticker = self._history['ticker'][0]
+        df = pd.read_csv(buffer)
+        if 'ticker' in df:
+            self.ticker = df['ticker'][0]
+        self._set_frame(df.drop(columns='ticker', errors='ignore'),
+                        dates=pd.to_datetime(df['Date']))
         
 
     def to_csv(self) -> str:
         """ Load the Data if not loaded yet and write them to a CSV file"""
-        if self._history is None:
-            self._load()
-        
         buffer = io.StringIO()
         self._history.to_csv(buffer, index=False)
         return buffer.getvalue()
     
-    def close_mean_by_weekday(self) -> List[np.float64]:
-        """return seven float64 with the mean value for the Close value
+    def close_mean_by_weekday(self) -> pd.Series:
+        """return the mean value for the Close value per week day (Monday is 0)
+
+        Only the week days with data are returned.
         """
-        if self._history is None:
-            self._load()
-        
-        return self._history.groupby(self._history.index.weekday)['Close'].mean()
+        self._ensure_loaded()
+        close = self._columns['Close']
+        valid = ~np.isnan(close)
+        weekdays = (self._days[valid] + EPOCH_WEEKDAY) % 7
+        sums = np.bincount(weekdays, weights=close[valid], minlength=7)
+        counts = np.bincount(weekdays, minlength=7)
+        present = counts > 0
+        return pd.Series(sums[present] / counts[present], index=np.flatnonzero(present))
     
 
 def get_dataframe_by_weekday(df: pd.core.frame.DataFrame, week_day: int) -> pd.core.frame.DataFrame:
@@ -87,8 +185,7 @@ def get_dataframe_by_weekday(df: pd.core.frame.DataFrame, week_day: int) -> pd.c
 
 def explore(ticker: str):
     history = History(ticker)
-    history._load()
-    h = history._history
+    h = history.frame()
     print(h.head())
     print(h.tail())
     return history
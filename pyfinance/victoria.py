@@ -1,45 +1,438 @@
+import gzip
+import zlib
 import requests
-from typing import Optional
+from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlencode
+from urllib3.util.retry import Retry
+
+import numpy as np
+import pandas as pd
+
+from pyfinance.metrics import BYTES_SENT, POINTS_WRITTEN, RETRIES, RunMetrics
+from pyfinance.serialize import format_json_line, parse_export
+
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5.0, 60.0)
+
+# Maximum points sent in a single import request
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Maximum match[] selectors sent in a single delete or export request
+DEFAULT_MAX_SELECTORS = 500
+
+# Request body: text, bytes or an iterator of byte chunks to stream
+Body = Union[str, bytes, Iterable[bytes], None]
+
+
+@dataclass
+class MetricSeries:
+    """A series to import: metric name, labels and its points."""
+    metric: str
+    labels: Dict[str, str]
+    timestamps: Sequence[int]  # Unix milliseconds
+    values: Sequence[float]
+    # Labels the selector requires to be missing, so that it does not also
+    # match series that only add labels to these (e.g. a scenario)
+    absent: Sequence[str] = ()
+
+    def selector(self) -> str:
+        """Return the series selector, e.g. finance_close{ticker="usa"}."""
+        return format_selector(self.metric, self.selector_labels())
+
+    def selector_labels(self) -> Dict[str, str]:
+        """Labels of the selector; absent labels match the empty value."""
+        return {**self.labels, **{label: "" for label in self.absent}}
 
 
 class VictoriaMetricsClient:
-    """Client for uploading data to VictoriaMetrics."""
+    """Client for uploading data to VictoriaMetrics.
+
+    All requests go through pooled keep-alive sessions. Connection
+    errors and 5xx responses are retried with exponential backoff, and
+    import bodies are gzip-compressed. Streamed bodies cannot be sent
+    twice, so their requests are never retried: a failure raises.
+    """
 
-    def __init__(self, base_url: str = "http://localhost:8428"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8428",
+        timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+        retries: int = 3,
+        backoff: float = 0.5,
+        pool_size: int = 10,
+        compress: bool = True,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_selectors: int = DEFAULT_MAX_SELECTORS,
+        metrics: Optional[RunMetrics] = None,
+    ):
+        """
+        Args:
+            base_url: VictoriaMetrics URL
+            timeout: Seconds to wait, or a (connect, read) tuple
+            retries: Retries for connection errors and 5xx responses
+            backoff: Backoff factor between retries (0.5 -> 0.5s, 1s, 2s...)
+            pool_size: Maximum connections kept alive to VictoriaMetrics
+            compress: Send import bodies with gzip Content-Encoding
+            chunk_size: Maximum points sent in a single import request
+            max_selectors: Maximum match[] selectors sent in a single
+                delete or export request
+            metrics: Where the requests are timed and counted
+        """
         self.base_url = base_url
+        self.timeout = timeout
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.max_selectors = max_selectors
+        self.metrics = metrics or RunMetrics()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=None,  # Imports and deletes are idempotent
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # urllib3 would resend a consumed iterator as an empty body, which
+        # VictoriaMetrics accepts: streamed bodies go through no retries
+        stream_adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=Retry(total=0, raise_on_status=False),
+        )
+        self.stream_session = requests.Session()
+        self.stream_session.mount("http://", stream_adapter)
+        self.stream_session.mount("https://", stream_adapter)
 
-    def upload_csv(self, csv_data: str, name: str, metric_name: str = "finance_close") -> None:
+    def _post(self, url: str, data: Body = None, stage: str = "post", ticker: str = "",
+              form: Optional[Sequence[Tuple[str, str]]] = None, **kwargs) -> requests.Response:
+        """POST through the session, compressing the body if enabled.
+        
+        ``form`` fields are sent form-encoded in the body instead, never
+        compressed: they keep long lists of match[] selectors out of the URL.
+        
+        An iterator body is streamed with chunked transfer encoding; it
+        cannot be replayed, so such requests go through stream_session and
+        are never retried: a connection error or a 5xx response raises.
+        
+        The request is timed as ``stage`` and its bytes (as sent, after
+        compression) and retries are counted.
+        """
+        if form is not None:
+            data = urlencode(form).encode()
+            kwargs["headers"] = {**kwargs.get("headers", {}),
+                                 "Content-Type": "application/x-www-form-urlencoded"}
+        elif data is not None and self.compress:
+            if isinstance(data, str):
+                data = data.encode()
+            if isinstance(data, bytes):
+                data = gzip.compress(data, compresslevel=1)
+            else:
+                data = _gzip_stream(data)
+            kwargs["headers"] = {**kwargs.get("headers", {}), "Content-Encoding": "gzip"}
+        session = self.session
+        if isinstance(data, (str, bytes)):
+            size = len(data.encode()) if isinstance(data, str) else len(data)
+            self.metrics.add(BYTES_SENT, size, stage, ticker)
+        elif data is not None:
+            data = self._count_bytes(data, stage, ticker)
+            session = self.stream_session
+        with self.metrics.stage(stage, ticker):
+            response = session.post(url, data=data, timeout=self.timeout, **kwargs)
+        self._count_retries(response, stage, ticker)
+        response.raise_for_status()
+        return response
+
+    def _get(self, url: str, stage: str = "get", ticker: str = "", **kwargs) -> requests.Response:
+        """GET through the session, timed as ``stage``."""
+        with self.metrics.stage(stage, ticker):
+            response = self.session.get(url, timeout=self.timeout, **kwargs)
+        self._count_retries(response, stage, ticker)
+        response.raise_for_status()
+        return response
+
+    def _count_bytes(self, chunks: Iterable[bytes], stage: str, ticker: str) -> Iterator[bytes]:
+        """Count the bytes of a streamed body as they are sent."""
+        for chunk in chunks:
+            self.metrics.add(BYTES_SENT, len(chunk), stage, ticker)
+            yield chunk
+
+    def _count_retries(self, response: requests.Response, stage: str, ticker: str) -> None:
+        # urllib3 keeps the Retry of the request, with one history entry per retry
+        history = getattr(getattr(response.raw, "retries", None), "history", None)
+        if isinstance(history, tuple) and history:
+            self.metrics.add(RETRIES, len(history), stage, ticker)
+
+    def upload_csv(self, csv_data: Body, name: str, metric_name: str = "finance_close",
+                   time_format: str = "unix_ms") -> None:
         """Upload CSV data with ticker label.
         
         Args:
-            csv_data: CSV string with Date,Close columns
+            csv_data: CSV with timestamp,value lines, as text, bytes or an
+                iterator of byte chunks (see pyfinance.serialize); an
+                iterator is streamed and not retried
             name: Ticker name for labeling
             metric_name: Name of the metric (default: finance_close)
+            time_format: VictoriaMetrics time format of the first column
+                (unix_ms, unix_s, rfc3339...)
+                
+        Raises:
+            requests.HTTPError: If VictoriaMetrics answers with an error
         """
-        format_str = f"1:time:rfc3339,2:metric:{metric_name}"
+        format_str = f"1:time:{time_format},2:metric:{metric_name}"
         url = f"{self.base_url}/api/v1/import/csv"
         params = {
             "format": format_str,
             "extra_label": f"ticker={name}"
         }
-        response = requests.post(url, data=csv_data, params=params)
-        response.raise_for_status()
+        self._post(url, data=csv_data, stage="upload_csv", ticker=name, params=params)
+
+    def import_series(self, series: Iterable[MetricSeries]) -> int:
+        """Import many series in as few requests as possible.
+        
+        The series are sent as JSON lines to /api/v1/import. A request holds
+        at most ``chunk_size`` points; longer series are split across
+        requests.
+        
+        Args:
+            series: Series to import
+            
+        Returns:
+            Number of import requests sent
+        """
+        url = f"{self.base_url}/api/v1/import"
+        requests_sent = 0
+        for body, ticker_points in self._import_chunks(series):
+            self._post(url, data=body, stage="import")
+            # Counted once the request succeeded, so failed imports write no points
+            for ticker, points in ticker_points.items():
+                self.metrics.add(POINTS_WRITTEN, points, "import", ticker)
+            requests_sent += 1
+        return requests_sent
+
+    def _import_chunks(self, series: Iterable[MetricSeries]) -> Iterator[Tuple[bytes, Dict[str, int]]]:
+        """Yield JSON-line request bodies holding at most chunk_size points,
+        with the points of each ticker in the body."""
+        lines: List[bytes] = []
+        ticker_points: Dict[str, int] = {}
+        points = 0
+        for s in series:
+            metric = {"__name__": s.metric, **s.labels}
+            ticker = s.labels.get("ticker", "")
+            start = 0
+            while start < len(s.timestamps):
+                end = min(len(s.timestamps), start + self.chunk_size - points)
+                lines.append(format_json_line(
+                    metric, s.timestamps[start:end], s.values[start:end]
+                ))
+                ticker_points[ticker] = ticker_points.get(ticker, 0) + end - start
+                points += end - start
+                start = end
+                if points >= self.chunk_size:
+                    yield b"".join(lines), ticker_points
+                    lines, ticker_points, points = [], {}, 0
+        if lines:
+            yield b"".join(lines), ticker_points
+
+    def delete_matching(self, selectors: Sequence[str]) -> None:
+        """Delete every series matching any of the selectors.
+        
+        The selectors are sent in the body, at most ``max_selectors`` per
+        request.
+        
+        Args:
+            selectors: Series selectors, e.g. finance_close{ticker="usa"}
+        """
+        url = f"{self.base_url}/api/v1/admin/tsdb/delete_series"
+        for start in range(0, len(selectors), self.max_selectors):
+            batch = selectors[start:start + self.max_selectors]
+            self._post(url, stage="delete_series", form=[("match[]", selector) for selector in batch])
 
     def reset_cache(self) -> None:
         """Reset rollup result cache."""
         url = f"{self.base_url}/internal/resetRollupResultCache"
-        requests.get(url)
+        self._get(url, stage="reset_cache")
 
     def delete_series(self, name: str, metric_name: str = "finance_close") -> None:
         """Delete existing series for a ticker (for full replacement)."""
         url = f"{self.base_url}/api/v1/admin/tsdb/delete_series"
-        params = {"match[]": f'{metric_name}{{ticker="{name}"}}'}
-        requests.post(url, params=params)
+        params = {"match[]": _selector(metric_name, name)}
+        self._post(url, stage="delete_series", ticker=name, params=params)
+
+    def last_timestamp(
+        self, name: str, metric_name: str = "finance_close",
+        labels: Optional[Dict[str, str]] = None,
+    ) -> Optional[int]:
+        """Return the timestamp of the last stored point of a series.
+        
+        Args:
+            name: Ticker name of the series
+            metric_name: Name of the metric (default: finance_close)
+            labels: Other labels of the series ("" for a missing label)
+            
+        Returns:
+            Unix timestamp in milliseconds, or None if the series does not exist
+        """
+        url = f"{self.base_url}/api/v1/query"
+        params = {
+            "query": f'tlast_over_time({_selector(metric_name, name, labels)}[100y])',
+            "nocache": "1",
+        }
+        response = self._get(url, stage="last_timestamp", ticker=name, params=params)
+        result = response.json()["data"]["result"]
+        if not result:
+            return None
+        return int(round(float(result[0]["value"][1]) * 1000))
+
+    def export_points(
+        self, name: str, metric_name: str = "finance_close",
+        start: Optional[int] = None, end: Optional[int] = None,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Export the stored points of a series.
+        
+        Args:
+            name: Ticker name of the series
+            metric_name: Name of the metric (default: finance_close)
+            start: Only export points from this unix timestamp in milliseconds
+            end: Only export points up to this unix timestamp in milliseconds
+            labels: Other labels of the series ("" for a missing label)
+            
+        Returns:
+            Tuple of (timestamps in milliseconds, values) sorted by timestamp
+        """
+        series = self._export([_selector(metric_name, name, labels)], start=start, end=end)
+        if not series:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        return next(iter(series.values()))
+
+    def export_series(
+        self, name: str, metric_name: str = "finance_close",
+        start: Optional[int] = None, end: Optional[int] = None,
+    ) -> pd.Series:
+        """Read back a stored series.
+        
+        Args:
+            name: Ticker name of the series
+            metric_name: Name of the metric (default: finance_close)
+            start: Only export points from this unix timestamp in milliseconds
+            end: Only export points up to this unix timestamp in milliseconds
+            
+        Returns:
+            Series of float64 values with a DatetimeIndex (empty if missing)
+        """
+        timestamps, values = self.export_points(name, metric_name, start=start, end=end)
+        return pd.Series(values, index=pd.to_datetime(timestamps, unit="ms"), name=name)
+
+    def export_frame(
+        self, names: Sequence[str], metric_name: str = "finance_close",
+        start: Optional[int] = None, end: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """Read back several series, aligned on their dates.
+        
+        Args:
+            names: Ticker names of the series
+            metric_name: Name of the metric (default: finance_close)
+            start: Only export points from this unix timestamp in milliseconds
+            end: Only export points up to this unix timestamp in milliseconds
+            
+        Returns:
+            DataFrame with one float64 column per ticker found, indexed by
+            the union of their dates (NaN where a ticker has no point)
+        """
+        series = self._export(
+            [_selector(metric_name, name) for name in names], start=start, end=end
+        )
+        columns = {}
+        for labels, (timestamps, values) in series.items():
+            ticker = dict(labels).get("ticker")
+            columns[ticker] = pd.Series(values, index=pd.to_datetime(timestamps, unit="ms"))
+        ordered = [name for name in names if name in columns]
+        return pd.DataFrame({name: columns[name] for name in ordered})
+
+    def query_range(
+        self, query: str, start: int, end: int, step: str = "1d"
+    ) -> pd.DataFrame:
+        """Evaluate a MetricsQL query over a time range.
+        
+        Args:
+            query: MetricsQL expression, e.g. finance_close{ticker="usa"}
+            start: Start as unix timestamp in milliseconds
+            end: End as unix timestamp in milliseconds
+            step: Resolution of the result
+            
+        Returns:
+            DataFrame indexed by the step timestamps with one column per
+            returned series, named by its ticker label (or its labels)
+        """
+        url = f"{self.base_url}/api/v1/query_range"
+        params = {"query": query, "start": str(start / 1000), "end": str(end / 1000),
+                  "step": step}
+        result = self._get(url, stage="query_range", params=params).json()["data"]["result"]
+        columns = {}
+        for row in result:
+            metric = row["metric"]
+            points = np.array(row["values"], dtype=np.float64).reshape(-1, 2)
+            index = pd.to_datetime((points[:, 0] * 1000).astype(np.int64), unit="ms")
+            column = metric.get("ticker") or str(metric)
+            columns[column] = pd.Series(points[:, 1], index=index)
+        return pd.DataFrame(columns)
+
+    def _export(
+        self, selectors: Sequence[str], start: Optional[int] = None, end: Optional[int] = None
+    ) -> Dict[Tuple[Tuple[str, str], ...], Tuple[np.ndarray, np.ndarray]]:
+        """Export every series matching the selectors, see parse_export.
+        
+        The selectors are sent in the body, at most ``max_selectors`` per
+        request.
+        """
+        url = f"{self.base_url}/api/v1/export"
+        time_range: List[Tuple[str, str]] = []
+        if start is not None:
+            time_range.append(("start", str(start / 1000)))
+        if end is not None:
+            time_range.append(("end", str(end / 1000)))
+        series = {}
+        for first in range(0, len(selectors), self.max_selectors):
+            batch = selectors[first:first + self.max_selectors]
+            form = [("match[]", selector) for selector in batch] + time_range
+            series.update(parse_export(self._post(url, stage="export", form=form).text))
+        return series
 
     def health_check(self) -> bool:
         """Check if VictoriaMetrics is reachable."""
         try:
-            response = requests.get(f"{self.base_url}/health")
+            response = self.session.get(f"{self.base_url}/health", timeout=self.timeout)
             return response.status_code == 200
-        except requests.exceptions.ConnectionError:
+        except requests.exceptions.RequestException:
             return False
+
+
+def format_selector(metric_name: str, labels: Dict[str, str]) -> str:
+    """Selector matching labels, e.g. finance_close{ticker="usa"}.
+    
+    A label with the empty value only matches series without that label.
+    """
+    matchers = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    return f"{metric_name}{{{matchers}}}"
+
+
+def _selector(metric_name: str, name: str, labels: Optional[Dict[str, str]] = None) -> str:
+    """Selector of the series of a ticker, e.g. finance_close{ticker="usa"}."""
+    return format_selector(metric_name, {"ticker": name, **(labels or {})})
+
+
+def _gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a stream of byte chunks on the fly."""
+    compressor = zlib.compressobj(1, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
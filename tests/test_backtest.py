@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfinance.backtest import backtest, backtest_thresholds
+from pyfinance.panel import PricePanel
+from pyfinance.rebalance import Asset, RebalanceAssets
+from pyfinance.simulation import PortfolioSimulator
+
+WEIGHTS = {'a': 0.5, 'b': 0.3, 'c': 0.2}
+
+
+def make_panel(days=300, seed=0):
+    dates = pd.bdate_range('2020-01-01', periods=days)
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.02, (days, 3))
+    return PricePanel(dates, ['a', 'b', 'c'], 100 * np.cumprod(1 + returns, axis=0))
+
+
+@pytest.fixture
+def inputs():
+    return pd.Series(1000.0, index=pd.date_range('2020-01-01', periods=12, freq='MS'))
+
+
+def test_no_rebalancing_is_buy_and_hold(inputs):
+    panel = make_panel()
+
+    result = backtest(panel, WEIGHTS, inputs, [100])
+
+    simulator = PortfolioSimulator()
+    expected = sum(
+        simulator.simulate_asset(name, panel.history(name), inputs * weight)['Close']
+        for name, weight in WEIGHTS.items()
+    )
+    assert np.allclose(result.values[100].to_numpy(), expected.to_numpy())
+    assert result.summary.loc[0, 'rebalances'] == 0
+    assert result.events.empty
+
+
+def test_matches_rebalance_assets_rule(inputs):
+    panel = make_panel()
+    goals = np.array([50, 30, 20])
+    invested = np.zeros(len(panel))
+    invested[0] = 10000.0
+
+    values, days, _, traded = backtest_thresholds(panel.values, goals, invested, np.array([3.0]))
+
+    # Replay with Asset objects, one RebalanceAssets per day
+    shares = 10000.0 * goals / 100 / panel.values[0]
+    expected_days = []
+    for day, price in enumerate(panel.values):
+        assets = [Asset(name, int(goal), float(value))
+                  for name, goal, value in zip('abc', goals, shares * price)]
+        rebalance = RebalanceAssets(assets, 3)
+        if rebalance.has_to_be_rebalanced:
+            expected_days.append(day)
+            shares = np.array([asset.rebalanced_value for asset in assets]) / price
+        assert values[day, 0] == pytest.approx((shares * price).sum())
+    assert days.tolist() == expected_days
+    assert len(expected_days) > 0
+    assert (traded > 0).all()
+
+
+def test_summary_and_events(inputs):
+    result = backtest(make_panel(), WEIGHTS, inputs, [1, 5, 100])
+
+    summary = result.summary.set_index('threshold')
+    assert summary.loc[1, 'rebalances'] > summary.loc[5, 'rebalances'] > 0
+    assert summary.loc[1, 'turnover'] > summary.loc[5, 'turnover']
+    assert (result.events.groupby('threshold').size() == summary['rebalances'][summary['rebalances'] > 0]).all()
+    assert list(result.values.columns) == [1, 5, 100]
+    # Nothing invested before the first input
+    assert summary['final_value'].gt(12000 * 0.5).all()
+
+
+def test_missing_common_dates():
+    panel = PricePanel(pd.bdate_range('2020-01-01', periods=2), ['a', 'b', 'c'],
+                       [[1.0, np.nan, 1.0], [np.nan, 1.0, 1.0]])
+
+    with pytest.raises(ValueError, match="No common dates"):
+        backtest(panel, WEIGHTS, pd.Series([1.0], index=pd.to_datetime(['2020-01-01'])), [5])
+
+
+def test_thirty_years_of_dozens_of_thresholds():
+    panel = make_panel(days=30 * 261)
+    inputs = pd.Series(100.0, index=pd.date_range('2020-01-01', periods=360, freq='MS'))
+
+    result = backtest(panel, WEIGHTS, inputs, np.arange(0.5, 24.5, 0.5))
+
+    assert len(result.summary) == 48
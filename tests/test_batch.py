@@ -0,0 +1,92 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfinance.batch import BatchStats, read_chunks, rebalance_batch
+from pyfinance.rebalance import Asset, RebalanceAssets
+
+PORTFOLIO = [("US", 30), ("EU", 30), ("Emerging", 30), ("Japan", 10)]
+
+
+@pytest.fixture
+def accounts_csv(tmp_path):
+    rng = np.random.default_rng(0)
+    lines = []
+    for account in range(50):
+        for name, percentage in PORTFOLIO:
+            lines.append(f"acc{account},{name},{percentage},{rng.uniform(500, 2000):.2f}")
+    path = tmp_path / "accounts.csv"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_read_chunks_keeps_accounts_whole(accounts_csv):
+    chunks = list(read_chunks(accounts_csv, chunk_size=7))
+
+    assert sum(len(chunk) for chunk in chunks) == 200
+    for chunk in chunks:
+        assert (chunk.groupby("account").size() == 4).all()
+    seen = [account for chunk in chunks for account in chunk["account"].unique()]
+    assert len(seen) == len(set(seen)) == 50
+
+
+@pytest.mark.parametrize("chunk_size", [3, 100_000])
+def test_batch_matches_rebalance_assets(accounts_csv, chunk_size):
+    output = io.StringIO()
+
+    stats = rebalance_batch(accounts_csv, 5, output, fmt="jsonl", chunk_size=chunk_size)
+
+    plans = {plan["account"]: plan for plan in map(json.loads, output.getvalue().splitlines())}
+    rows = pd.read_csv(accounts_csv, header=None, names=["account", "name", "percentage", "value"])
+    rebalanced = 0
+    for account, group in rows.groupby("account"):
+        assets = [Asset(r.name, r.percentage, r.value) for r in group.itertuples()]
+        expected = RebalanceAssets(assets, 5)
+        assert (account in plans) == expected.has_to_be_rebalanced
+        if not expected.has_to_be_rebalanced:
+            continue
+        rebalanced += 1
+        assert plans[account]["targets"] == {a.name: a.rebalanced_value for a in assets}
+        moved = {(t["from"], t["to"]): t["value"] for t in plans[account]["transfers"]}
+        sent = {(a.name, b.name): v for a in assets for b, v in a.sending_to.items()}
+        assert moved == pytest.approx(sent)
+    assert stats.accounts == 50
+    assert stats.rebalanced == rebalanced > 0
+
+
+def test_batch_csv_output_and_skipped_accounts(tmp_path, capsys):
+    path = tmp_path / "accounts.csv"
+    path.write_text("a,US,50,1000\na,EU,50,1500\nb,US,60,1000\nb,EU,50,1000\nc,US,50,1000\nc,EU,50,1010\n")
+    output = io.StringIO()
+
+    stats = rebalance_batch(str(path), 5, output)
+
+    assert output.getvalue() == "account,from,to,value\na,EU,US,250.00\n"
+    assert "Skipping account b" in capsys.readouterr().err
+    assert str(stats) == str(BatchStats(rows=6, accounts=3, rebalanced=1, transfers=1, skipped=1))
+
+
+def test_batch_skips_accounts_with_an_asset_twice(tmp_path, capsys):
+    path = tmp_path / "accounts.csv"
+    path.write_text("a,US,50,1000\na,US,50,1500\nc,US,50,1000\nc,EU,50,1500\n")
+    output = io.StringIO()
+
+    stats = rebalance_batch(str(path), 5, output)
+
+    assert output.getvalue() == "account,from,to,value\nc,EU,US,250.00\n"
+    assert "Skipping account a, the asset US appears more than once" in capsys.readouterr().err
+    assert stats.skipped == 1
+    with pytest.raises(ValueError, match="not unique"):
+        RebalanceAssets([Asset("US", 50, 1000), Asset("US", 50, 1500)], 5)
+
+
+@pytest.mark.parametrize("chunk_size", [2, 3, 100_000])
+def test_batch_rejects_accounts_split_by_others(tmp_path, chunk_size):
+    path = tmp_path / "accounts.csv"
+    path.write_text("a,US,50,1000\nb,US,50,1000\na,EU,50,1500\nb,EU,50,1500\n")
+
+    with pytest.raises(ValueError, match="Account a appears again"):
+        rebalance_batch(str(path), 5, io.StringIO(), chunk_size=chunk_size)
@@ -0,0 +1,175 @@
+import threading
+
+import pytest
+import pandas as pd
+from unittest.mock import Mock, patch
+from pyfinance.cache import HistoryCache, HistoryRegistry, download_history
+
+
+def make_history(start, periods, close=None):
+    dates = pd.date_range(start, periods=periods, freq='D')
+    if close is None:
+        close = [100.0 + i for i in range(periods)]
+    return pd.DataFrame({
+        'Open': close,
+        'Close': close,
+        'Volume': [1000] * periods,
+    }, index=dates)
+
+
+@pytest.fixture
+def fetch():
+    return Mock()
+
+
+@pytest.fixture
+def cache(tmp_path, fetch):
+    return HistoryCache(str(tmp_path), max_age=3600, fetch=fetch)
+
+
+def test_first_access_downloads_and_stores(cache, fetch):
+    fetch.return_value = make_history('2024-01-01', 5)
+
+    result = cache.history("TEST.F")
+
+    fetch.assert_called_once_with("TEST.F")
+    assert len(result) == 5
+    assert cache.last_date("TEST.F") == pd.Timestamp('2024-01-05')
+
+
+def test_round_trip_keeps_values_and_dtypes(cache, fetch):
+    history = make_history('2024-01-01', 5)
+    fetch.return_value = history
+
+    cache.history("TEST.F")
+    loaded = cache.load("TEST.F")
+
+    pd.testing.assert_frame_equal(loaded, history, check_freq=False)
+
+
+def test_fresh_entry_is_served_from_disk(cache, fetch):
+    fetch.return_value = make_history('2024-01-01', 5)
+    cache.history("TEST.F")
+
+    result = cache.history("TEST.F")
+
+    assert fetch.call_count == 1
+    assert len(result) == 5
+
+
+def test_stale_entry_downloads_only_the_tail(cache, fetch):
+    fetch.return_value = make_history('2024-01-01', 5)
+    cache.history("TEST.F")
+    cache.max_age = 0
+    # Tail starts at the last cached day with the same close
+    fetch.return_value = make_history('2024-01-05', 3, close=[104.0, 105.0, 106.0])
+
+    result = cache.history("TEST.F")
+
+    fetch.assert_called_with("TEST.F", start=pd.Timestamp('2024-01-05'))
+    assert len(result) == 7
+    assert result['Close'].iloc[-1] == 106.0
+    assert cache.last_date("TEST.F") == pd.Timestamp('2024-01-07')
+
+
+def test_rewritten_past_downloads_full_history(cache, fetch):
+    fetch.return_value = make_history('2024-01-01', 5)
+    cache.history("TEST.F")
+    cache.max_age = 0
+    adjusted = make_history('2024-01-01', 7, close=[50.0 + i for i in range(7)])
+    fetch.side_effect = [adjusted.loc['2024-01-05':], adjusted]
+
+    result = cache.history("TEST.F")
+
+    assert fetch.call_count == 3
+    fetch.assert_called_with("TEST.F")
+    assert result['Close'].iloc[0] == 50.0
+    assert len(result) == 7
+
+
+def test_offline_serves_stale_cache(cache, fetch):
+    fetch.return_value = make_history('2024-01-01', 5)
+    cache.history("TEST.F")
+    cache.max_age = 0
+    cache.offline = True
+
+    result = cache.history("TEST.F")
+
+    assert fetch.call_count == 1
+    assert len(result) == 5
+
+
+def test_offline_without_cache_returns_empty(cache, fetch):
+    cache.offline = True
+
+    result = cache.history("TEST.F")
+
+    fetch.assert_not_called()
+    assert result.empty
+
+
+def test_path_is_sanitized(cache):
+    assert cache.path("A/B:C.F").endswith("A_B_C.F.npz")
+
+
+@patch('pyfinance.cache.yf.Ticker')
+def test_download_history_from_start(mock_ticker_class):
+    mock_ticker = Mock()
+    dates = pd.date_range('2024-01-01', periods=2, freq='D', tz='Europe/Madrid')
+    mock_ticker.history.return_value = pd.DataFrame({'Close': [1.0, 2.0]}, index=dates)
+    mock_ticker_class.return_value = mock_ticker
+
+    result = download_history("TEST.F", start=pd.Timestamp('2024-01-01'))
+
+    mock_ticker.history.assert_called_once_with(start="2024-01-01")
+    assert result.index.tz is None
+
+
+def test_registry_fetches_each_ticker_once():
+    loader = Mock(side_effect=lambda t: make_history('2024-01-01', 3))
+    registry = HistoryRegistry(loader)
+
+    first = registry.get("A")
+    second = registry.get("A")
+    registry.get("B")
+
+    assert first is second
+    assert loader.call_count == 2
+    assert registry.fetches == 2
+    assert registry.hits == 1
+    assert registry.stats() == "History fetches: 2, fetches avoided: 1"
+
+
+def test_registry_concurrent_requests_share_one_fetch():
+    release = threading.Event()
+
+    def slow_loader(ticker):
+        release.wait(5)
+        return make_history('2024-01-01', 3)
+
+    loader = Mock(side_effect=slow_loader)
+    registry = HistoryRegistry(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("A")))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert loader.call_count == 1
+    assert registry.fetches == 1
+    assert registry.hits == 3
+    assert all(r is results[0] for r in results)
+
+
+def test_registry_failed_fetch_is_not_retried():
+    loader = Mock(side_effect=ValueError("down"))
+    registry = HistoryRegistry(loader)
+
+    with pytest.raises(ValueError):
+        registry.get("A")
+    with pytest.raises(ValueError):
+        registry.get("A")
+    assert loader.call_count == 1
@@ -0,0 +1,151 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from pyfinance.checkpoint import (CheckpointStore, SimulationCheckpoint, is_valid,
+                                  make_checkpoint)
+from pyfinance.simulation import PortfolioSimulator
+
+NAMES = ["naranja90", "arwen", "usa", "euro", "emerging", "japan"]
+
+
+def make_histories(days):
+    dates = pd.bdate_range('2024-01-01', periods=days)
+    rng = np.random.default_rng(0)
+    return {name: pd.DataFrame({'Close': 100 * np.cumprod(1 + rng.normal(0, 0.01, 200))[:days]},
+                               index=dates)
+            for name in NAMES}
+
+
+def write_inputs(path, rows):
+    path.write_text("Date,Quantity\n" + "".join(f"{d},{q}\n" for d, q in rows))
+    return str(path)
+
+
+def last_stored(series):
+    """Last timestamp of each uploaded series, what VictoriaMetrics answers."""
+    return {name: max(timestamp for timestamp, _ in points) for name, points in series.items()}
+
+
+def run(simulator, inputs_file, histories, stored=None):
+    stored = stored or {}
+    with patch.object(simulator.uploader, 'get_history') as get_history, \
+            patch.object(simulator.vm_client, 'last_timestamp',
+                         side_effect=lambda name, metric, labels=None: stored.get(name)), \
+            patch('pyfinance.victoria.requests.Session.post') as mock_post, \
+            patch('pyfinance.victoria.requests.Session.get'):
+        get_history.side_effect = lambda t: histories[
+            {"0P0001E1ZI.F": "naranja90", "0P0000ISQY.F": "arwen", "IE0032126645.IR": "usa",
+             "IE0007987690.IR": "euro", "0P0001CJGK.F": "emerging",
+             "IE0007286036.IR": "japan"}[t]]
+        simulator.run(inputs_file)
+    deletes = [c for c in mock_post.call_args_list if c[0][0].endswith("delete_series")]
+    imports = [c for c in mock_post.call_args_list if c[0][0].endswith("/api/v1/import")]
+    series = {}
+    for call in imports:
+        for line in gzip.decompress(call.kwargs['data']).decode().splitlines():
+            row = json.loads(line)
+            series.setdefault(row["metric"]["ticker"], []).extend(
+                zip(row["timestamps"], row["values"]))
+    return deletes, series
+
+
+def test_store_round_trip(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    checkpoint = SimulationCheckpoint("2024-01-05T00:00:00", 1.5, 100.0, "a", "b")
+
+    store.save("usa", checkpoint)
+
+    assert store.load("usa") == checkpoint
+    assert store.load("euro") is None
+
+
+def test_store_ignores_corrupt_file(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    (tmp_path / "usa.json").write_text("{not json")
+
+    assert store.load("usa") is None
+
+
+def test_checkpoint_detects_changes_before_it():
+    close = pd.Series([1.0, 2.0, 3.0], index=pd.bdate_range('2024-01-01', periods=3))
+    inputs = pd.Series([10.0, 5.0], index=pd.to_datetime(['2024-01-01', '2024-01-10']))
+    checkpoint = make_checkpoint(close.iloc[:2], inputs, shares=10.0)
+
+    assert checkpoint.inputs_total == 10.0
+    # New days and inputs after the checkpoint are fine
+    assert is_valid(checkpoint, close, inputs)
+    changed_price = close.copy()
+    changed_price.iloc[0] = 1.5
+    assert not is_valid(checkpoint, changed_price, inputs)
+    changed_inputs = pd.concat([inputs, pd.Series([1.0], index=pd.to_datetime(['2024-01-02']))])
+    assert not is_valid(checkpoint, close, changed_inputs)
+
+
+def test_second_run_appends_only_new_days(tmp_path):
+    rows = [("2024-01-01", 1000), ("2024-02-01", 500)]
+    inputs_file = write_inputs(tmp_path / "inputs.csv", rows)
+    checkpoints = CheckpointStore(str(tmp_path / "checkpoints"))
+
+    deletes, first = run(PortfolioSimulator(checkpoints=checkpoints), inputs_file,
+                         make_histories(40))
+    assert len(deletes) == 1
+
+    rows.append(("2024-03-01", 250))
+    inputs_file = write_inputs(tmp_path / "inputs.csv", rows)
+    deletes, second = run(PortfolioSimulator(checkpoints=checkpoints), inputs_file,
+                          make_histories(60), stored=last_stored(first))
+
+    assert deletes == []
+    assert set(second) == set(first)
+    assert all(len(points) == 20 for points in second.values())
+    # Same values as simulating everything again
+    _, full = run(PortfolioSimulator(), inputs_file, make_histories(60))
+    for name, points in second.items():
+        expected = dict(full[name])
+        for timestamp, value in points:
+            assert value == pytest.approx(expected[timestamp])
+
+
+def test_changed_past_input_recomputes(tmp_path):
+    inputs_file = write_inputs(tmp_path / "inputs.csv", [("2024-01-01", 1000)])
+    checkpoints = CheckpointStore(str(tmp_path / "checkpoints"))
+    _, first = run(PortfolioSimulator(checkpoints=checkpoints), inputs_file, make_histories(40))
+
+    inputs_file = write_inputs(tmp_path / "inputs.csv", [("2024-01-01", 2000)])
+    deletes, series = run(PortfolioSimulator(checkpoints=checkpoints), inputs_file,
+                          make_histories(40), stored=last_stored(first))
+
+    assert len(deletes) == 1
+    assert len(series["usa"]) == 40
+
+
+def test_store_not_ending_at_the_checkpoint_recomputes(tmp_path):
+    inputs_file = write_inputs(tmp_path / "inputs.csv", [("2024-01-01", 1000)])
+    checkpoints = CheckpointStore(str(tmp_path / "checkpoints"))
+    _, first = run(PortfolioSimulator(checkpoints=checkpoints), inputs_file, make_histories(40))
+    stored = last_stored(first)
+    del stored["usa"]  # Deleted since the checkpoint
+    stored["euro"] -= 86_400_000  # Replaced by a shorter series
+
+    deletes, series = run(PortfolioSimulator(checkpoints=checkpoints), inputs_file,
+                          make_histories(60), stored=stored)
+
+    assert len(deletes) == 1
+    assert len(series["usa"]) == len(series["euro"]) == 60
+    assert len(series["japan"]) == 20
+
+
+def test_scenario_checkpoints_are_separate(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    checkpoint = SimulationCheckpoint("2024-01-05T00:00:00", 1.5, 100.0, "a", "b")
+
+    store.scenario("lump").save("usa", checkpoint)
+
+    assert store.load("usa") is None
+    assert store.scenario("lump").load("usa") == checkpoint
+    assert (tmp_path / "lump" / "usa.json").exists()
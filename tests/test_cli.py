@@ -0,0 +1,70 @@
+import json
+import re
+import subprocess
+import sys
+
+import pytest
+from click.testing import CliRunner
+
+from pyfinance.cli import cli
+
+HEAVY_MODULES = ("numpy", "pandas", "requests", "yfinance")
+
+# Cumulative import time of pyfinance.cli, in microseconds. It is about
+# 50 ms without the heavy modules and more than 900 ms with them.
+IMPORT_BUDGET_US = 300_000
+
+# Runs a command in a fresh interpreter and prints the heavy modules it imported
+RUN_COMMAND = """
+import json, sys
+from pyfinance.cli import cli
+try:
+    cli(sys.argv[1:], standalone_mode=False)
+finally:
+    heavy = sorted({name.split(".")[0] for name in sys.modules} & set(%r))
+    print(json.dumps(heavy), file=sys.stderr)
+""" % (HEAVY_MODULES,)
+
+
+def imported_heavy_modules(*args) -> list:
+    result = subprocess.run([sys.executable, "-c", RUN_COMMAND, *args],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def test_list_tickers_imports_no_heavy_module():
+    assert imported_heavy_modules("list-tickers") == []
+
+
+def test_rebalance_imports_no_heavy_module(tmp_path):
+    csv_file = tmp_path / "assets.csv"
+    csv_file.write_text("US,60,700\nEU,40,300\n")
+
+    assert imported_heavy_modules("rebalance", "5", str(csv_file)) == []
+
+
+def test_cli_import_time_budget():
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import pyfinance.cli"],
+                            capture_output=True, text=True, check=True)
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)", line)
+        if match:
+            cumulative[match.group(2)] = int(match.group(1))
+    assert cumulative["pyfinance.cli"] < IMPORT_BUDGET_US
+    assert not set(HEAVY_MODULES) & set(cumulative)
+
+
+@pytest.mark.parametrize("command", sorted(cli.commands))
+def test_every_command_has_help(command):
+    result = CliRunner().invoke(cli, [command, "--help"])
+
+    assert result.exit_code == 0, result.output
+
+
+def test_loadtest_rejects_fewer_tickers_than_configured():
+    result = CliRunner().invoke(cli, ["loadtest", "--tickers", "2"])
+
+    assert result.exit_code == 2
+    assert "--tickers" in result.output
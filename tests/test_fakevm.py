@@ -0,0 +1,76 @@
+import pytest
+import requests
+
+from pyfinance.fakevm import FakeVictoriaMetrics, parse_selector
+from pyfinance.victoria import MetricSeries, VictoriaMetricsClient
+
+
+@pytest.fixture
+def vm():
+    with FakeVictoriaMetrics() as server:
+        yield server
+
+
+def test_parse_selector_keeps_empty_labels():
+    assert parse_selector('finance_close{ticker="usa",scenario=""}') == (
+        "finance_close", {"ticker": "usa", "scenario": ""})
+    assert parse_selector("finance_close") == ("finance_close", {})
+    with pytest.raises(ValueError):
+        parse_selector('rate(finance_close[1d])')
+
+
+def test_client_round_trip(vm):
+    client = VictoriaMetricsClient(vm.url)
+    client.import_series([
+        MetricSeries("finance_close", {"ticker": "usa"}, [1000, 2000, 3000], [1.0, 2.0, 3.0]),
+        MetricSeries("finance_close", {"ticker": "usa", "scenario": "crash"}, [1000], [0.5]),
+    ])
+    client.upload_csv(b"1000,10\n2000,11\n", "euro")
+
+    assert client.health_check()
+    assert client.last_timestamp("usa") == 3000
+    assert client.last_timestamp("japan") is None
+    timestamps, values = client.export_points("usa", start=2000, labels={"scenario": ""})
+    assert timestamps.tolist() == [2000, 3000]
+    assert values.tolist() == [2.0, 3.0]
+    assert client.export_points("euro")[1].tolist() == [10.0, 11.0]
+
+    client.delete_series("usa")
+    client.reset_cache()
+
+    assert client.last_timestamp("usa") is None
+    assert vm.points == 2
+    assert vm.stats.requests["/api/v1/import"] == 1
+    assert vm.stats.bytes_received > 0
+
+
+def test_injected_errors_are_retried():
+    with FakeVictoriaMetrics(error_rate=0.5, seed=3) as vm:
+        client = VictoriaMetricsClient(vm.url, retries=10, backoff=0)
+        for i in range(10):
+            client.import_series([MetricSeries("finance_close", {"ticker": f"t{i}"}, [1000], [1.0])])
+
+    assert vm.stats.errors > 0
+    assert vm.stats.total_requests == 10 + vm.stats.errors
+    assert vm.points == 10
+
+
+def test_unknown_path_is_not_found(vm):
+    client = VictoriaMetricsClient(vm.url, retries=0)
+    with pytest.raises(requests.HTTPError):
+        client.query_range("finance_close", 0, 1000)
+
+
+def test_streamed_upload_is_not_lost_on_a_retried_error():
+    # Seed 1: the first request is answered with 503, the next one is not
+    with FakeVictoriaMetrics(error_rate=0.5, seed=1) as vm:
+        client = VictoriaMetricsClient(vm.url, retries=3, backoff=0)
+        try:
+            client.upload_csv(iter([b"1000,10\n", b"2000,11\n"]), "euro")
+        except requests.HTTPError:
+            assert vm.points == 0
+        else:
+            assert vm.points == 2
+
+    assert vm.stats.errors == 1
+    assert vm.stats.total_requests == 1
@@ -1,8 +1,11 @@
+import gzip
+import json
+
 import pytest
 import pandas as pd
 import numpy as np
 from unittest.mock import Mock, patch, MagicMock
-from pyfinance.graphics import TickerUploader
+from pyfinance.graphics import TickerUploader, frame_to_series
 
 
 @pytest.fixture
@@ -34,22 +37,18 @@ def test_uploader_custom_url():
 
 
 def test_format_csv(uploader, sample_history):
-    csv = uploader.format_csv(sample_history)
+    csv = uploader.format_csv(sample_history).decode()
     lines = csv.strip().split('\n')
     
-    # Check header
-    assert lines[0] == "Date,Close"
-    
-    # Check we have 5 data rows
-    assert len(lines) == 6  # header + 5 rows
+    # No header, 5 data rows
+    assert len(lines) == 5
     
-    # Check first data row format
-    assert "2024-01-01T00:00:00Z" in lines[1]
-    assert "100.5" in lines[1] or lines[1].endswith(",100.5")
+    # Check first data row format: unix milliseconds, close
+    assert lines[0] == "1704067200000,100.5"
 
 
 def test_format_csv_only_includes_date_and_close(uploader, sample_history):
-    csv = uploader.format_csv(sample_history)
+    csv = uploader.format_csv(sample_history).decode()
     
     # Should not contain other columns
     assert "Open" not in csv
@@ -58,7 +57,7 @@ def test_format_csv_only_includes_date_and_close(uploader, sample_history):
     assert "Volume" not in csv
 
 
-@patch('pyfinance.graphics.yf.Ticker')
+@patch('pyfinance.cache.yf.Ticker')
 def test_download_history(mock_ticker_class, uploader, sample_history):
     mock_ticker = Mock()
     mock_ticker.history.return_value = sample_history
@@ -141,7 +140,7 @@ def test_calculate_mymix_no_common_dates(uploader):
 
 
 @patch.object(TickerUploader, 'download_history')
-@patch('pyfinance.victoria.requests.post')
+@patch('pyfinance.victoria.requests.Session.post')
 def test_upload_ticker(mock_post, mock_download, uploader, sample_history):
     mock_download.return_value = sample_history
     mock_response = Mock()
@@ -161,3 +160,123 @@ def test_upload_ticker_empty_data(mock_download, uploader):
     
     with pytest.raises(ValueError, match="No data found"):
         uploader.upload_ticker("test", "TEST.F")
+
+
+@patch.object(TickerUploader, 'download_history')
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_upload_all_downloads_each_ticker_once(mock_post, mock_get, mock_download,
+                                              uploader, sample_history):
+    from pyfinance.config import TICKERS
+    mock_download.return_value = sample_history
+
+    uploader.upload_all()
+
+    downloaded = [c.args[0] for c in mock_download.call_args_list]
+    assert sorted(downloaded) == sorted(t.yahoo_ticker for t in TICKERS)
+    assert uploader.registry.hits == 4
+
+
+@patch.object(TickerUploader, 'download_history')
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_upload_all_failure_does_not_block_other_tickers(mock_post, mock_get, mock_download,
+                                                        uploader, sample_history):
+    def download(yahoo_ticker):
+        if yahoo_ticker == "0P0000ISQY.F":
+            raise ConnectionError("Yahoo is down")
+        return sample_history
+    mock_download.side_effect = download
+
+    with pytest.raises(RuntimeError, match="arwen"):
+        uploader.upload_all(jobs=3)
+
+    # One batched delete and one batched import, cache reset anyway
+    assert mock_post.call_count == 2
+    body = gzip.decompress(mock_post.call_args[1]["data"]).decode()
+    tickers = {json.loads(line)["metric"]["ticker"] for line in body.splitlines()}
+    assert tickers == {"naranja90", "usa", "euro", "emerging", "japan", "mymix"}
+    mock_get.assert_called_once()
+
+
+def _stored(history):
+    timestamps = history.index.values.astype('datetime64[ms]').astype(np.int64)
+    return list(timestamps), list(history['Close'])
+
+
+def test_sync_series_full_replacement_by_default(uploader, sample_history):
+    uploader.vm_client = Mock()
+
+    uploader.sync_series("test", sample_history)
+
+    uploader.vm_client.delete_matching.assert_called_once_with(['finance_close{ticker="test"}'])
+    [series] = uploader.vm_client.import_series.call_args[0][0]
+    assert len(series.timestamps) == 5
+
+
+def test_sync_series_incremental_appends_new_points(uploader, sample_history):
+    uploader.incremental = True
+    uploader.vm_client = Mock()
+    stored = sample_history.iloc[:3]
+    timestamps, values = _stored(stored)
+    uploader.vm_client.last_timestamp.return_value = timestamps[-1]
+    uploader.vm_client.export_points.return_value = (timestamps, values)
+
+    uploader.sync_series("test", sample_history)
+
+    uploader.vm_client.delete_matching.assert_called_once_with([])
+    [series] = uploader.vm_client.import_series.call_args[0][0]
+    assert list(series.timestamps) == [1704326400000, 1704412800000]
+    assert list(series.values) == [103.5, 104.5]
+
+
+def test_sync_series_incremental_up_to_date(uploader, sample_history):
+    uploader.incremental = True
+    uploader.vm_client = Mock()
+    timestamps, values = _stored(sample_history)
+    uploader.vm_client.last_timestamp.return_value = timestamps[-1]
+    uploader.vm_client.export_points.return_value = (timestamps, values)
+
+    uploader.sync_series("test", sample_history)
+
+    uploader.vm_client.delete_matching.assert_called_once_with([])
+    uploader.vm_client.import_series.assert_called_once_with([])
+
+
+def test_sync_series_incremental_replaces_changed_history(uploader, sample_history):
+    uploader.incremental = True
+    uploader.vm_client = Mock()
+    timestamps, values = _stored(sample_history.iloc[:3])
+    # Stored values before a dividend adjustment
+    values = [v * 1.02 for v in values]
+    uploader.vm_client.last_timestamp.return_value = timestamps[-1]
+    uploader.vm_client.export_points.return_value = (timestamps, values)
+
+    uploader.sync_series("test", sample_history)
+
+    uploader.vm_client.delete_matching.assert_called_once_with(['finance_close{ticker="test"}'])
+    [series] = uploader.vm_client.import_series.call_args[0][0]
+    assert len(series.timestamps) == 5
+
+
+def test_sync_series_incremental_new_series(uploader, sample_history):
+    uploader.incremental = True
+    uploader.vm_client = Mock()
+    uploader.vm_client.last_timestamp.return_value = None
+
+    uploader.sync_series("test", sample_history)
+
+    uploader.vm_client.export_points.assert_not_called()
+    [series] = uploader.vm_client.import_series.call_args[0][0]
+    assert len(series.timestamps) == 5
+
+
+def test_frame_to_series_skips_missing_values():
+    dates = pd.date_range('2024-01-01', periods=3, freq='D')
+    df = pd.DataFrame({'Close': [1.0, np.nan, 3.0]}, index=dates)
+
+    series = frame_to_series(df, "finance_close", {"ticker": "test"})
+
+    assert list(series.timestamps) == [1704067200000, 1704240000000]
+    assert list(series.values) == [1.0, 3.0]
+    assert series.selector() == 'finance_close{ticker="test"}'
@@ -0,0 +1,48 @@
+import pytest
+
+from pyfinance.config import TICKERS
+from pyfinance.loadtest import SyntheticPrices, format_results, run_load, synthetic_tickers
+from pyfinance.synthetic import synthetic_close
+
+
+def test_synthetic_prices_are_reproducible():
+    prices = SyntheticPrices(years=1)
+    history = prices("LOAD0000")
+
+    assert history.equals(prices("LOAD0000"))
+    assert not history.equals(prices("LOAD0001"))
+    assert SyntheticPrices(years=1, drop_days=1)("LOAD0000").equals(history.iloc[:-1])
+    assert history["Close"].tolist() == synthetic_close("LOAD0000", len(history)).tolist()
+
+
+def test_synthetic_tickers_include_the_configured_ones():
+    assert synthetic_tickers(len(TICKERS)) == TICKERS
+    assert len(synthetic_tickers(20)) == 20
+    with pytest.raises(ValueError):
+        synthetic_tickers(len(TICKERS) - 1)
+
+
+def test_run_load_uploads_every_ticker_and_mymix():
+    result = run_load(10, years=1)
+    days = len(SyntheticPrices(years=1).dates)
+
+    assert result.tickers == 10
+    assert result.points == 11 * days
+    assert result.requests >= 3  # delete, import, reset
+    assert result.bytes_sent > 0
+    assert "tickers" in format_results([result])
+
+
+def test_incremental_run_uploads_only_the_last_day():
+    result = run_load(10, years=1, incremental=True)
+
+    assert result.points == 11
+
+
+def test_run_load_scales_to_thousands_of_tickers():
+    # The series of every ticker are deleted first: too many selectors for a URL
+    result = run_load(2000, years=1)
+    days = len(SyntheticPrices(years=1).dates)
+
+    assert result.tickers == 2000
+    assert result.points == 2001 * days
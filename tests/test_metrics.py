@@ -0,0 +1,99 @@
+import gzip
+from unittest.mock import Mock, patch
+
+import pandas as pd
+import pytest
+import requests
+
+from pyfinance.graphics import TickerUploader
+from pyfinance.metrics import (BYTES_SENT, CALLS, DURATION, POINTS_WRITTEN, RETRIES,
+                               RunMetrics)
+from pyfinance.victoria import MetricSeries, VictoriaMetricsClient
+
+
+def test_stage_is_timed_also_when_it_raises():
+    metrics = RunMetrics()
+    with metrics.stage("download", "usa"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.stage("download", "usa"):
+            raise ValueError("Yahoo is down")
+
+    assert metrics.value(CALLS, "download", "usa") == 2
+    assert metrics.value(DURATION, "download", "usa") > 0
+    assert "download" in metrics.summary()
+
+
+def test_series_have_the_command_and_only_set_tickers():
+    metrics = RunMetrics()
+    metrics.add(BYTES_SENT, 100, "import")
+    metrics.add(BYTES_SENT, 20, "upload_csv", "usa")
+    metrics.add(BYTES_SENT, 5, "upload_csv", "usa")
+
+    series = metrics.series("upload-all", timestamp=1000)
+
+    assert [(s.metric, s.labels, s.values) for s in series] == [
+        (BYTES_SENT, {"command": "upload-all", "stage": "import"}, [100]),
+        (BYTES_SENT, {"command": "upload-all", "stage": "upload_csv", "ticker": "usa"}, [25]),
+    ]
+    assert metrics.totals(BYTES_SENT) == {"import": 100, "upload_csv": 25}
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_client_counts_bytes_points_and_retries(mock_post):
+    mock_post.return_value.raw.retries.history = ("first", "second")
+    metrics = RunMetrics()
+    client = VictoriaMetricsClient(metrics=metrics)
+
+    client.import_series([MetricSeries("finance_close", {"ticker": "usa"}, [1, 2, 3], [1.0, 2.0, 3.0]),
+                          MetricSeries("finance_close", {"ticker": "euro"}, [1], [1.0])])
+    client.delete_series("usa")
+
+    sent = mock_post.call_args_list[0][1]["data"]
+    assert gzip.decompress(sent)
+    assert metrics.value(BYTES_SENT, "import") == len(sent)
+    assert metrics.value(POINTS_WRITTEN, "import", "usa") == 3
+    assert metrics.value(POINTS_WRITTEN, "import", "euro") == 1
+    assert metrics.value(RETRIES, "import") == 2
+    assert metrics.value(CALLS, "delete_series", "usa") == 1
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_client_counts_only_the_points_of_successful_imports(mock_post):
+    ok = Mock()
+    ok.raw.retries = None
+    failed = Mock()
+    failed.raise_for_status.side_effect = requests.HTTPError("500")
+    mock_post.side_effect = [ok, failed]
+    metrics = RunMetrics()
+    client = VictoriaMetricsClient(metrics=metrics, chunk_size=2)
+
+    with pytest.raises(requests.HTTPError):
+        client.import_series([MetricSeries("finance_close", {"ticker": "usa"}, [1, 2, 3], [1.0, 2.0, 3.0]),
+                              MetricSeries("finance_close", {"ticker": "euro"}, [1], [1.0])])
+
+    assert metrics.value(POINTS_WRITTEN, "import", "usa") == 2
+    assert metrics.value(POINTS_WRITTEN, "import", "euro") == 0
+
+
+@patch.object(TickerUploader, 'download_history')
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_upload_all_records_the_stages_of_every_ticker(mock_post, mock_get, mock_download):
+    from pyfinance.config import TICKERS
+    dates = pd.date_range('2024-01-01', periods=5, freq='D')
+    mock_download.return_value = pd.DataFrame({'Close': [1.0, 2.0, 3.0, 4.0, 5.0]}, index=dates)
+    metrics = RunMetrics()
+    uploader = TickerUploader(metrics=metrics)
+
+    uploader.upload_all(jobs=2)
+
+    for ticker in TICKERS:
+        assert metrics.value(CALLS, "download", ticker.name) == 1
+        assert metrics.value(CALLS, "plan", ticker.name) == 1
+        assert metrics.value(POINTS_WRITTEN, "import", ticker.name) == 5
+    assert metrics.value(CALLS, "mymix") == 1
+    assert metrics.value(CALLS, "reset_cache") == 1
+    pushed = Mock()
+    assert metrics.push(pushed, "upload-all") == len(metrics.series("upload-all"))
+    pushed.import_series.assert_called_once()
@@ -0,0 +1,115 @@
+import io
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfinance.monitor import (DRIFT_METRIC, RebalanceMonitor, feed_updates, poll_updates,
+                               run_monitor)
+from pyfinance.rebalance import Asset, exceeds_threshold
+
+PORTFOLIO = [("US", 30), ("EU", 30), ("Emerging", 30), ("Japan", 10)]
+
+
+def balanced_assets(total=10000.0):
+    return [Asset(name, goal, total * goal / 100) for name, goal in PORTFOLIO]
+
+
+@pytest.mark.parametrize("threeshold", [0, 0.5, 5])
+def test_monitor_follows_the_rule_of_rebalance_assets(threeshold):
+    rng = np.random.default_rng(1)
+    monitor = RebalanceMonitor(balanced_assets(), threeshold)
+    goals = np.array([goal for _, goal in PORTFOLIO])
+    values = np.array(monitor.values)
+    before = monitor.has_to_be_rebalanced
+
+    for _ in range(2000):
+        i = rng.integers(len(PORTFOLIO))
+        values[i] = round(max(1.0, values[i] * rng.normal(1, 0.05)), 2)
+        changed = monitor.update(PORTFOLIO[i][0], values[i])
+
+        expected = bool(exceeds_threshold(goals, values, threeshold))
+        assert monitor.has_to_be_rebalanced == expected
+        assert changed == (expected != before)
+        before = expected
+    assert monitor.total == pytest.approx(values.sum())
+
+
+def test_monitor_checks_the_rule_only_near_the_threshold():
+    monitor = RebalanceMonitor(balanced_assets(), 5)
+    monitor.update("US", 6000.0)  # 46%: far out
+    assert monitor.has_to_be_rebalanced
+
+    with patch('pyfinance.monitor.exceeds_threshold', wraps=exceeds_threshold) as exact:
+        for value in np.linspace(6000.0, 6500.0, 100):
+            monitor.update("US", float(value))
+        assert monitor.has_to_be_rebalanced
+        assert exact.call_count == 0
+        # 35.00%: within the rounding margin of the threshold
+        monitor.update("US", 3769.5)
+        assert exact.call_count == 1
+    assert monitor.has_to_be_rebalanced == bool(
+        exceeds_threshold(np.array(monitor.goals), np.array(monitor.values), 5))
+
+
+def test_monitor_rejects_unknown_assets_and_bad_goals():
+    monitor = RebalanceMonitor(balanced_assets(), 5)
+    with pytest.raises(KeyError):
+        monitor.update("Gold", 100)
+    with pytest.raises(ValueError):
+        RebalanceMonitor([Asset("US", 50, 100), Asset("EU", 30, 100)], 5)
+
+
+def test_run_monitor_plans_only_when_the_rule_is_crossed():
+    monitor = RebalanceMonitor(balanced_assets(), 5)
+    monitor.plan = Mock(wraps=monitor.plan)
+    vm_client = Mock()
+    output = io.StringIO()
+    updates = [
+        ("US", 3100.0, 1000),   # 31%: within 5 points
+        ("US", 4000.0, 2000),   # 36.36%: rebalance
+        ("EU", 2900.0, 3000),   # still out
+        ("US", 3000.0, 4000),   # back within
+        ("Gold", 1.0, 5000),
+    ]
+
+    assert run_monitor(monitor, updates, vm_client=vm_client, output=output) == 1
+
+    assert monitor.plan.call_count == 1
+    assert "**US** (30%): 4000.0 --> " in output.getvalue()
+    # The start, the crossing and the return
+    assert vm_client.import_series.call_count == 3
+    series = vm_client.import_series.call_args_list[1][0][0]
+    assert {s.metric for s in series} == {DRIFT_METRIC}
+    drift = {s.labels["asset"]: s.values[0] for s in series}
+    assert drift["US"] == pytest.approx(36.36 - 30)
+    assert [s.timestamps for s in series] == [[2000]] * 4
+
+
+def test_feed_updates_skips_bad_lines(capsys):
+    lines = ['{"asset": "US", "value": 10.5}\n', "\n", "not json\n",
+             '{"asset": "EU"}\n', '{"asset": "EU", "value": "2", "timestamp": 1700000000000}\n']
+
+    assert list(feed_updates(lines)) == [("US", 10.5, None), ("EU", 2.0, 1700000000000)]
+    assert capsys.readouterr().err.count("Warning") == 2
+
+
+def test_poll_updates_values_the_first_shares():
+    day = pd.Timestamp.now().normalize()
+    frames = [
+        pd.DataFrame({"usa": [10.0], "euro": [5.0]}, index=[day]),
+        pd.DataFrame({"usa": [10.0], "euro": [5.0]}, index=[day]),
+        pd.DataFrame({"usa": [10.0, 12.0], "euro": [5.0, np.nan]},
+                     index=[day, day + pd.Timedelta(days=1)]),
+    ]
+    vm_client = Mock()
+    vm_client.export_frame.side_effect = frames
+    sleep = Mock()
+
+    updates = list(poll_updates(vm_client, {"usa": 1000.0, "euro": 500.0, "gold": 1.0},
+                                interval=60, polls=3, sleep=sleep))
+
+    timestamp = (day + pd.Timedelta(days=1)).value // 1_000_000
+    assert updates == [("usa", pytest.approx(1200.0), timestamp)]
+    assert sleep.call_count == 2
@@ -0,0 +1,109 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from urllib.parse import parse_qsl
+from unittest.mock import patch
+
+from pyfinance.montecarlo import (MonteCarloSimulator, RatioHistogram, block_bootstrap_indices,
+                                  simulate_bands, simulate_paths)
+
+
+@pytest.fixture
+def returns():
+    return np.random.default_rng(3).normal(0.0003, 0.01, 2000)
+
+
+def test_block_bootstrap_indices_are_circular_blocks():
+    rng = np.random.default_rng(0)
+
+    indices = block_bootstrap_indices(rng, n_returns=10, paths=4, days=7, block_size=3)
+
+    assert indices.shape == (4, 7)
+    for row in indices:
+        for block in (row[0:3], row[3:6]):
+            assert ((np.diff(block) % 10) == 1).all()
+
+
+def test_simulate_paths_with_constant_returns():
+    invested = np.array([100.0, 0.0, 100.0, 0.0])
+
+    values = simulate_paths(np.full(5, 0.1), invested, np.random.default_rng(0), paths=2)
+
+    expected = [100.0, 110.0, 221.0, 243.1]
+    assert np.allclose(values, [expected, expected])
+
+
+def test_histogram_percentiles_close_to_exact():
+    rng = np.random.default_rng(1)
+    ratios = np.exp(rng.normal(0.5, 0.3, (5000, 3)))
+    histogram = RatioHistogram(3)
+    histogram.add(ratios[:2500])
+    other = RatioHistogram(3)
+    other.add(ratios[2500:])
+    histogram.merge(other)
+
+    for q in (5, 50, 95):
+        exact = np.percentile(ratios, q, axis=0)
+        assert np.allclose(histogram.percentile(q), exact, rtol=0.01)
+
+
+def test_simulate_bands_is_reproducible(returns):
+    invested = np.zeros(300)
+    invested[::20] = 100.0
+
+    bands = simulate_bands(returns, invested, paths=200, seed=7, chunk_size=64)
+    again = simulate_bands(returns, invested, paths=200, seed=7, chunk_size=64)
+    other = simulate_bands(returns, invested, paths=200, seed=8, chunk_size=64)
+
+    assert all(np.array_equal(bands[q], again[q]) for q in bands)
+    assert not np.array_equal(bands[50], other[50])
+    assert (bands[5] <= bands[50]).all() and (bands[50] <= bands[95]).all()
+
+
+def test_simulate_bands_does_not_depend_on_processes(returns):
+    invested = np.full(100, 10.0)
+
+    single = simulate_bands(returns, invested, paths=120, seed=1, chunk_size=25)
+    pooled = simulate_bands(returns, invested, paths=120, seed=1, chunk_size=25, processes=2)
+
+    assert all(np.array_equal(single[q], pooled[q]) for q in single)
+
+
+def test_schedule_extends_to_years():
+    inputs = pd.Series([100.0, 50.0], index=pd.to_datetime(['2024-01-06', '2024-02-01']))
+
+    dates, invested = MonteCarloSimulator().schedule(inputs, years=1)
+
+    assert dates[0] == pd.Timestamp('2024-01-08')
+    assert dates[-1] == pd.Timestamp('2025-01-03')
+    assert invested[0] == 100.0
+    assert invested.sum() == 150.0
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_run_uploads_bands(mock_post, mock_get, tmp_path):
+    inputs_file = tmp_path / "inputs.csv"
+    inputs_file.write_text("Date,Quantity\n2024-01-01,1000\n2024-03-01,500\n")
+    dates = pd.bdate_range('2020-01-01', periods=300)
+    rng = np.random.default_rng(0)
+    histories = {name: pd.DataFrame({'Close': 100 * np.cumprod(1 + rng.normal(0, 0.01, 300))},
+                                    index=dates)
+                 for name in ["usa", "euro", "emerging", "japan"]}
+    simulator = MonteCarloSimulator(paths=50, seed=1)
+
+    with patch.object(simulator.simulator, 'load_histories', return_value=(histories, {})):
+        simulator.run(str(inputs_file))
+
+    body = gzip.decompress(mock_post.call_args.kwargs['data']).decode()
+    metrics = [json.loads(line)["metric"] for line in body.splitlines()]
+    assert {(m["ticker"], m["band"]) for m in metrics} == {
+        (name, band) for name in ["usa", "euro", "emerging", "japan", "mymix"]
+        for band in ["p5", "p50", "p95"]
+    }
+    assert all(m["__name__"] == "finance_simulation_band" for m in metrics)
+    deleted = parse_qsl(mock_post.call_args_list[0].kwargs['data'].decode())
+    assert ("match[]", 'finance_simulation_band{ticker="usa",band="p5"}') in deleted
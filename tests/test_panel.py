@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfinance.panel import PricePanel
+from pyfinance.ticker import History
+
+
+def make_histories():
+    return {
+        'a': pd.DataFrame({'Close': [1.0, 2.0, 3.0]},
+                          index=pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-04'])),
+        'b': pd.DataFrame({'Close': [10.0, 20.0]},
+                          index=pd.to_datetime(['2024-01-02', '2024-01-03'])),
+    }
+
+
+def test_union_alignment():
+    panel = PricePanel.from_histories(make_histories())
+
+    assert panel.tickers == ['a', 'b']
+    assert len(panel) == 4
+    assert panel.values.flags.f_contiguous
+    frame = panel.to_frame()
+    assert np.isnan(frame.loc['2024-01-03', 'a'])
+    assert frame.loc['2024-01-03', 'b'] == 20.0
+    assert panel.observed.sum() == 5
+
+
+def test_intersection_alignment():
+    panel = PricePanel.from_histories(make_histories(), align="intersection")
+
+    assert list(panel.index) == [pd.Timestamp('2024-01-02')]
+    assert panel.values.tolist() == [[2.0, 10.0]]
+
+
+def test_ffill_alignment_keeps_observed_mask():
+    panel = PricePanel.from_histories(make_histories(), align="ffill")
+
+    assert panel.column('a').tolist() == [1.0, 2.0, 2.0, 3.0]
+    # b has no price before its first date
+    assert np.isnan(panel.column('b')[0])
+    assert panel.column('b')[-1] == 20.0
+    assert not panel.observed[3, 1]
+
+
+def test_unknown_alignment():
+    with pytest.raises(ValueError, match="Unknown alignment"):
+        PricePanel.from_histories(make_histories(), align="outer")
+
+
+def test_missing_ticker_raises_key_error():
+    with pytest.raises(KeyError):
+        PricePanel.from_histories(make_histories(), tickers=['a', 'c'])
+
+
+def test_column_is_a_view():
+    panel = PricePanel.from_histories(make_histories())
+
+    assert np.shares_memory(panel.column('b'), panel.values)
+
+
+def test_close_and_history_skip_missing_dates():
+    panel = PricePanel.from_histories(make_histories())
+
+    history = panel.history('b')
+    assert list(history.columns) == ['Close']
+    assert history['Close'].tolist() == [10.0, 20.0]
+    assert History.from_panel(panel, 'b').frame().equals(history)
+
+
+def test_weighted_uses_common_dates():
+    panel = PricePanel.from_histories(make_histories())
+
+    weighted = panel.weighted({'a': 0.5, 'b': 0.5})
+
+    assert list(weighted.index) == [pd.Timestamp('2024-01-02')]
+    assert weighted.iloc[0] == 6.0
+
+
+def test_with_column_and_select():
+    panel = PricePanel.from_histories(make_histories())
+    mix = pd.Series([5.0], index=pd.to_datetime(['2024-01-02']))
+
+    extended = panel.with_column('mix', mix)
+
+    assert extended.tickers == ['a', 'b', 'mix']
+    assert extended.close('mix').tolist() == [5.0]
+    assert extended.select(['mix', 'a']).values[1].tolist() == [5.0, 2.0]
+
+
+def test_with_column_keeps_observed_mask():
+    panel = PricePanel.from_histories(make_histories(), align="ffill")
+    mix = pd.Series([5.0], index=pd.to_datetime(['2024-01-02']))
+
+    extended = panel.with_column('mix', mix)
+
+    # The forward-filled prices stay unobserved
+    np.testing.assert_array_equal(extended.observed[:, :2], panel.observed)
+    assert extended.observed[:, 2].tolist() == [False, True, False, False]
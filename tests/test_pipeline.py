@@ -0,0 +1,45 @@
+import threading
+
+from pyfinance.pipeline import run_tasks, worker_args, worker_pool
+
+
+def test_run_tasks_returns_results_by_name():
+    results, errors = run_tasks({"a": lambda: 1, "b": lambda: 2}, jobs=2)
+    assert results == {"a": 1, "b": 2}
+    assert errors == {}
+
+
+def test_run_tasks_failure_does_not_block_others():
+    def fail():
+        raise ValueError("boom")
+
+    results, errors = run_tasks({"a": fail, "b": lambda: 2}, jobs=2)
+
+    assert results == {"b": 2}
+    assert isinstance(errors["a"], ValueError)
+
+
+def test_run_tasks_runs_concurrently():
+    # Both tasks must be running at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    results, errors = run_tasks({"a": barrier.wait, "b": barrier.wait}, jobs=2)
+    assert errors == {}
+    assert len(results) == 2
+
+
+def _worker_sum(offset):
+    return sum(worker_args()) + offset
+
+
+def _double(*args):
+    return tuple(2 * arg for arg in args)
+
+
+def test_worker_pool_sends_the_arguments_to_every_worker():
+    with worker_pool(2, 1, 2) as executor:
+        assert list(executor.map(_worker_sum, range(4))) == [3, 4, 5, 6]
+
+
+def test_worker_pool_setup_replaces_the_arguments():
+    with worker_pool(2, 1, 2, setup=_double) as executor:
+        assert list(executor.map(_worker_sum, [0])) == [6]
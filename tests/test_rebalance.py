@@ -1,5 +1,6 @@
+import numpy as np
 import pytest
-from pyfinance.rebalance import Asset, RebalanceAssets
+from pyfinance.rebalance import Asset, RebalanceAssets, _match, current_percentages, exceeds_threshold, plan_transfers
 
 def test_current_percentage():
     asset = Asset('Asset1', 20, 1000)
@@ -16,6 +17,21 @@ def test_send_to():
     assert asset2.how_much_recive() == 0
     assert asset2.how_much_send() <= 0
 
+def test_send_to_more_than_left_raises():
+    asset1 = Asset('Asset1', 20, 1000, rebalanced_value=900)
+    asset2 = Asset('Asset2', 30, 1500, rebalanced_value=1600)
+    with pytest.raises(ValueError):
+        asset1.send_to(asset2, 100.005)
+    with pytest.raises(ValueError):
+        asset2.recive_from(asset1, 100.005)
+
+def test_rebalance_values_with_fractions_of_a_cent():
+    assets = [Asset('A', 50, 700.106), Asset('B', 50, 300.004)]
+    RebalanceAssets(assets, 5)
+    assert assets[0].how_much_send() >= 0
+    assert assets[1].how_much_recive() >= 0
+    assert assets[0].sending_to[assets[1]] == pytest.approx(200.05, abs=0.01)
+
 @pytest.fixture
 def rebalance_assets():
     assets = [Asset('Asset1', 20, 1000), Asset('Asset2', 30, 1500)]
@@ -97,3 +113,67 @@ def test_rebalance_investopedia_example():
     assert len(asset3.sending_to) == 2
     assert len(asset3.reciving_from) == 0
     
+
+
+def test_current_percentages_round_like_current_percentage_at_half_cents():
+    # Percentages of 0.005, 0.01, 0.015... are close to half a hundredth, where np.round and round() may differ
+    for i in range(1, 2000):
+        values = [i * 0.005, 100 - i * 0.005]
+        total = sum(values)
+        expected = [Asset(name=str(j), goal_percentage=0, value=value).current_percentage(total_value=total) for j, value in enumerate(values)]
+
+        assert current_percentages(np.array(values)).tolist() == expected
+
+
+def test_exceeds_threshold_agrees_with_rebalance_assets_at_the_threeshold():
+    for i in range(1, 2000):
+        values = [i * 0.005, 100 - i * 0.005]
+        goals = [round(i * 0.005), 100 - round(i * 0.005)]
+        threeshold = abs(goals[0] - round(i * 0.005, 2))
+        assets = [Asset(name=str(j), goal_percentage=goal, value=value) for j, (goal, value) in enumerate(zip(goals, values))]
+
+        expected = RebalanceAssets(assets, threeshold=threeshold).has_to_be_rebalanced
+        assert bool(exceeds_threshold(np.array(goals), np.array(values), threeshold)) == expected
+
+
+def test_plan_transfers_matches_equal_amounts_first():
+    senders, recivers, cents = plan_transfers(np.array([300, 100, -100, -300]))
+
+    assert sorted(zip(senders.tolist(), recivers.tolist(), cents.tolist())) == [(0, 3, 300), (1, 2, 100)]
+
+
+def test_plan_transfers_never_more_than_asset_by_asset():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        surplus = rng.integers(-500, 500, rng.integers(2, 12))
+        surplus[-1] -= surplus.sum()
+        senders, recivers, cents = plan_transfers(surplus)
+
+        moved = np.zeros(len(surplus), dtype=np.int64)
+        np.add.at(moved, senders, -cents)
+        np.add.at(moved, recivers, cents)
+        assert (surplus + moved == 0).all()
+        n_senders, n_recivers = (surplus > 0).sum(), (surplus < 0).sum()
+        assert len(cents) <= max(n_senders + n_recivers - 1, 0)
+        # The former loop: every sender in asset order sends to the recivers in asset order
+        in_order = _match(np.flatnonzero(surplus > 0).tolist(), np.flatnonzero(surplus < 0).tolist(),
+                          np.abs(surplus).tolist())
+        assert len(cents) <= len(in_order)
+
+
+def test_rebalance_hundreds_of_fractional_positions():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(100, 10000, 400).round(3)
+    assets = [Asset(f"Asset{i}", 0.25, value) for i, value in enumerate(values)]
+
+    rebalance = RebalanceAssets(assets, 0)
+
+    assert rebalance.has_to_be_rebalanced
+    sent = sum(sum(asset.sending_to.values()) for asset in assets)
+    recived = sum(sum(asset.reciving_from.values()) for asset in assets)
+    assert sent == pytest.approx(recived)
+    # Money is only moved, and only the cents lost rounding the rebalanced values are not where they should
+    final = np.array([asset.value - asset.sent + asset.recived for asset in assets])
+    assert final.sum() == pytest.approx(values.sum())
+    rounding = abs(values.sum() - sum(asset.rebalanced_value for asset in assets))
+    assert np.abs(final - [asset.rebalanced_value for asset in assets]).max() <= rounding + 0.01
@@ -0,0 +1,94 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from pyfinance.rolling import (RollingSimulator, annualized_irr, rolling_plans,
+                               rolling_terminal_values)
+
+
+def make_close(days=400, seed=0):
+    dates = pd.bdate_range('2000-01-03', periods=days)
+    returns = np.random.default_rng(seed).normal(0.0003, 0.01, days)
+    return pd.Series(100 * np.cumprod(1 + returns), index=dates, name='usa')
+
+
+def test_terminal_values_match_a_loop_over_start_dates():
+    prices = make_close().to_numpy()
+
+    values = rolling_terminal_values(prices, amount=100, contributions=6, every=21)
+
+    assert len(values) == 400 - 6 * 21
+    for start in (0, 1, 20, 21, 150, len(values) - 1):
+        contribution_days = start + 21 * np.arange(6)
+        shares = (100 / prices[contribution_days]).sum()
+        assert values[start] == pytest.approx(shares * prices[start + 126])
+
+
+def test_terminal_values_without_a_complete_horizon():
+    assert len(rolling_terminal_values(np.ones(10), 100, contributions=1, every=21)) == 0
+
+
+def test_irr_of_constant_prices_is_zero():
+    values = rolling_terminal_values(np.full(100, 50.0), amount=10, contributions=4, every=5)
+
+    assert np.allclose(values, 40.0)
+    assert np.allclose(annualized_irr(values, 10, 4, periods_per_year=12), 0, atol=1e-9)
+
+
+def test_irr_of_constant_growth():
+    # 1% growth per period: every contribution compounds until the end
+    monthly = 0.01
+    value = sum(100 * (1 + monthly) ** (12 - k) for k in range(12))
+
+    [irr] = annualized_irr(np.array([value]), 100, 12, periods_per_year=12)
+
+    assert irr == pytest.approx((1 + monthly) ** 12 - 1)
+
+
+def test_rolling_plans_are_indexed_by_start_date():
+    close = make_close()
+
+    result = rolling_plans(close, amount=100, contributions=12, every=21)
+
+    assert result.terminal_values.index[0] == close.index[0]
+    assert len(result.irr) == len(result.terminal_values)
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_run_uploads_and_summarizes(mock_post, mock_get):
+    histories = {name: make_close(600, seed).rename('Close').to_frame()
+                 for seed, name in enumerate(["usa", "euro", "emerging", "japan", "arwen"])}
+    histories["arwen"] = histories["arwen"].iloc[:100]
+    simulator = RollingSimulator()
+
+    with patch.object(simulator.simulator, 'load_histories', return_value=(histories, {})):
+        summary = simulator.run(years=1)
+
+    assert list(summary.index) == ["usa", "euro", "emerging", "japan", "mymix"]
+    assert (summary["value_p5"] <= summary["value_p95"]).all()
+    body = gzip.decompress(mock_post.call_args.kwargs['data']).decode()
+    metrics = {(m["__name__"], m["ticker"], m["horizon"]) for m in
+               (json.loads(line)["metric"] for line in body.splitlines())}
+    assert ("finance_rolling_irr", "mymix", "1y") in metrics
+    assert ("finance_rolling_terminal_value", "usa", "1y") in metrics
+    assert len(metrics) == 10
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_run_raises_after_uploading_when_a_download_failed(mock_post, mock_get):
+    histories = {name: make_close(600, seed).rename('Close').to_frame()
+                 for seed, name in enumerate(["usa", "euro", "emerging", "japan"])}
+    simulator = RollingSimulator()
+    errors = {"arwen": ValueError("No data")}
+
+    with patch.object(simulator.simulator, 'load_histories', return_value=(histories, errors)):
+        with pytest.raises(RuntimeError, match="arwen"):
+            simulator.run(years=1)
+
+    assert mock_post.called
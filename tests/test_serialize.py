@@ -0,0 +1,113 @@
+import json
+
+import pytest
+import numpy as np
+from pyfinance.serialize import (format_csv, format_json_line, iter_csv_chunks, parse_export,
+                                 series_checksum)
+
+
+def test_format_csv():
+    csv = format_csv([1704067200000, 1704153600000], [100.5, 101.0])
+    assert csv == b"1704067200000,100.5\n1704153600000,101\n"
+
+
+def test_format_csv_negative_and_small_values():
+    csv = format_csv([-1000, 0, 5, 6], [-0.25, 0.0, 0.0000004, -0.00123456789])
+    assert csv == b"-1000,-0.25\n0,0\n5,4e-07\n6,-0.00123456789\n"
+
+
+def test_format_csv_rounds_to_decimals():
+    assert format_csv([1], [12.3456789], decimals=2) == b"1,12.35\n"
+    assert format_csv([1], [12.3456789], decimals=0) == b"1,12\n"
+
+
+def test_format_csv_skips_missing_values():
+    assert format_csv([1, 2, 3], [1.0, np.nan, 3.0]) == b"1,1\n3,3\n"
+    assert format_csv([], []) == b""
+
+
+def test_format_csv_matches_python_formatting():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(-1e6, 1e6, 10_000)
+    timestamps = np.arange(10_000) * 86_400_000
+    lines = format_csv(timestamps, values).decode().splitlines()
+    parsed = np.array([float(line.split(',')[1]) for line in lines])
+    assert [int(line.split(',')[0]) for line in lines] == timestamps.tolist()
+    assert parsed.tolist() == values.tolist()
+
+
+def test_format_csv_writes_every_value_exactly():
+    rng = np.random.default_rng(1)
+    values = np.concatenate([
+        rng.uniform(-1, 1, 1000) * 10.0 ** rng.integers(-30, 30, 1000),
+        [1e-300, 5e-324, 2.0 ** 63, 1.7976931348623157e308, 123.45, 0.1 + 0.2],
+    ])
+    lines = format_csv(np.arange(len(values)), values).decode().splitlines()
+
+    assert [float(line.split(',')[1]) for line in lines] == values.tolist()
+    assert lines[-2:] == [f"{len(values) - 2},123.45", f"{len(values) - 1},0.30000000000000004"]
+
+
+def test_format_csv_too_large_values():
+    assert format_csv([1], [1e14]) == b"1,100000000000000\n"
+    assert format_csv([1], [1e20], decimals=2) == b"1,1e+20\n"
+    assert format_csv([1], [3e-7], decimals=2) == b"1,0\n"
+
+
+def test_iter_csv_chunks_concatenates_to_full_csv():
+    values = np.linspace(1, 2, 1001)
+    timestamps = np.arange(1001)
+    chunks = list(iter_csv_chunks(timestamps, values, chunk_rows=100))
+    assert len(chunks) == 11
+    assert b"".join(chunks) == format_csv(timestamps, values)
+
+
+def test_format_json_line_is_valid_json():
+    line = format_json_line({"__name__": "finance_close", "ticker": "usa"},
+                            np.array([1000, 2000]), np.array([1.5, 20.0]))
+    assert line.endswith(b"\n")
+    assert json.loads(line) == {
+        "metric": {"__name__": "finance_close", "ticker": "usa"},
+        "values": [1.5, 20],
+        "timestamps": [1000, 2000],
+    }
+
+
+def test_format_json_line_empty():
+    line = format_json_line({"__name__": "m"}, [], [])
+    assert json.loads(line) == {"metric": {"__name__": "m"}, "values": [], "timestamps": []}
+
+
+def test_parse_export_merges_sorts_and_deduplicates():
+    text = (
+        '{"metric":{"__name__":"m","ticker":"a"},"values":[2,3.5],"timestamps":[2000,3000]}\n'
+        '{"metric":{"ticker":"a","__name__":"m"},"values":[1,2],"timestamps":[1000,2000]}\n'
+        '\n'
+        '{"metric":{"__name__":"m","ticker":"b"},"values":[7e-1],"timestamps":[1000]}\n'
+    )
+
+    series = parse_export(text)
+
+    timestamps, values = series[(("__name__", "m"), ("ticker", "a"))]
+    assert timestamps.dtype == np.int64
+    assert timestamps.tolist() == [1000, 2000, 3000]
+    assert values.tolist() == [1.0, 2.0, 3.5]
+    assert series[(("__name__", "m"), ("ticker", "b"))][1].tolist() == [0.7]
+
+
+def test_parse_export_round_trips_format_json_line():
+    values = np.array([1.25, 3.5, 100.0])
+    timestamps = np.array([1, 2, 3])
+    line = format_json_line({"__name__": "m", "ticker": "a"}, timestamps, values).decode()
+
+    [(parsed_timestamps, parsed_values)] = parse_export(line).values()
+
+    assert parsed_timestamps.tolist() == [1, 2, 3]
+    assert parsed_values.tolist() == [1.25, 3.5, 100.0]
+
+
+def test_series_checksum_ignores_float_noise():
+    checksum = series_checksum([1000, 2000], [0.1 + 0.2, 1.0])
+
+    assert checksum == series_checksum(np.array([1000, 2000]), [0.3, 1.0])
+    assert checksum != series_checksum([1000, 2000], [0.3, 1.01])
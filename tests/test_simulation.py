@@ -1,7 +1,12 @@
+import gzip
+import json
+
 import pytest
 import pandas as pd
 import numpy as np
+from urllib.parse import parse_qsl
 from unittest.mock import Mock, patch
+from pyfinance.panel import PricePanel
 from pyfinance.simulation import InputLoader, PortfolioSimulator
 
 @pytest.fixture
@@ -57,6 +62,65 @@ def test_simulate_asset_price_change():
     # Day 2: 10 shares * 200 price = 2000.
     assert result.iloc[1]['Close'] == 2000.0
 
+def per_input_simulation(history: pd.DataFrame, inputs: pd.Series) -> pd.Series:
+    """The former simulate_asset: each input buys on the next trading day, one at a time."""
+    valid_inputs = pd.Series(0.0, index=history.index)
+    for date, amount in inputs.groupby(inputs.index).sum().items():
+        future_dates = history.index[history.index >= date]
+        if not future_dates.empty:
+            valid_inputs[future_dates[0]] += amount
+    prices = history['Close']
+    return (valid_inputs / prices).cumsum() * prices
+
+
+def test_simulate_assets_matches_per_asset_simulation():
+    dates = pd.date_range('2024-01-01', periods=40, freq='B')
+    rng = np.random.default_rng(0)
+    prices = pd.DataFrame({
+        'a': 100 + rng.normal(0, 1, 40).cumsum(),
+        'b': 50 + rng.normal(0, 1, 40).cumsum(),
+    }, index=dates)
+    # b starts trading later
+    prices.loc[:dates[9], 'b'] = np.nan
+    # Saturday inputs, two inputs on the same day, one before b existed
+    inputs = pd.Series([1000.0, 200.0, 300.0, 500.0], index=pd.DatetimeIndex([
+        '2024-01-01', '2024-01-06', '2024-01-06', '2024-02-01']))
+
+    sim = PortfolioSimulator()
+    values = sim.simulate_assets(PricePanel(prices.index, prices.columns, prices.values), inputs)
+
+    for asset in ['a', 'b']:
+        history = prices[[asset]].dropna().rename(columns={asset: 'Close'})
+        expected = per_input_simulation(history, inputs)
+        pd.testing.assert_series_equal(values[asset].dropna(), expected, check_names=False,
+                                       check_freq=False)
+    assert np.isnan(values.loc[dates[0], 'b'])
+    # January inputs are all invested in b on its first trading day
+    assert values.loc[dates[10], 'b'] == pytest.approx(1500.0)
+
+
+def test_simulate_assets_ignores_inputs_after_last_price(capsys):
+    dates = pd.date_range('2024-01-01', periods=3, freq='D')
+    prices = pd.DataFrame({'a': [10.0, 10.0, 10.0], 'b': [10.0, np.nan, np.nan]}, index=dates)
+    inputs = pd.Series([100.0, 50.0], index=pd.DatetimeIndex(['2024-01-01', '2024-01-02']))
+
+    values = PortfolioSimulator().simulate_assets(PricePanel(prices.index, ['a', 'b'], prices.values), inputs)
+
+    assert values['a'].tolist() == [100.0, 150.0, 150.0]
+    assert values.loc['2024-01-01', 'b'] == 100.0
+    assert "1 input(s) after last history date of b" in capsys.readouterr().out
+
+
+def test_simulate_assets_without_inputs():
+    dates = pd.date_range('2024-01-01', periods=3, freq='D')
+    prices = PricePanel(dates, ['a'], np.array([[10.0], [11.0], [12.0]]))
+    inputs = pd.Series([], index=pd.DatetimeIndex([]), dtype=np.float64)
+
+    values = PortfolioSimulator().simulate_assets(prices, inputs)
+
+    assert values['a'].tolist() == [0.0, 0.0, 0.0]
+
+
 def test_simulate_inputs_cumulative():
     dates = pd.date_range('2024-01-01', periods=5, freq='D')
     inputs_idx = pd.DatetimeIndex([pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-03')])
@@ -73,3 +137,98 @@ def test_simulate_inputs_cumulative():
     assert result.loc['2024-01-03', 'Close'] == 1500.0
     # Jan 5: 1500
     assert result.loc['2024-01-05', 'Close'] == 1500.0
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_run_uploads_every_asset_and_inputs(mock_post, mock_get, sample_inputs_csv):
+    dates = pd.date_range('2024-01-01', periods=60, freq='D')
+    history = pd.DataFrame({'Close': [100.0] * 60}, index=dates)
+    sim = PortfolioSimulator()
+
+    with patch.object(sim.uploader, 'download_history', return_value=history) as mock_download:
+        sim.run(sample_inputs_csv, jobs=4)
+
+    # 6 tickers downloaded once each
+    assert mock_download.call_count == 6
+    # One batched delete and one batched import
+    assert mock_post.call_count == 2
+    body = gzip.decompress(mock_post.call_args.kwargs['data']).decode()
+    imported = {json.loads(line)["metric"]["ticker"] for line in body.splitlines()}
+    assert imported == {"inputs", "naranja90", "arwen", "usa", "euro", "emerging", "japan", "mymix"}
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_run_from_vm_does_not_download(mock_post, mock_get, sample_inputs_csv):
+    dates = pd.date_range('2024-01-01', periods=60, freq='D')
+    closes = pd.DataFrame({t: [100.0] * 60 for t in
+                           ["naranja90", "usa", "euro", "emerging", "japan"]}, index=dates)
+    sim = PortfolioSimulator()
+
+    with patch.object(sim.uploader, 'download_history') as mock_download, \
+            patch.object(sim.vm_client, 'export_frame', return_value=closes):
+        sim.run(sample_inputs_csv, source="vm")
+
+    mock_download.assert_not_called()
+    body = gzip.decompress(mock_post.call_args.kwargs['data']).decode()
+    imported = {json.loads(line)["metric"]["ticker"] for line in body.splitlines()}
+    # arwen is missing in VictoriaMetrics and is skipped
+    assert imported == {"inputs", "naranja90", "usa", "euro", "emerging", "japan", "mymix"}
+
+
+def test_find_scenarios(tmp_path, sample_inputs_csv):
+    directory = tmp_path / "plans"
+    directory.mkdir()
+    (directory / "monthly.csv").write_text("Date,Quantity\n2024-01-01,100\n")
+    (directory / "lump.csv").write_text("Date,Quantity\n2024-01-01,1200\n")
+    (directory / "notes.txt").write_text("not a scenario")
+
+    scenarios = InputLoader.find_scenarios([str(directory), sample_inputs_csv])
+
+    assert list(scenarios) == ["lump", "monthly", "inputs"]
+    assert scenarios["inputs"] == sample_inputs_csv
+    with pytest.raises(ValueError, match="Two scenarios named inputs"):
+        InputLoader.find_scenarios([sample_inputs_csv, sample_inputs_csv])
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_run_scenarios_shares_histories(mock_post, mock_get, tmp_path, processes):
+    dates = pd.date_range('2024-01-01', periods=60, freq='D')
+    history = pd.DataFrame({'Close': np.linspace(100.0, 130.0, 60)}, index=dates)
+    (tmp_path / "lump.csv").write_text("Date,Quantity\n2024-01-01,1500\n")
+    (tmp_path / "monthly.csv").write_text("Date,Quantity\n2024-01-01,1000\n2024-02-01,500\n")
+    sim = PortfolioSimulator()
+
+    with patch.object(sim.uploader, 'download_history', return_value=history) as mock_download:
+        sim.run_scenarios(InputLoader.find_scenarios([str(tmp_path)]), processes=processes)
+
+    # Histories downloaded once for both scenarios
+    assert mock_download.call_count == 6
+    deleted = [value for _, value in parse_qsl(mock_post.call_args_list[0].kwargs['data'].decode())]
+    assert 'finance_simulation_value{ticker="usa",scenario="lump"}' in deleted
+    body = gzip.decompress(mock_post.call_args.kwargs['data']).decode()
+    rows = [json.loads(line) for line in body.splitlines()]
+    last = {(row["metric"]["scenario"], row["metric"]["ticker"]): row["values"][-1]
+            for row in rows}
+    assert len(last) == 16
+    assert last[("lump", "inputs")] == last[("monthly", "inputs")] == 1500
+    # Same money, bought earlier at lower prices
+    assert last[("lump", "usa")] > last[("monthly", "usa")]
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_run_does_not_delete_other_simulation_series(mock_post, mock_get, sample_inputs_csv):
+    dates = pd.date_range('2024-01-01', periods=60, freq='D')
+    history = pd.DataFrame({'Close': [100.0] * 60}, index=dates)
+    sim = PortfolioSimulator()
+
+    with patch.object(sim.uploader, 'download_history', return_value=history):
+        sim.run(sample_inputs_csv)
+
+    deleted = [value for _, value in parse_qsl(mock_post.call_args_list[0].kwargs['data'].decode())]
+    # Scenario series of usa are kept
+    assert 'finance_simulation_value{ticker="usa",scenario=""}' in deleted
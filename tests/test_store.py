@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+from pyfinance.graphics import TickerUploader
+from pyfinance.panel import PricePanel
+from pyfinance.pipeline import worker_pool
+from pyfinance.simulation import InputLoader, PortfolioSimulator
+from pyfinance.store import HistoryStore
+from pyfinance.ticker import History
+
+
+@pytest.fixture
+def panel():
+    a = pd.DataFrame({'Close': [1.0, 2.0, 3.0]}, index=pd.date_range('2024-01-01', periods=3))
+    b = pd.DataFrame({'Close': [10.0, 30.0]},
+                     index=pd.DatetimeIndex(['2024-01-01', '2024-01-03']))
+    return PricePanel.from_histories({'a': a, 'b': b})
+
+
+def test_write_and_read_maps_the_prices(tmp_path, panel):
+    store = HistoryStore(str(tmp_path))
+    store.write(panel)
+
+    read = store.read()
+
+    assert read.tickers == ['a', 'b']
+    assert read.index.equals(panel.index)
+    np.testing.assert_array_equal(read.values, panel.values)
+    np.testing.assert_array_equal(read.observed, panel.observed)
+    # Zero copy: the matrix is a read-only view of the file
+    assert isinstance(read.values.base, np.memmap) or isinstance(read.values, np.memmap)
+    assert not read.values.flags.writeable
+    assert read.column('a').flags.c_contiguous
+
+
+def test_histories_skip_missing_tickers(tmp_path, panel):
+    store = HistoryStore(str(tmp_path))
+    store.write(panel)
+
+    histories = store.histories(['b', 'missing'])
+
+    assert list(histories) == ['b']
+    assert histories['b']['Close'].tolist() == [10.0, 30.0]
+    assert History.from_store(store, 'b').frame()['Close'].tolist() == [10.0, 30.0]
+
+
+def test_write_switches_to_a_new_version(tmp_path, panel):
+    store = HistoryStore(str(tmp_path))
+    store.write(panel)
+    old = store.read()
+    old_version = store.current()
+
+    store.write(panel.select(['b', 'a']))
+    store.write(panel.select(['a']))
+
+    # The version mapped before the writes is untouched
+    assert old.tickers == ['a', 'b']
+    np.testing.assert_array_equal(old.values, panel.values)
+    assert store.read().tickers == ['a']
+    assert store.current() != old_version
+    # The current version and the one before it are kept
+    assert len([p for p in tmp_path.iterdir() if p.is_dir()]) == 2
+
+
+def test_read_rejects_files_not_matching_index(tmp_path, panel):
+    store = HistoryStore(str(tmp_path))
+    store.write(panel)
+    np.save(store.path("close.npy"), np.zeros((2, 2)))
+
+    with pytest.raises(ValueError, match="does not match"):
+        store.read()
+
+
+def test_calculate_mymix_reads_the_store(tmp_path):
+    dates = pd.date_range('2024-01-01', periods=3)
+    histories = {name: pd.DataFrame({'Close': [100.0, 110.0, 120.0]}, index=dates)
+                 for name in ['usa', 'euro', 'emerging', 'japan']}
+    store = HistoryStore(str(tmp_path))
+    store.write(PricePanel.from_histories(histories))
+
+    mymix = TickerUploader().calculate_mymix(store)
+
+    assert mymix['Close'].tolist() == pytest.approx([100.0, 110.0, 120.0])
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+@patch('pyfinance.victoria.requests.Session.post')
+def test_simulation_workers_attach_to_the_store(mock_post, mock_get, tmp_path):
+    dates = pd.date_range('2024-01-01', periods=60, freq='D')
+    history = pd.DataFrame({'Close': np.linspace(100.0, 130.0, 60)}, index=dates)
+    (tmp_path / "lump.csv").write_text("Date,Quantity\n2024-01-01,1500\n")
+    (tmp_path / "monthly.csv").write_text("Date,Quantity\n2024-01-01,1000\n2024-02-01,500\n")
+    scenarios = InputLoader.find_scenarios([str(tmp_path)])
+    store = HistoryStore(str(tmp_path / "store"))
+    sim = PortfolioSimulator(store=store)
+
+    with patch.object(sim.uploader, 'download_history', return_value=history), \
+            patch('pyfinance.simulation.worker_pool', wraps=worker_pool) as pool:
+        sim.run_scenarios(scenarios, processes=2)
+
+    # Workers get the store directory, not a pickled panel
+    assert pool.call_args.args[1:] == (store.directory,)
+    assert 'mymix' in store.tickers
+    # A later run reads the store instead of downloading
+    with patch.object(sim.uploader, 'download_history') as mock_download:
+        sim.run_scenarios(scenarios, source="store")
+    mock_download.assert_not_called()
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfinance.panel import PricePanel
+from pyfinance.simulation import PortfolioSimulator
+from pyfinance.sweep import (candidate_weights, evaluate_weights, format_table,
+                             invested_per_day, sweep, weight_grid)
+
+
+@pytest.fixture
+def panel():
+    dates = pd.bdate_range('2020-01-01', periods=500)
+    rng = np.random.default_rng(1)
+    returns = rng.normal(0.0003, 0.01, (500, 3))
+    return PricePanel(dates, ['a', 'b', 'c'], 100 * np.cumprod(1 + returns, axis=0))
+
+
+@pytest.fixture
+def inputs():
+    return pd.Series(100.0, index=pd.date_range('2020-01-01', periods=24, freq='MS'))
+
+
+def test_weight_grid_covers_simplex():
+    grid = weight_grid(3, 0.25)
+
+    # C(4 + 2, 2) combinations of quarters
+    assert len(grid) == 15
+    assert np.allclose(grid.sum(axis=1), 1)
+    assert [1.0, 0.0, 0.0] in grid.tolist()
+    assert [0.25, 0.5, 0.25] in grid.tolist()
+
+
+def test_weight_grid_rejects_uneven_step():
+    with pytest.raises(ValueError, match="Step must divide 1"):
+        weight_grid(3, 0.3)
+
+
+def test_candidate_weights_starts_with_portfolio_weights():
+    weights = candidate_weights(["usa", "euro", "emerging", "japan"], step=0.5, samples=3, seed=0)
+
+    assert weights[0].tolist() == [0.30, 0.30, 0.30, 0.10]
+    assert len(weights) == 1 + 10 + 3
+    assert np.allclose(weights.sum(axis=1), 1)
+
+
+def test_invested_per_day_moves_to_next_day():
+    index = pd.to_datetime(['2024-01-02', '2024-01-05'])
+    inputs = pd.Series([1.0, 2.0, 4.0], index=pd.to_datetime(['2024-01-01', '2024-01-03', '2024-01-08']))
+
+    assert invested_per_day(index, inputs).tolist() == [1.0, 2.0]
+
+
+def test_evaluate_matches_simulation_of_the_mix(panel, inputs):
+    weights = np.array([[0.2, 0.3, 0.5]])
+    mix = panel.to_frame() @ weights[0]
+    history = pd.DataFrame({'Close': mix})
+    expected = PortfolioSimulator().simulate_asset("mix", history, inputs)['Close'].iloc[-1]
+
+    invested = invested_per_day(panel.index, inputs)
+    [[final_value, cagr, max_drawdown]] = evaluate_weights(panel.values, invested, weights, 2.0)
+
+    assert final_value == pytest.approx(expected)
+    assert cagr == pytest.approx((mix.iloc[-1] / mix.iloc[0]) ** 0.5 - 1)
+    assert max_drawdown == pytest.approx((1 - mix / mix.cummax()).max())
+
+
+def test_sweep_ranks_and_chunks(panel, inputs):
+    weights = weight_grid(3, 0.1)
+
+    table = sweep(panel, inputs, weights, chunk_size=7)
+    unchunked = sweep(panel, inputs, weights, chunk_size=len(weights))
+
+    assert len(table) == len(weights)
+    assert table["final_value"].is_monotonic_decreasing
+    pd.testing.assert_frame_equal(table, unchunked)
+    best = weights[table["candidate"].iloc[0]]
+    assert table.loc[0, ['a', 'b', 'c']].tolist() == best.tolist()
+
+
+def test_sweep_by_drawdown_lowest_first(panel, inputs):
+    table = sweep(panel, inputs, weight_grid(3, 0.5), sort_by="max_drawdown")
+
+    assert table["max_drawdown"].is_monotonic_increasing
+
+
+def test_sweep_with_process_pool(panel, inputs):
+    weights = weight_grid(3, 0.1)
+
+    table = sweep(panel, inputs, weights, chunk_size=20, processes=2)
+
+    pd.testing.assert_frame_equal(table, sweep(panel, inputs, weights))
+
+
+def test_format_table(panel, inputs):
+    table = sweep(panel, inputs, weight_grid(3, 0.5))
+
+    text = format_table(table, ['a', 'b', 'c'], top=2)
+
+    assert "rank" in text
+    assert "candidate" not in text
+    assert len(text.splitlines()) == 4
@@ -1,3 +1,5 @@
+import numpy as np
+import pandas as pd
 import pytest
 from pyfinance import ticker as pfticker
 
@@ -60,4 +62,41 @@ def test_ticker_close_mean_per_week_day():
 
 def test_kk():
     history = pfticker.History("0P0001E1ZI.F")
-    assert history.ticker == "0P0001E1ZI.F"
\ No newline at end of file
+    assert history.ticker == "0P0001E1ZI.F"
+
+def test_ticker_close_mean_per_week_day_values():
+    history = pfticker.History()
+    # Tuesday to Sunday, two rows on Sunday
+    history.from_csv("""Date,Open,High,Low,Close,Volume,Dividends,Stock Splits,ticker
+2018-07-31T00:00:00Z,0,0,0,10.0,0,0,0,naranja90
+2018-08-01T00:00:00Z,0,0,0,11.0,0,0,0,naranja90
+2018-08-02T00:00:00Z,0,0,0,12.0,0,0,0,naranja90
+2018-08-03T00:00:00Z,0,0,0,13.0,0,0,0,naranja90
+2018-08-04T00:00:00Z,0,0,0,14.0,0,0,0,naranja90
+2018-08-05T00:00:00Z,0,0,0,15.0,0,0,0,naranja90
+2018-08-05T00:00:00Z,0,0,0,16.0,0,0,0,naranja90
+""")
+
+    means = history.close_mean_by_weekday()
+
+    assert means.index.tolist() == [1, 2, 3, 4, 5, 6]
+    assert means[1] == 10.0
+    assert means[6] == 15.5
+
+
+def test_ticker_history_save_and_load(tmp_path):
+    csv = """Date,Open,High,Low,Close,Volume,Dividends,Stock Splits,ticker
+2018-07-31T00:00:00Z,10.0,10.0,10.0,10.0,0,0,0,naranja90
+2018-08-01T00:00:00Z,9.991689682006836,9.991689682006836,9.991689682006836,9.991689682006836,0,0,0,naranja90
+"""
+    history = pfticker.History()
+    history.from_csv(csv)
+    path = str(tmp_path / "naranja90.npz")
+
+    history.save(path)
+    loaded = pfticker.History.load(path)
+
+    assert loaded.ticker == 'naranja90'
+    assert loaded.to_csv() == csv
+    assert loaded.dates[0] == pd.Timestamp('2018-07-31')
+    assert loaded.frame()['Close'].dtype == np.float64
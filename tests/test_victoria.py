@@ -1,6 +1,13 @@
+import gzip
+import json
+
 import pytest
+import numpy as np
+import pandas as pd
+import requests
 from unittest.mock import Mock, patch
-from pyfinance.victoria import VictoriaMetricsClient
+from urllib.parse import parse_qsl
+from pyfinance.victoria import DEFAULT_TIMEOUT, MetricSeries, VictoriaMetricsClient
 
 
 @pytest.fixture
@@ -18,7 +25,7 @@ def test_client_custom_url():
     assert client.base_url == "http://custom:9999"
 
 
-@patch('pyfinance.victoria.requests.post')
+@patch('pyfinance.victoria.requests.Session.post')
 def test_upload_csv(mock_post, client):
     mock_response = Mock()
     mock_response.raise_for_status = Mock()
@@ -30,20 +37,22 @@ def test_upload_csv(mock_post, client):
     mock_post.assert_called_once()
     call_args = mock_post.call_args
     assert call_args[0][0] == "http://localhost:8428/api/v1/import/csv"
-    assert call_args[1]["data"] == csv_data
+    assert gzip.decompress(call_args[1]["data"]).decode() == csv_data
+    assert call_args[1]["headers"]["Content-Encoding"] == "gzip"
     assert "format" in call_args[1]["params"]
     assert call_args[1]["params"]["extra_label"] == "ticker=test_ticker"
 
 
-@patch('pyfinance.victoria.requests.get')
+@patch('pyfinance.victoria.requests.Session.get')
 def test_reset_cache(mock_get, client):
     client.reset_cache()
     mock_get.assert_called_once_with(
-        "http://localhost:8428/internal/resetRollupResultCache"
+        "http://localhost:8428/internal/resetRollupResultCache",
+        timeout=DEFAULT_TIMEOUT,
     )
 
 
-@patch('pyfinance.victoria.requests.post')
+@patch('pyfinance.victoria.requests.Session.post')
 def test_delete_series(mock_post, client):
     client.delete_series("test_ticker")
     mock_post.assert_called_once()
@@ -52,19 +61,252 @@ def test_delete_series(mock_post, client):
     assert 'ticker="test_ticker"' in call_args[1]["params"]["match[]"]
 
 
-@patch('pyfinance.victoria.requests.get')
+@patch('pyfinance.victoria.requests.Session.get')
 def test_health_check_success(mock_get, client):
     mock_response = Mock()
     mock_response.status_code = 200
     mock_get.return_value = mock_response
 
     assert client.health_check() is True
-    mock_get.assert_called_once_with("http://localhost:8428/health")
+    mock_get.assert_called_once_with("http://localhost:8428/health", timeout=DEFAULT_TIMEOUT)
 
 
-@patch('pyfinance.victoria.requests.get')
+@patch('pyfinance.victoria.requests.Session.get')
 def test_health_check_failure(mock_get, client):
     import requests as req
     mock_get.side_effect = req.exceptions.ConnectionError()
 
     assert client.health_check() is False
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+def test_last_timestamp(mock_get, client):
+    mock_response = Mock()
+    mock_response.json.return_value = {
+        "status": "success",
+        "data": {"resultType": "vector",
+                 "result": [{"metric": {}, "value": [1704153600, "1704067200"]}]},
+    }
+    mock_get.return_value = mock_response
+
+    assert client.last_timestamp("usa") == 1704067200000
+    params = mock_get.call_args[1]["params"]
+    assert params["query"] == 'tlast_over_time(finance_close{ticker="usa"}[100y])'
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+def test_last_timestamp_missing_series(mock_get, client):
+    mock_response = Mock()
+    mock_response.json.return_value = {"status": "success",
+                                       "data": {"resultType": "vector", "result": []}}
+    mock_get.return_value = mock_response
+
+    assert client.last_timestamp("usa") is None
+
+
+def _form(call):
+    return parse_qsl(call[1]["data"].decode())
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_export_points(mock_post, client):
+    mock_response = Mock()
+    mock_response.text = (
+        '{"metric":{"__name__":"finance_close","ticker":"usa"},"values":[2.0],"timestamps":[2000]}\n'
+        '{"metric":{"__name__":"finance_close","ticker":"usa"},"values":[1.0],"timestamps":[1000]}\n'
+    )
+    mock_post.return_value = mock_response
+
+    timestamps, values = client.export_points("usa", start=1000)
+
+    assert timestamps.tolist() == [1000, 2000]
+    assert values.tolist() == [1.0, 2.0]
+    assert mock_post.call_args[0][0] == "http://localhost:8428/api/v1/export"
+    assert ("start", "1.0") in _form(mock_post.call_args)
+    assert mock_post.call_args[1]["headers"]["Content-Type"] == "application/x-www-form-urlencoded"
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_export_points_missing_series(mock_post, client):
+    mock_post.return_value.text = ""
+
+    timestamps, values = client.export_points("usa")
+
+    assert len(timestamps) == 0
+    assert len(values) == 0
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_export_series(mock_post, client):
+    mock_post.return_value.text = (
+        '{"metric":{"__name__":"finance_close","ticker":"usa"},'
+        '"values":[100.5,101],"timestamps":[1704067200000,1704153600000]}\n'
+    )
+
+    series = client.export_series("usa", end=1704153600000)
+
+    assert series.name == "usa"
+    assert list(series.index) == [pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-02')]
+    assert series.tolist() == [100.5, 101.0]
+    assert ("end", "1704153600.0") in _form(mock_post.call_args)
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_export_frame_aligns_tickers(mock_post, client):
+    mock_post.return_value.text = (
+        '{"metric":{"__name__":"finance_close","ticker":"euro"},'
+        '"values":[5],"timestamps":[1704153600000]}\n'
+        '{"metric":{"__name__":"finance_close","ticker":"usa"},'
+        '"values":[1,2],"timestamps":[1704067200000,1704153600000]}\n'
+    )
+
+    frame = client.export_frame(["usa", "euro", "japan"])
+
+    mock_post.assert_called_once()
+    assert list(frame.columns) == ["usa", "euro"]
+    assert len(frame) == 2
+    assert np.isnan(frame.loc['2024-01-01', 'euro'])
+    assert frame.loc['2024-01-02', 'euro'] == 5.0
+    assert ("match[]", 'finance_close{ticker="japan"}') in _form(mock_post.call_args)
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+def test_query_range(mock_get, client):
+    mock_get.return_value.json.return_value = {"status": "success", "data": {
+        "resultType": "matrix",
+        "result": [{"metric": {"ticker": "usa"},
+                    "values": [[1704067200, "100.5"], [1704153600, "101"]]}],
+    }}
+
+    frame = client.query_range('finance_close{ticker="usa"}', 1704067200000, 1704153600000)
+
+    assert frame["usa"].tolist() == [100.5, 101.0]
+    assert frame.index[0] == pd.Timestamp('2024-01-01')
+    assert mock_get.call_args[1]["params"]["step"] == "1d"
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_upload_csv_uncompressed(mock_post):
+    client = VictoriaMetricsClient("http://localhost:8428", compress=False)
+    csv_data = "Date,Close\n2024-01-01T00:00:00Z,100.0\n"
+
+    client.upload_csv(csv_data, "test_ticker")
+
+    assert mock_post.call_args[1]["data"] == csv_data
+    assert "headers" not in mock_post.call_args[1]
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_compressed_post_keeps_caller_headers(mock_post, client):
+    client._post("http://localhost:8428/api/v1/import", b"{}", headers={"X-Test": "1"})
+
+    assert mock_post.call_args[1]["headers"] == {"X-Test": "1", "Content-Encoding": "gzip"}
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_delete_series_checks_status(mock_post, client):
+    mock_post.return_value.raise_for_status.side_effect = requests.HTTPError("500")
+
+    with pytest.raises(requests.HTTPError):
+        client.delete_series("test_ticker")
+
+
+@patch('pyfinance.victoria.requests.Session.get')
+def test_reset_cache_checks_status(mock_get, client):
+    mock_get.return_value.raise_for_status.side_effect = requests.HTTPError("500")
+
+    with pytest.raises(requests.HTTPError):
+        client.reset_cache()
+
+
+def test_session_retries_server_errors():
+    client = VictoriaMetricsClient("http://localhost:8428", retries=5, backoff=0.1, pool_size=4)
+    adapter = client.session.get_adapter("http://localhost:8428")
+    assert adapter.max_retries.total == 5
+    assert adapter.max_retries.backoff_factor == 0.1
+    assert 503 in adapter.max_retries.status_forcelist
+    assert adapter._pool_maxsize == 4
+
+
+def _sent_lines(mock_post):
+    return [[json.loads(line) for line in gzip.decompress(c[1]["data"]).decode().splitlines()]
+            for c in mock_post.call_args_list]
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_import_series_single_request(mock_post, client):
+    series = [
+        MetricSeries("finance_close", {"ticker": "a"}, [1000, 2000], [1.0, 2.0]),
+        MetricSeries("finance_close", {"ticker": "b"}, [1000], [3.0]),
+    ]
+
+    assert client.import_series(series) == 1
+
+    assert mock_post.call_args[0][0] == "http://localhost:8428/api/v1/import"
+    [lines] = _sent_lines(mock_post)
+    assert lines[0] == {"metric": {"__name__": "finance_close", "ticker": "a"},
+                        "values": [1.0, 2.0], "timestamps": [1000, 2000]}
+    assert lines[1]["metric"]["ticker"] == "b"
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_import_series_respects_chunk_size(mock_post):
+    client = VictoriaMetricsClient("http://localhost:8428", chunk_size=3)
+    series = [
+        MetricSeries("m", {"ticker": "a"}, [1, 2, 3, 4, 5], [1.0, 2.0, 3.0, 4.0, 5.0]),
+        MetricSeries("m", {"ticker": "b"}, [1, 2], [6.0, 7.0]),
+    ]
+
+    assert client.import_series(series) == 3
+
+    requests_sent = _sent_lines(mock_post)
+    points = [sum(len(line["values"]) for line in lines) for lines in requests_sent]
+    assert points == [3, 3, 1]
+    all_values = [v for lines in requests_sent for line in lines for v in line["values"]]
+    assert all_values == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_import_series_nothing_to_send(mock_post, client):
+    assert client.import_series([]) == 0
+    mock_post.assert_not_called()
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_delete_matching_single_request(mock_post, client):
+    client.delete_matching(['m{ticker="a"}', 'm{ticker="b"}'])
+
+    mock_post.assert_called_once()
+    assert _form(mock_post.call_args) == [("match[]", 'm{ticker="a"}'), ("match[]", 'm{ticker="b"}')]
+    assert "params" not in mock_post.call_args[1]
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_delete_matching_caps_selectors_per_request(mock_post):
+    client = VictoriaMetricsClient("http://localhost:8428", max_selectors=2)
+
+    client.delete_matching([f'm{{ticker="t{i}"}}' for i in range(5)])
+
+    assert [len(_form(call)) for call in mock_post.call_args_list] == [2, 2, 1]
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_export_frame_caps_selectors_per_request(mock_post):
+    client = VictoriaMetricsClient("http://localhost:8428", max_selectors=2)
+    mock_post.return_value.text = ""
+
+    client.export_frame(["a", "b", "c"], start=1000)
+
+    forms = [_form(call) for call in mock_post.call_args_list]
+    assert [[value for key, value in form if key == "match[]"] for form in forms] == [
+        ['finance_close{ticker="a"}', 'finance_close{ticker="b"}'], ['finance_close{ticker="c"}']]
+    assert all(("start", "1.0") in form for form in forms)
+
+
+@patch('pyfinance.victoria.requests.Session.post')
+def test_upload_csv_streams_chunks(mock_post, client):
+    client.upload_csv(iter([b"1,1\n", b"2,2\n"]), "test_ticker")
+
+    body = b"".join(mock_post.call_args[1]["data"])
+    assert gzip.decompress(body) == b"1,1\n2,2\n"
+    assert mock_post.call_args[1]["params"]["format"] == "1:time:unix_ms,2:metric:finance_close"